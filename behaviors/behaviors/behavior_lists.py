@@ -381,9 +381,9 @@ class BehaviorLists():
 
     def is_leaf_node(self, node: ParameterizedNode) -> bool:
         """Is node a leaf node."""
-        if node in self.leaf_nodes:
+        if isinstance(node, ParameterizedNode):
             return True
-        return isinstance(node, ParameterizedNode)
+        return node in self.leaf_nodes
 
     def get_random_leaf_node(self) -> ParameterizedNode:
         """Return a random leaf node."""
@@ -33,7 +33,7 @@
 
 import copy
 import random
-from typing import List, Tuple
+from typing import Any, List, Tuple
 
 from behaviors.behavior_lists import BehaviorLists, ParameterizedNode
 
@@ -221,6 +221,65 @@ class BT:
                             self.bt.pop(children[0])
                     self.bt.pop(index)
 
+    def canonical(self) -> List[ParameterizedNode]:
+        """
+        Return the canonical normal form of the bt, the bt itself is not changed.
+
+        Semantically identical trees get the same normal form. Control nodes with only
+        one child are replaced by the child, children that are identical control nodes
+        to their parent are merged into the parent and adjacent condition nodes are sorted.
+        """
+        if len(self.bt) <= 1 or not self.behaviors.is_control_node(self.bt[0]) or\
+                self.depth() <= 0:
+            return list(self.bt)
+        tree, _ = self._parse(0)
+        return self._serialize(self._normalize(tree))
+
+    def _parse(self, index: int) -> Tuple[Any, int]:
+        """Parse the subtree at index into nested (node, children) tuples."""
+        node = self.bt[index]
+        if not self.behaviors.is_control_node(node):
+            return node, index + 1
+        children = []
+        index += 1
+        while not self.behaviors.is_up_node(self.bt[index]):
+            child, index = self._parse(index)
+            children.append(child)
+        return (node, children), index + 1
+
+    def _normalize(self, tree: Any) -> Any:
+        """Return the normal form of a parsed subtree."""
+        if not isinstance(tree, tuple):
+            return tree
+        node, children = tree
+        normalized = []
+        for child in children:
+            child = self._normalize(child)
+            if isinstance(child, tuple) and child[0] == node:
+                normalized += child[1]
+            else:
+                normalized.append(child)
+        if len(normalized) == 1:
+            return normalized[0]
+
+        # Conditions have no side effects, so the order of adjacent conditions is arbitrary
+        start = 0
+        for i in range(len(normalized) + 1):
+            if i == len(normalized) or isinstance(normalized[i], tuple) or\
+                    not self.behaviors.is_condition_node(normalized[i]):
+                normalized[start:i] = sorted(normalized[start:i], key=str)
+                start = i + 1
+        return node, normalized
+
+    def _serialize(self, tree: Any) -> List[ParameterizedNode]:
+        """Return the genome of a parsed subtree."""
+        if not isinstance(tree, tuple):
+            return [tree]
+        genome = [tree[0]]
+        for child in tree[1]:
+            genome += self._serialize(child)
+        return genome + [self.behaviors.get_up_node()]
+
     def depth(self) -> int:
         """Return depth of the bt."""
         depth = 0
@@ -211,6 +211,28 @@ def test_trim():
     assert bt.bt == ['s(', ab, ac, ')']
 
 
+def test_canonical():
+    """Test canonical function."""
+    bt = behavior_tree.BT(['s(', 's(', ab, ')', ')'], behavior_list)
+    assert bt.canonical() == [ab]
+    assert bt.bt == ['s(', 's(', ab, ')', ')']
+
+    bt.set(['s(', ab, 'f(', 's(', ac, ad, ')', ')', ae, ')'])
+    assert bt.canonical() == ['s(', ab, ac, ad, ae, ')']
+
+    bt.set(['f(', c, b, 's(', c, b, ab, ')', ')'])
+    assert bt.canonical() == ['f(', b, c, 's(', b, c, ab, ')', ')']
+    bt2 = behavior_tree.BT(['f(', b, c, 's(', c, b, ab, ')', ')'], behavior_list)
+    assert bt.canonical() == bt2.canonical()
+
+    # Conditions are only reordered within adjacent runs
+    bt.set(['s(', c, ab, b, ac, ')'])
+    assert bt.canonical() == ['s(', c, ab, b, ac, ')']
+
+    bt.set([ab])
+    assert bt.canonical() == [ab]
+
+
 def test_depth():
     """Test bt_depth function."""
     bt = behavior_tree.BT([], behavior_list)
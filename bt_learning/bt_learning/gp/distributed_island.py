@@ -35,10 +35,12 @@ from dataclasses import dataclass
 from enum import auto, Enum
 import multiprocessing as mp
 from multiprocessing.connection import Connection
+import time
 from typing import Any, Tuple
 
-from bt_learning.gp.genetic_programming import GpParameters
+from bt_learning.gp.genetic_programming import GpParameters, termination_reached
 from bt_learning.gp.gp_instance import GPInstance
+from bt_learning.gp.in_flight import InFlightRegistry
 
 
 class IslandTopology(Enum):
@@ -56,6 +58,7 @@ class IslandInfoType(Enum):
     MERGE_MIGRANT = auto()
     RECV_MIGRANT = auto()
     GET_BEST = auto()
+    GET_STATUS = auto()
     LOG_FINAL_INFO = auto()
     OK = auto()
     UNKNOWN = auto()
@@ -71,6 +74,8 @@ class DimParameters(GpParameters):
     topology: IslandTopology = IslandTopology.LOOP
     grid_width_size: int = -1
     grid_height_size: int = -1
+    hall_of_fame_migrants: bool = False
+    share_evaluations: bool = False
     batch_size = 100
 
 
@@ -88,11 +93,13 @@ def island_process(
     environment: Any,
     gp_par: GpParameters,
     num_core: int,
-    batch_size: int
+    batch_size: int,
+    in_flight: InFlightRegistry = None
 ) -> None:
     """Create a process for the DIM to communicate, with Pipe and IslandInfo."""
     gp_instance = GPInstance(
-        name, environment=environment, gp_par=gp_par, num_core=num_core, batch_size=batch_size)
+        name, environment=environment, gp_par=gp_par, num_core=num_core, batch_size=batch_size,
+        in_flight=in_flight)
     info_ok = IslandInfo(IslandInfoType.OK)
     while True:
         info = pipe.recv()
@@ -100,7 +107,7 @@ def island_process(
             gp_instance.step_gp()
             pipe.send(info_ok)
         elif info.type == IslandInfoType.GET_MIGRANT:
-            info.args = gp_instance.get_migrants(gp_par.num_migrants)
+            info.args = gp_instance.get_migrants(gp_par.num_migrants, gp_par.hall_of_fame_migrants)
             pipe.send(info)
         elif info.type == IslandInfoType.RECV_MIGRANT:
             gp_instance.receive_migrants(info.args[0], info.args[1])
@@ -111,6 +118,13 @@ def island_process(
         elif info.type == IslandInfoType.GET_BEST:
             info.args = gp_instance.get_best_individual()
             pipe.send(info)
+        elif info.type == IslandInfoType.GET_STATUS:
+            info.args = (
+                gp_instance.get_best_individual()[1],
+                gp_instance.get_episodes(),
+                gp_instance.is_runnable()
+            )
+            pipe.send(info)
         elif info.type == IslandInfoType.LOG_FINAL_INFO:
             gp_instance.get_final_info()
             pipe.send(info_ok)
@@ -124,6 +138,9 @@ class DistributedIslandModel:
 
     migrant selection: best, replacement strategy: worst
     migration frequency, number of migrants are set in DimParameters
+    migrants are the best of the hall of fame of each island if hall_of_fame_migrants is set
+    if share_evaluations is set, an island does not evaluate a genome that another island
+    is evaluating at the same time but waits for its fitness
     """
 
     def __init__(self, environment: Any, params: DimParameters):
@@ -134,6 +151,12 @@ class DistributedIslandModel:
         self.core_per_instance = max(
             (mp.cpu_count()-2) // self.params.num_island, 1)
         self.neighbors = []
+        # best fitness and total number of episodes over all islands per generation
+        self.best_fitness = []
+        self.n_episodes = []
+        self.in_flight = None
+        if self.params.share_evaluations:
+            self.in_flight = InFlightRegistry()
         # initialize all the island instances
         for idx in range(self.params.num_island):
             self.init_island(name=str(idx))
@@ -148,6 +171,8 @@ class DistributedIslandModel:
         """
         for idx in range(self.params.num_island):
             self.island_process[idx].terminate()
+        if self.in_flight is not None:
+            self.in_flight.shutdown()
 
     def init_island(self, name):
         """
@@ -165,7 +190,8 @@ class DistributedIslandModel:
                 self.environment,
                 self.params,
                 self.core_per_instance,
-                self.params.batch_size
+                self.params.batch_size,
+                self.in_flight
             )
         ))
         self.island_process[-1].start()
@@ -258,12 +284,38 @@ class DistributedIslandModel:
 
     def run(self):
         """Run the Distributed Island Model."""
+        start_time = time.time()
         for gen in range(self.params.n_generations):
+            if self.termination_reached(start_time):
+                break
             self.update_all_islands()
             if (gen + 1) % self.params.migration_frequency == 0:
                 self.exchange_migrants()
         self.log_final_info()
 
+    def termination_reached(self, start_time: float) -> bool:
+        """
+        Check the termination criteria over all islands.
+
+        The episode budget counts the episodes of all islands together.
+        The run is also terminated when no island can be run any longer.
+        """
+        self.__broadcast_info(IslandInfo(IslandInfoType.GET_STATUS))
+        fitness = []
+        episodes = 0
+        runnable = False
+        for idx in range(self.params.num_island):
+            island_fitness, island_episodes, island_runnable = self.island_list[idx].recv().args
+            fitness.append(island_fitness)
+            episodes += island_episodes
+            runnable = runnable or island_runnable
+        self.best_fitness.append(max(fitness))
+        self.n_episodes.append(episodes)
+
+        if not runnable:
+            return True
+        return termination_reached(self.params, self.best_fitness, self.n_episodes, start_time)
+
     def log_final_info(self):
         """Make logs for each island at the end of the run."""
         self.__broadcast_info(IslandInfo(IslandInfoType.LOG_FINAL_INFO))
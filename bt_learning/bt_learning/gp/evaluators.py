@@ -0,0 +1,247 @@
+"""Evaluators that run batches of episodes for the genetic programming algorithm."""
+
+# Copyright (c) 2022, ABB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with
+# or without modification, are permitted provided that
+# the following conditions are met:
+#
+#   * Redistributions of source code must retain the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer.
+#   * Redistributions in binary form must reproduce the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer in the documentation
+#     and/or other materials provided with the
+#     distribution.
+#   * Neither the name of ABB nor the names of its
+#     contributors may be used to endorse or promote
+#     products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import random
+from typing import Any, Callable, List
+
+import numpy as np
+
+from bt_learning.gp.hash_table import genome_digest
+
+
+class Evaluator(ABC):
+    """
+    Evaluate a batch of genomes, one episode each.
+
+    A subclass can amortize setup costs, such as resetting a scene, over the batch.
+    """
+
+    @abstractmethod
+    def evaluate_batch(self, genomes: list, seeds: List[int]) -> List[float]:
+        """Return the fitness of each genome in the episode given by the corresponding seed."""
+
+    def close(self) -> None:
+        """Release resources held by the evaluator."""
+
+
+class SerialEvaluator(Evaluator):
+    """Run the episodes one by one with the get_fitness function of the environment."""
+
+    def __init__(self, environment: Any):
+        self.environment = environment
+
+    def evaluate_batch(self, genomes: list, seeds: List[int]) -> List[float]:
+        """Return the fitness of each genome in the episode given by the corresponding seed."""
+        return [self.environment.get_fitness(genome, seed) for genome, seed in zip(genomes, seeds)]
+
+
+_worker_environment = None
+
+
+def _init_worker(environment_factory: Callable[[], Any]) -> None:
+    """Create the environment of a worker process."""
+    global _worker_environment  # pylint: disable=global-statement
+    _worker_environment = environment_factory()
+
+
+def _get_worker_fitness(genome: Any, seed: int) -> float:
+    """Run an episode in the environment of the worker process."""
+    return _worker_environment.get_fitness(genome, seed)
+
+
+class ProcessPoolEvaluator(Evaluator):
+    """
+    Run the episodes in a pool of processes.
+
+    Each worker process has its own environment, which is a copy of environment or,
+    if environment_factory is given, is created by calling environment_factory once
+    when the worker starts. The factory lets each worker start its own simulator.
+    The environment or the factory must be picklable. The pool is kept between batches.
+    """
+
+    def __init__(
+        self,
+        environment: Any = None,
+        n_workers: int = 1,
+        environment_factory: Callable[[], Any] = None
+    ):
+        if environment_factory is None:
+            environment_factory = functools.partial(_identity, environment)
+        self.n_workers = n_workers
+        self.executor = ProcessPoolExecutor(
+            max_workers=n_workers, initializer=_init_worker, initargs=(environment_factory,))
+
+    def evaluate_batch(self, genomes: list, seeds: List[int]) -> List[float]:
+        """Return the fitness of each genome in the episode given by the corresponding seed."""
+        if len(genomes) == 0:
+            return []
+        chunksize = max(len(genomes) // (4 * self.n_workers), 1)
+        return list(self.executor.map(_get_worker_fitness, genomes, seeds, chunksize=chunksize))
+
+    def close(self) -> None:
+        """Stop the worker processes."""
+        self.executor.shutdown()
+
+
+class VectorizedEvaluator(Evaluator):
+    """
+    Run the episodes with an environment that evaluates many genomes at once.
+
+    The environment must have a get_fitness_batch(genomes, seeds) function, for
+    example a world that steps all genomes together. In a SeededEnvironment, it is
+    also given the random generators of the episodes as the rngs keyword argument.
+    If batch_size is given, larger batches are split to bound the memory use.
+    """
+
+    def __init__(self, environment: Any, batch_size: int = None):
+        self.environment = environment
+        self.batch_size = batch_size
+
+    def evaluate_batch(self, genomes: list, seeds: List[int]) -> List[float]:
+        """Return the fitness of each genome in the episode given by the corresponding seed."""
+        batch_size = self.batch_size if self.batch_size else max(len(genomes), 1)
+        results = []
+        for i in range(0, len(genomes), batch_size):
+            results += list(self.environment.get_fitness_batch(
+                genomes[i:i + batch_size], seeds[i:i + batch_size]))
+        return results
+
+
+def episode_seed_sequence(run_seed: int, genome: Any, seed: int) -> np.random.SeedSequence:
+    """
+    Return the seed sequence of one episode of a genome in a run.
+
+    The sequence only depends on the run seed, the genome and the episode number,
+    not on when or in which process the episode is run.
+    """
+    words = np.frombuffer(genome_digest(genome), dtype=np.uint32).tolist()
+    return np.random.SeedSequence([run_seed, 0 if seed is None else seed] + words)
+
+
+class SeededEnvironment:
+    """
+    Run each episode with its own random stream.
+
+    Before an episode, the global random and np.random states are seeded from
+    episode_seed_sequence, and afterwards the previous states are restored.
+    The fitness of an episode is therefore the same whichever process runs it and
+    whatever was run before, and the random state of the caller is not consumed
+    by the environment. Environments that want their own generator can create one
+    with np.random.default_rng(episode_seed_sequence(run_seed, genome, seed)).
+    If the environment has get_fitness_batch, so has the wrapper. It passes the
+    environment one generator per episode, made from episode_seed_sequence, as the
+    rngs keyword argument. Batch environments must draw the randomness of each
+    episode from its generator, since the global states can only be seeded once per
+    batch and would make the fitness depend on how episodes are batched.
+    Other attributes are forwarded to the environment.
+    """
+
+    def __init__(self, environment: Any, run_seed: int):
+        self.environment = environment
+        self.run_seed = run_seed
+
+    def __getattr__(self, name: str) -> Any:
+        if name == 'environment':
+            # Not set yet, e.g. while unpickling
+            raise AttributeError(name)
+        return getattr(self.environment, name)
+
+    @property
+    def get_fitness_batch(self) -> Callable[[list, List[int]], list]:
+        """Seeded get_fitness_batch of the environment, if it has one."""
+        if not hasattr(self.environment, 'get_fitness_batch'):
+            raise AttributeError('get_fitness_batch')
+        return self._get_fitness_batch
+
+    def get_fitness(self, individual: Any, seed: int = None) -> Any:
+        """Return the fitness of the episode, run with the random stream of the episode."""
+        return self._seeded(individual, seed, self.environment.get_fitness, individual, seed)
+
+    def _get_fitness_batch(self, genomes: list, seeds: List[int]) -> list:
+        """Return the fitness of the episodes, run with the random generators of the episodes."""
+        if len(genomes) == 0:
+            return []
+        rngs = [
+            np.random.default_rng(episode_seed_sequence(self.run_seed, genome, seed))
+            for genome, seed in zip(genomes, seeds)
+        ]
+        return self._seeded(
+            genomes[0], seeds[0],
+            functools.partial(self.environment.get_fitness_batch, rngs=rngs), genomes, seeds)
+
+    def _seeded(self, genome: Any, seed: int, function: Callable, *args) -> Any:
+        """Call function with the global random states seeded from the episode."""
+        state = episode_seed_sequence(self.run_seed, genome, seed).generate_state(2)
+        random_state = random.getstate()
+        np_random_state = np.random.get_state()
+        random.seed(int(state[0]))
+        np.random.seed(int(state[1]))
+        try:
+            return function(*args)
+        finally:
+            random.setstate(random_state)
+            np.random.set_state(np_random_state)
+
+    def plot_individual(self, path: str, plot_name: str, individual: Any) -> None:
+        """Save a graphical representation of the individual."""
+        self.environment.plot_individual(path, plot_name, individual)
+
+
+def seeded_environment(environment: Any, run_seed: int or None) -> Any:
+    """Return environment wrapped in a SeededEnvironment, or unchanged if run_seed is None."""
+    if environment is None or run_seed is None:
+        return environment
+    return SeededEnvironment(environment, run_seed)
+
+
+def get_evaluator(environment: Any) -> Evaluator or Any:
+    """
+    Return an evaluator for the environment.
+
+    Evaluators, or anything else with an evaluate_batch function, are returned as they
+    are. Environments with get_fitness_batch are vectorized and other environments
+    are evaluated serially.
+    """
+    if isinstance(environment, Evaluator) or hasattr(environment, 'evaluate_batch'):
+        return environment
+    if hasattr(environment, 'get_fitness_batch'):
+        return VectorizedEvaluator(environment)
+    return SerialEvaluator(environment)
+
+
+def _identity(environment: Any) -> Any:
+    """Return the environment, used as factory for a copy of it."""
+    return environment
@@ -31,17 +31,32 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
 # THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import dataclasses
 from dataclasses import dataclass
 from enum import auto, Enum
+import functools
 import random
 from statistics import mean
-from typing import Any, List, Tuple
+import time
+from typing import Any, Callable, Dict, List, Tuple
 import numpy as np
 
 from behaviors.behavior_lists import BehaviorLists, ParameterizedNode
 from bt_learning.gp import logplot
 import bt_learning.gp.gp_bt_interface as gp_interface
-from bt_learning.gp.hash_table import HashTable
+from bt_learning.gp.evaluators import Evaluator, get_evaluator, seeded_environment
+from bt_learning.gp.hall_of_fame import HallOfFame
+from bt_learning.gp.hash_table import canonical_genome, EvictionPolicy, GenomeIndex, HashTable
+from bt_learning.gp.journal import Journal
+from bt_learning.gp.local_search import parameter_search
+from bt_learning.gp.novelty import combined_score, NoveltyArchive
+from bt_learning.gp.operator_adaptation import AdaptationMethods, OperatorAdaptation
+from bt_learning.gp.persistent_cache import PersistentCache
+from bt_learning.gp.surrogate import SurrogateModel
+
+# Mutation operators in the order of the probabilities given to gp_bt_interface.mutate_gene,
+# change is what remains when none of the others is drawn
+MUTATION_OPERATORS = ['add', 'delete', 'variable', 'replace', 'swap', 'change']
 
 
 class SelectionMethods(Enum):
@@ -53,6 +68,8 @@ class SelectionMethods(Enum):
     AD_RANK = auto()
     RANDOM = auto()
     ALL = auto()
+    DOUBLE_TOURNAMENT = auto()
+    PARETO = auto()
 
 
 @dataclass
@@ -61,7 +78,10 @@ class GpParameters:
 
     behavior_lists: Any = None                             # Lists of the types of behaviors
     ind_start_length: int = 5                              # Start length of initial genomes
+    ind_start_depth: int = 3                               # Max depth of ramped initial genomes
     min_length: int = 2                                    # Minimum length of individual
+    max_length: int = 0                                    # Maximum length of individual, 0 - no limit
+    max_depth: int = 0                                     # Maximum depth of individual, 0 - no limit
     n_population: int = 8                                  # Number of individuals in population
     f_crossover: float = 0.2                               # Fraction of parent pool selected for crossover
     n_offspring_crossover: int = 2                         # Number of offspring from crossover per parent
@@ -70,6 +90,9 @@ class GpParameters:
     n_offspring_mutation: int = 2                          # Number of offspring from mutation per parent
     parent_selection: int = SelectionMethods.RANK          # Selection method for parents
     survivor_selection: int = SelectionMethods.RANK        # Selection method for survival
+    tarpeian_p: float = 0.0                                # Prob. to exclude longer than average parent candidates
+    parsimony_pressure: float = 1.4                        # Prob. x 2 that shorter wins size tournament, double tournament
+    double_tournament_size: int = 3                        # Size tournament winners per fitness tournament
     f_elites: float = 0.1                                  # Fraction of population that survive as elites
     f_parents: float = 0.1                                 # Fraction of parents that may survive to next generation
     mutate_co_offspring: bool = False                      # Offspring from crossover may also be mutated
@@ -81,16 +104,46 @@ class GpParameters:
     mutation_p_swap: float = 0.2                           # Probability of mutation swapping positions of sibling nodes
     mutation_p_leaf: float = 0.5                           # Probability of changing/adding a leaf node(vs control node)
     max_multi_mutation: int = 1                            # Maximum number of mutation operations for one offspring
+    operator_adaptation: int = AdaptationMethods.NONE      # Adapt operator probabilities to offspring improvements
+    adaptation_rate: float = 0.3                           # Learning rate of operator qualities and probabilities
+    adaptation_p_min: float = 0.02                         # Minimum probability of an adapted operator
     allow_identical: bool = False                          # Offspring may be identical to any parent in prev generation
+    canonical_keys: bool = False                           # Fitness cache and duplicate checks use canonical genomes
     keep_baseline: bool = True                             # Baseline, if any, is always kept in population for breeding
     boost_baseline: bool = True                            # Baseline is boosted to have higher probability of breeding
     boost_baseline_only_co: bool = True                    # Baseline is boosted for crossover selection, not mutation
     plot: bool = True                                      # Plot fitness
     n_generations: int = 100                               # Number of generations
+    max_episodes: int = 0                                  # Stop after this many episodes in total, 0 - no limit
+    stagnation_window: int = 0                             # Stop if best fitness is not improved in this many gens
+    target_fitness: float = None                           # Stop when best fitness reaches this value
+    max_time: float = 0.0                                  # Stop after this wall-clock time in seconds, 0 - no limit
     save_interval: int = 100                               # Save logs every <save_interval> generations
+    journal_compact_interval: int = 0                      # Saves between journal compactions, 0 - full saves
     hash_table_size: int = 100000                          # Size of hash table
+    hash_table_max_entries: int = 0                        # Max entries in the hash table, 0 - no limit
+    hash_table_max_bytes: int = 0                          # Max estimated bytes of the hash table, 0 - no limit
+    hash_table_eviction: int = EvictionPolicy.LRU          # Entries evicted first from a full hash table
+    cache_path: str = None                                 # Database of episodes shared between runs, None - off
+    cache_fingerprint: str = ''                            # Identifies the environment in the shared database
     rerun_fitness: int = 0                                 # 0-run only once, 1-according to prob, 2-always
+    f_promote: float = 1.0                                 # Fraction of each batch of offspring promoted from the cheap environment
+    surrogate: bool = False                                # Reject offspring predicted to be inferior by a surrogate
+    surrogate_min_samples: int = 50                        # Evaluations needed before the surrogate rejects anything
+    surrogate_exploration: float = 0.1                     # Probability to evaluate an offspring rejected by surrogate
+    racing: bool = False                                   # Extra episodes only for individuals near the survivor cutoff
+    racing_max_episodes: int = 5                           # Max number of episodes per individual when racing
+    racing_z: float = 1.96                                 # Width of racing confidence intervals in standard errors
+    memetic_elites: int = 0                                # Number of elites with parameters tuned by local search
+    memetic_iterations: int = 3                            # Local search iterations per elite and generation
+    memetic_step: float = 0.1                              # Start step of local search, fraction of parameter range
+    novelty_weight: float = 0.0                            # Weight of novelty vs fitness in selection, 0 - off
+    novelty_k: int = 15                                    # Number of nearest neighbours that novelty is computed from
+    novelty_archive_add: int = 2                           # Most novel offspring added to the archive per generation
+    hall_of_fame_size: int = 0                             # Number of best individuals archived, 0 - off
+    f_hall_of_fame_parents: float = 0.0                    # Fraction of crossover parents from the hall of fame
     min_episodes: int = 1                                  # Minimum number of episodes per individual
+    run_seed: int = None                                   # Seed of the random stream of each episode, None - global
     verbose: bool = False                                  # Extra prints
     log_name: str = '1'                                    # Name of log for folder and file handling
     fig_best: bool = True                                  # Save final best individual as figure
@@ -105,67 +158,204 @@ def set_seeds(seed: int):
     np.random.seed(seed)
 
 
+def termination_reached(
+    gp_par: GpParameters,
+    best_fitness: List[float],
+    n_episodes: List[int],
+    start_time: float
+) -> bool:
+    """
+    Check the termination criteria other than the number of generations.
+
+    best_fitness and n_episodes are the per generation logs, start_time is the
+    wall-clock time at the start of the run.
+    """
+    if gp_par.max_episodes > 0 and len(n_episodes) > 0 and\
+            n_episodes[-1] >= gp_par.max_episodes:
+        return True
+    if gp_par.target_fitness is not None and len(best_fitness) > 0 and\
+            max(best_fitness) >= gp_par.target_fitness:
+        return True
+    if 0 < gp_par.stagnation_window < len(best_fitness) and\
+            max(best_fitness[-gp_par.stagnation_window:]) <=\
+            max(best_fitness[:-gp_par.stagnation_window]):
+        return True
+    if gp_par.max_time > 0 and time.time() - start_time >= gp_par.max_time:
+        return True
+    return False
+
+
+def key_behavior_lists(gp_par: GpParameters) -> BehaviorLists or None:
+    """Return the behavior lists to canonicalize hash table and index keys with, if any."""
+    if gp_par.canonical_keys:
+        return gp_par.behavior_lists
+    return None
+
+
+def get_persistent_cache(gp_par: GpParameters) -> PersistentCache or None:
+    """Return the cache of episodes shared between runs that gp_par asks for, if any."""
+    if gp_par.cache_path is None:
+        return None
+    return PersistentCache(gp_par.cache_path, gp_par.cache_fingerprint)
+
+
+def hash_table_limits(gp_par: GpParameters) -> Dict[str, Any]:
+    """Return the capacity and eviction policy arguments of the hash tables of gp_par."""
+    return {
+        'max_entries': gp_par.hash_table_max_entries,
+        'max_bytes': gp_par.hash_table_max_bytes,
+        'eviction': gp_par.hash_table_eviction
+    }
+
+
+def operator_probabilities(gp_par: GpParameters) -> Dict[str, float]:
+    """
+    Return the start probabilities of the variation operators for operator adaptation.
+
+    Crossover and mutation share the probability in proportion to f_crossover and
+    f_mutation, the mutation operators share the mutation part as in mutate_gene.
+    """
+    p_crossover = gp_par.f_crossover / (gp_par.f_crossover + gp_par.f_mutation)
+    p_mutation = [
+        gp_par.mutation_p_add,
+        gp_par.mutation_p_delete,
+        gp_par.mutation_p_variable,
+        gp_par.mutation_p_replace,
+        gp_par.mutation_p_swap
+    ]
+    p_mutation.append(max(0.0, 1.0 - sum(p_mutation)))
+    probabilities = {'crossover': p_crossover}
+    for key, value in zip(MUTATION_OPERATORS, p_mutation):
+        probabilities[key] = (1 - p_crossover) * value
+    return probabilities
+
+
+def adapted_parameters(gp_par: GpParameters, adaptation: OperatorAdaptation) -> GpParameters:
+    """
+    Return gp parameters with f_crossover and f_mutation set by the operator adaptation.
+
+    f_crossover is rounded to give an even number of crossover parents.
+    """
+    f_total = gp_par.f_crossover + gp_par.f_mutation
+    p_crossover = adaptation.share(['crossover'])
+    n_parents_crossover = min(
+        2 * int(round(f_total * p_crossover * gp_par.n_population / 2)),
+        gp_par.n_population - gp_par.n_population % 2
+    )
+    return dataclasses.replace(
+        gp_par,
+        f_crossover=n_parents_crossover / gp_par.n_population,
+        f_mutation=min(1.0, f_total * (1 - p_crossover))
+    )
+
+
 def create_population(
     population_size: int,
     genome_length: int,
     p_leaf: float,
-    behavior_lists: BehaviorLists
+    behavior_lists: BehaviorLists,
+    max_depth: int = 3,
+    ramped: bool = True
 ) -> list:
-    """Create an initial random population."""
+    """
+    Create an initial random population.
+
+    By default the population is ramped half-and-half: depths are cycled from 1 to
+    max_depth and every other individual is grown full, all valid by construction.
+    With ramped False the old rejection sampling of random genomes is used instead.
+    """
     new_population = []
+    genome_index = GenomeIndex()
     max_attempts = 100
 
-    for _ in range(population_size):
+    for i in range(population_size):
         individual = []
         attempts = 0
 
         while attempts < max_attempts:
-            individual = gp_interface.random_genome(genome_length, p_leaf, behavior_lists)
-            if individual != [] and individual not in new_population:
+            if ramped:
+                individual = gp_interface.grammar_genome(
+                    1 + (i // 2) % max(1, max_depth), genome_length, p_leaf,
+                    behavior_lists, full=i % 2 == 0)
+            else:
+                individual = gp_interface.random_genome(genome_length, p_leaf, behavior_lists)
+            if individual != [] and individual not in genome_index:
                 new_population.append(individual)
+                genome_index.add(individual)
                 break
             attempts += 1
 
     return new_population
 
 
-def mutation(population: list, parents: list, gp_par: GpParameters) -> list:
-    """Generate offspring by mutating a gene."""
+def mutation(
+    population: list,
+    parents: list,
+    gp_par: GpParameters,
+    genome_index: GenomeIndex = None,
+    adaptation: OperatorAdaptation = None
+) -> list:
+    """
+    Generate offspring by mutating a gene.
+
+    genome_index, if given, must contain the population and is updated with the offspring
+    so that it can be shared by the variation operators of one generation.
+    If adaptation is given, it chooses the mutation operator and records the offspring.
+    """
     mutated_population = []
     max_attempts = 100
+    if genome_index is None and not gp_par.allow_identical:
+        genome_index = GenomeIndex(population, key_behavior_lists(gp_par))
 
     for parent in parents:
         for _ in range(gp_par.n_offspring_mutation):
             mutated_individual = population[parent]
             attempts = 0
             num_mutation = random.randint(1, gp_par.max_multi_mutation)
+            operators = []
             while attempts < max_attempts and num_mutation > 0:
+                if adaptation is None:
+                    probabilities = [
+                        gp_par.mutation_p_add,
+                        gp_par.mutation_p_delete,
+                        gp_par.mutation_p_variable,
+                        gp_par.mutation_p_replace,
+                        gp_par.mutation_p_swap
+                    ]
+                else:
+                    operator = adaptation.choose(MUTATION_OPERATORS)
+                    probabilities = [float(operator == key) for key in MUTATION_OPERATORS[:-1]]
                 mutated_temp = gp_interface.mutate_gene(
                     mutated_individual,
-                    gp_par.mutation_p_add,
-                    gp_par.mutation_p_delete,
-                    gp_par.mutation_p_variable,
-                    gp_par.mutation_p_replace,
-                    gp_par.mutation_p_swap,
+                    *probabilities,
                     gp_par.mutation_p_leaf,
-                    gp_par.behavior_lists
+                    gp_par.behavior_lists,
+                    gp_par.max_length,
+                    gp_par.max_depth
                 )
                 if len(mutated_temp) >= gp_par.min_length and \
                     (gp_par.allow_identical or
-                        (mutated_temp not in population + mutated_population)):
+                        mutated_temp not in genome_index):
                     # check if the new offspring matches the criteria
                     # if matches, write it to mutated_individual as the
                     # input of next mutation op.
                     mutated_individual = mutated_temp
                     num_mutation -= 1
+                    if adaptation is not None:
+                        operators.append(operator)
                 else:
                     # undesired offspring generated
                     # revert to parent, and reset num_mutation
                     num_mutation = random.randint(1, gp_par.max_multi_mutation)
                     mutated_individual = population[parent]
+                    operators = []
                 attempts += 1
             if mutated_individual != population[parent]:
                 mutated_population.append(mutated_individual)
+                if genome_index is not None:
+                    genome_index.add(mutated_individual)
+                for operator in operators:
+                    adaptation.record(operator, mutated_individual, [population[parent]])
 
     return mutated_population
 
@@ -174,15 +364,25 @@ def crossover(
         population: list,
         parents: list,
         gp_par: GpParameters,
-        baseline: List[ParameterizedNode],
-        baseline_index: int = None
+        baseline: List[ParameterizedNode] = None,
+        baseline_index: int = None,
+        genome_index: GenomeIndex = None,
+        adaptation: OperatorAdaptation = None
     ) -> list:
-    """Generate offspring by crossovers."""
+    """
+    Generate offspring by crossovers.
+
+    genome_index, if given, must contain the population and is updated with the offspring
+    so that it can be shared by the variation operators of one generation.
+    If adaptation is given, the offspring are recorded in it.
+    """
     if len(parents) % 2 != 0:
         raise ValueError('Number of parents for crossover must be even number')
 
     crossover_offspring = []
     max_attempts = 100
+    if genome_index is None and not gp_par.allow_identical:
+        genome_index = GenomeIndex(population, key_behavior_lists(gp_par))
 
     for _ in range(gp_par.n_offspring_crossover):
         unused_parents = list(parents)
@@ -198,15 +398,25 @@ def crossover(
                 population[parent1],
                 population[parent2],
                 gp_par.behavior_lists,
-                gp_par.replace_crossover
+                gp_par.replace_crossover,
+                gp_par.max_length,
+                gp_par.max_depth
             )
 
             if len(offspring1) >= gp_par.min_length and len(offspring2) >= gp_par.min_length and\
                     (gp_par.allow_identical or
-                        (offspring1 not in population + crossover_offspring and
-                            offspring2 not in population + crossover_offspring)):
+                        (offspring1 not in genome_index and offspring2 not in genome_index and
+                         canonical_genome(offspring1, key_behavior_lists(gp_par)) !=
+                         canonical_genome(offspring2, key_behavior_lists(gp_par)))):
                 crossover_offspring.append(offspring1)
                 crossover_offspring.append(offspring2)
+                if genome_index is not None:
+                    genome_index.add(offspring1)
+                    genome_index.add(offspring2)
+                if adaptation is not None:
+                    for offspring in [offspring1, offspring2]:
+                        adaptation.record(
+                            'crossover', offspring, [population[parent1], population[parent2]])
                 unused_parents.pop(crossover_parents[0])
                 if crossover_parents[0] < crossover_parents[1]:
                     crossover_parents[1] -= 1
@@ -219,7 +429,7 @@ def crossover(
                 gp_par.n_offspring_mutation <= 1 and gp_par.n_offspring_crossover <= 1:
             # Fill up with mutation in case we can't find enough good crossovers
             crossover_offspring += mutation(
-                population + crossover_offspring, unused_parents, gp_par)
+                population + crossover_offspring, unused_parents, gp_par, genome_index, adaptation)
 
     return crossover_offspring
 
@@ -231,6 +441,18 @@ def rerun_probability(n_runs: int) -> float:
     return 1 / n_runs
 
 
+def split_result(result: Any) -> Tuple[float, np.ndarray or None]:
+    """
+    Split an episode result into fitness and behavior descriptor.
+
+    Environments used for novelty search return (fitness, descriptor) from get_fitness,
+    other environments return only the fitness and the descriptor is None.
+    """
+    if isinstance(result, tuple):
+        return result[0], np.asarray(result[1], dtype=float)
+    return result, None
+
+
 def get_fitness(
     individual: Any,
     hash_table: HashTable,
@@ -250,17 +472,258 @@ def get_fitness(
     if values is None:
         values = []
         for i in range(min_episodes):
-            fitness = environment.get_fitness(individual, i)
+            fitness, _ = split_result(environment.get_fitness(individual, i))
             hash_table.insert(individual, fitness)
             values.append(fitness)
     elif rerun_fitness == 2 or\
             (rerun_fitness == 1 and random.random() < rerun_probability(len(values))):
-        fitness = environment.get_fitness(individual, len(values))
+        fitness, _ = split_result(environment.get_fitness(individual, len(values)))
         hash_table.insert(individual, fitness)
 
     return mean(values)
 
 
+def get_fitness_batch(
+    individuals: list,
+    hash_table: HashTable,
+    evaluator: Evaluator,
+    rerun_fitness: int = 0,
+    min_episodes: int = 1,
+    descriptors: Dict[bytes, np.ndarray] = None
+) -> List[float]:
+    """
+    Get fitness of many individuals with a single batch to the evaluator.
+
+    Same as get_fitness for each individual in turn, but all episodes that are
+    needed are collected first and run with one call to evaluator.evaluate_batch.
+    If descriptors is given, the behavior descriptors of the episodes are stored in it
+    under the hash table key of the individual.
+    """
+    keys = [hash_table.key(individual) for individual in individuals]
+    genomes = []
+    genome_keys = []
+    seeds = []
+    n_planned = {}
+    known = {}
+    for individual, key in zip(individuals, keys):
+        values = known.get(key)
+        if values is None:
+            values = known[key] = list(hash_table.find(individual, key) or [])
+        n_values = n_planned.get(key, 0) + len(values)
+        if n_values == 0:
+            n_new = min_episodes
+        elif rerun_fitness == 2 or\
+                (rerun_fitness == 1 and random.random() < rerun_probability(n_values)):
+            n_new = 1
+        else:
+            n_new = 0
+        genomes += [individual] * n_new
+        genome_keys += [key] * n_new
+        seeds += range(n_values, n_values + n_new)
+        n_planned[key] = n_planned.get(key, 0) + n_new
+
+    if len(genomes) > 0:
+        results = evaluator.evaluate_batch(genomes, seeds)
+        for genome, key, result in zip(genomes, genome_keys, results):
+            fitness, descriptor = split_result(result)
+            hash_table.insert(genome, fitness, key)
+            known[key].append(fitness)
+            if descriptors is not None and descriptor is not None:
+                descriptors[key] = descriptor
+    # values are taken from known since a bounded hash table may have evicted some
+    return [mean(known[key]) for key in keys]
+
+
+def racing_candidates(
+    values: List[List[float]],
+    n_selected: int,
+    max_episodes: int,
+    z: float
+) -> List[int]:
+    """
+    Return the indices of the individuals that need another episode when racing.
+
+    The cutoff is halfway between the mean fitness of the n_selected:th best individual
+    and the next one. An individual needs another episode if the confidence interval
+    of its mean, z standard errors wide, contains the cutoff and it has had fewer than
+    max_episodes episodes. Individuals with one episode use the pooled variance.
+    As long as there is no variance estimate, only the two individuals on each side
+    of the cutoff get another episode.
+    """
+    if n_selected <= 0 or n_selected >= len(values):
+        return []
+    means = np.array([mean(x) for x in values])
+    counts = np.array([len(x) for x in values])
+    ranking = np.argsort(-means, kind='stable')
+    cutoff = (means[ranking[n_selected - 1]] + means[ranking[n_selected]]) / 2
+
+    variances = [np.var(x, ddof=1) for x in values if len(x) > 1]
+    if len(variances) == 0:
+        candidates = ranking[n_selected - 1:n_selected + 1]
+        return [int(i) for i in candidates if counts[i] < max_episodes]
+
+    pooled_variance = mean(variances)
+    variance = np.array([np.var(x, ddof=1) if len(x) > 1 else pooled_variance for x in values])
+    half_width = z * np.sqrt(variance / counts)
+    overlapping = np.abs(means - cutoff) < half_width
+    return [int(i) for i in np.flatnonzero(overlapping & (counts < max_episodes))]
+
+
+def race(
+    individuals: list,
+    fitness: List[float],
+    hash_table: HashTable,
+    environment: Any,
+    n_selected: int,
+    gp_par: GpParameters,
+    evaluate_episodes: Callable[[list, List[int]], List[float]] = None
+) -> List[float]:
+    # pylint: disable=too-many-arguments
+    """
+    Run extra episodes on individuals that are close to the selection cutoff.
+
+    Episodes are added in rounds as given by racing_candidates until no individual
+    is close enough. Individuals that are not in the hash table, such as rejected
+    offspring, are left out. Returns the updated fitness.
+    evaluate_episodes(individuals, episodes) can be given to evaluate each round in
+    parallel, otherwise the episodes are run one by one.
+    """
+    # values are kept in known since a bounded hash table may evict them while racing
+    known = {}
+    keys = [hash_table.key(individual) for individual in individuals]
+    evaluated = []
+    for i, individual in enumerate(individuals):
+        if keys[i] not in known:
+            values = hash_table.find(individual, keys[i])
+            if values is None:
+                continue
+            known[keys[i]] = list(values)
+        evaluated.append(i)
+    while True:
+        values = [known[keys[i]] for i in evaluated]
+        candidates = racing_candidates(
+            values, n_selected, gp_par.racing_max_episodes, gp_par.racing_z)
+        round_index = GenomeIndex(behavior_lists=key_behavior_lists(gp_par))
+        to_run = []
+        to_run_keys = []
+        episodes = []
+        for i in candidates:
+            if individuals[evaluated[i]] not in round_index:
+                round_index.add(individuals[evaluated[i]])
+                to_run.append(individuals[evaluated[i]])
+                to_run_keys.append(keys[evaluated[i]])
+                episodes.append(len(values[i]))
+        if len(to_run) == 0:
+            break
+        if evaluate_episodes is None:
+            results = [environment.get_fitness(x, episode) for x, episode in zip(to_run, episodes)]
+        else:
+            results = evaluate_episodes(to_run, episodes)
+        for individual, key, result in zip(to_run, to_run_keys, results):
+            value, _ = split_result(result)
+            hash_table.insert(individual, value, key)
+            known[key].append(value)
+
+    fitness = fitness[:]
+    for i in evaluated:
+        fitness[i] = mean(known[keys[i]])
+    return fitness
+
+
+def memetic_search(
+    population: list,
+    fitness: List[float],
+    gp_par: GpParameters,
+    evaluate: Callable[[list], List[float]]
+) -> Tuple[list, List[float]]:
+    """
+    Tune the numeric node parameters of the memetic_elites best individuals.
+
+    Each elite is improved by local_search.parameter_search, where evaluate gets all
+    candidate genomes of one iteration as a batch. An elite is replaced by the tuned
+    genome if it is better and not already in the population.
+    """
+    population = population[:]
+    fitness = fitness[:]
+    genome_index = GenomeIndex(population, key_behavior_lists(gp_par))
+    for i in elite_indices(fitness, gp_par.memetic_elites):
+        genome, value = parameter_search(
+            population[i], fitness[i], evaluate, gp_par.memetic_iterations, gp_par.memetic_step)
+        if value > fitness[i] and genome not in genome_index:
+            genome_index.add(genome)
+            population[i] = genome
+            fitness[i] = value
+    return population, fitness
+
+
+def get_offspring_fitness(
+    offspring: list,
+    hash_table: HashTable,
+    environment: Any,
+    gp_par: GpParameters,
+    cheap_hash_table: HashTable = None,
+    cheap_environment: Any = None,
+    surrogate: SurrogateModel = None,
+    descriptors: Dict[bytes, np.ndarray] = None
+) -> Tuple[list, List[float]]:
+    # pylint: disable=too-many-arguments
+    """
+    Get fitness of a batch of offspring.
+
+    The environments may be evaluators or anything accepted by get_evaluator.
+    Offspring that are not already evaluated may be rejected before they reach the
+    expensive environment. Returns the offspring that are not rejected, in the order
+    they were given, and their fitness.
+    If a surrogate model is given, offspring predicted to be inferior are rejected.
+    If a cheap environment is given, the remaining offspring are first screened in
+    the cheap one and only the best f_promote fraction of them are promoted to the
+    expensive environment. The fraction is taken of this batch only, so run() promotes
+    crossover and mutation offspring separately.
+    Cheap fitness values are stored in their own hash table.
+    Behavior descriptors from the expensive environment are stored in descriptors, if given.
+    """
+    evaluator = get_evaluator(environment)
+    if cheap_environment is None and surrogate is None:
+        return offspring, get_fitness_batch(offspring, hash_table, evaluator,
+                                            gp_par.rerun_fitness, gp_par.min_episodes, descriptors)
+
+    to_screen = [i for i, individual in enumerate(offspring)
+                 if hash_table.find(individual) is None]
+    rejected = set()
+    if surrogate is not None:
+        rejected = {i for i in to_screen if not surrogate.screen(offspring[i])}
+        to_screen = [i for i in to_screen if i not in rejected]
+    if cheap_environment is not None:
+        cheap_fitness = get_fitness_batch(
+            [offspring[i] for i in to_screen],
+            cheap_hash_table,
+            get_evaluator(cheap_environment),
+            0,
+            gp_par.min_episodes
+        )
+        n_promoted = int(round(gp_par.f_promote * len(to_screen)))
+        if len(to_screen) > 0:
+            n_promoted = max(n_promoted, 1)
+        promoted = elite_indices(cheap_fitness, n_promoted)
+        rejected |= set(to_screen) - {to_screen[i] for i in promoted}
+
+    accepted = [i for i in range(len(offspring)) if i not in rejected]
+    accepted_fitness = get_fitness_batch(
+        [offspring[i] for i in accepted],
+        hash_table,
+        evaluator,
+        gp_par.rerun_fitness,
+        gp_par.min_episodes,
+        descriptors
+    )
+    if surrogate is not None:
+        screened = set(to_screen)
+        for i, value in zip(accepted, accepted_fitness):
+            if i in screened:
+                surrogate.add(offspring[i], value)
+    return [offspring[i] for i in accepted], accepted_fitness
+
+
 def crossover_parent_selection(
     population: list,
     fitness: List[float],
@@ -275,16 +738,40 @@ def crossover_parent_selection(
     n_parents_crossover = int(round(gp_par.f_crossover * gp_par.n_population))
     if n_parents_crossover <= 0:
         return []
+    lengths = parsimony_lengths(population, gp_par.parent_selection, gp_par)
     selected = selection(
         range(len(population)),
-        fitness,
+        tarpeian(fitness, lengths, gp_par.tarpeian_p),
         n_parents_crossover,
         gp_par.parent_selection,
-        pressure_factor
+        pressure_factor,
+        lengths,
+        gp_par
     )
     return selected
 
 
+def hall_of_fame_parents(
+    population: list,
+    parents: List[int],
+    hall_of_fame: HallOfFame,
+    gp_par: GpParameters
+) -> Tuple[list, List[int]]:
+    """
+    Replace a fraction of the crossover parents with random individuals from the hall of fame.
+
+    Returns the population extended with those individuals and the new parent indices,
+    the population and parents are returned unchanged if there is nothing to replace.
+    """
+    n_replaced = int(round(gp_par.f_hall_of_fame_parents * len(parents)))
+    if hall_of_fame is None or n_replaced <= 0 or len(hall_of_fame) == 0:
+        return population, parents
+    members = hall_of_fame.sample(n_replaced)
+    parents = parents[:len(parents) - len(members)] +\
+        list(range(len(population), len(population) + len(members)))
+    return population + members, parents
+
+
 def mutation_parent_selection(
     population: list,
     fitness: List[float],
@@ -317,12 +804,15 @@ def mutation_parent_selection(
     else:
         mutable_fitness = mutable_fitness[:len(population)]
 
+    lengths = parsimony_lengths(mutable_population, gp_par.parent_selection, gp_par)
     selected = selection(
         range(len(mutable_population)),
-        fitness,
+        tarpeian(fitness, lengths, gp_par.tarpeian_p),
         n_parents_mutation,
         gp_par.parent_selection,
-        pressure_factor
+        pressure_factor,
+        lengths,
+        gp_par
     )
     return selected
 
@@ -333,25 +823,40 @@ def survivor_selection(
     crossover_offspring: list,
     mutated_offspring: list,
     gp_par: GpParameters,
-    pressure_factor: bool = None
+    pressure_factor: bool = None,
+    selection_fitness: List[float] = None
 ) -> Tuple[list, List[float]]:
-    """Select survivors for next generation."""
+    """
+    Select survivors for next generation.
+
+    If selection_fitness is given, it is used instead of fitness to select the survivors
+    that are not elites.
+    If there are too few offspring to fill the population, e.g. because offspring were
+    rejected by screening, more parents are kept selectable.
+    """
+    if selection_fitness is None:
+        selection_fitness = fitness
     selectable = []
     selectable_fitness = []
+    selectable_score = []
     survivors = []
     survivor_fitness = []
 
     # Pick out selectable parents using elitism.
     n_parents = int(round(gp_par.f_parents * gp_par.n_population))
+    n_offspring = len(crossover_offspring) + len(mutated_offspring)
+    n_parents = min(max(n_parents, gp_par.n_population - n_offspring), len(population))
     if n_parents > 0:
         parents = elite_selection(range(len(population)), fitness[:len(population)], n_parents)
         for i in parents:
             selectable.append(population[i])
             selectable_fitness.append(fitness[i])
+            selectable_score.append(selection_fitness[i])
 
     # Add offspring
     selectable += crossover_offspring + mutated_offspring
     selectable_fitness += fitness[len(population):]
+    selectable_score += selection_fitness[len(population):]
 
     # Pick out elites
     n_elites = int(round(gp_par.f_elites * gp_par.n_population))
@@ -363,10 +868,12 @@ def survivor_selection(
             survivor_fitness.append(selectable_fitness[i])
             selectable.pop(i)
             selectable_fitness.pop(i)
+            selectable_score.pop(i)
 
     n_to_select = gp_par.n_population - len(survivors)
-    selected = selection(range(len(selectable)), selectable_fitness, n_to_select,
-                         gp_par.survivor_selection, pressure_factor)
+    selected = selection(range(len(selectable)), selectable_score, n_to_select,
+                         gp_par.survivor_selection, pressure_factor,
+                         parsimony_lengths(selectable, gp_par.survivor_selection, gp_par), gp_par)
 
     for i in selected:
         survivors.append(selectable[i])
@@ -375,14 +882,34 @@ def survivor_selection(
     return survivors, survivor_fitness
 
 
+def parsimony_lengths(
+    individuals: list,
+    selection_method: SelectionMethods,
+    gp_par: GpParameters
+) -> List[int] or None:
+    """Return the lengths of the individuals if bloat control needs them, otherwise None."""
+    if gp_par.tarpeian_p > 0 or selection_method in (
+            SelectionMethods.DOUBLE_TOURNAMENT, SelectionMethods.PARETO):
+        return [len(individual) for individual in individuals]
+    return None
+
+
 def selection(
     population: list,
     fitness: List[float],
     n_selected: int,
     selection_method: SelectionMethods,
-    pressure_factor: float = None
+    pressure_factor: float = None,
+    lengths: List[int] = None,
+    gp_par: GpParameters = None
 ) -> list:
-    """Select individuals from population."""
+    # pylint: disable=too-many-arguments
+    """
+    Select individuals from population.
+
+    The parsimony methods, double tournament and pareto, also need the lengths
+    of the individuals. Double tournament settings are taken from gp_par.
+    """
     if selection_method == SelectionMethods.ELITISM:
         selected = elite_selection(population, fitness, n_selected)
     elif selection_method == SelectionMethods.TOURNAMENT:
@@ -395,6 +922,19 @@ def selection(
         selected = random.sample(population, n_selected)
     elif selection_method == SelectionMethods.ALL:
         selected = population
+    elif selection_method == SelectionMethods.DOUBLE_TOURNAMENT:
+        if gp_par is None:
+            gp_par = GpParameters()
+        selected = [population[i] for i in double_tournament_indices(
+            fitness[:len(population)],
+            lengths,
+            n_selected,
+            gp_par.double_tournament_size,
+            gp_par.parsimony_pressure
+        )]
+    elif selection_method == SelectionMethods.PARETO:
+        selected = [population[i] for i in pareto_indices(
+            fitness[:len(population)], lengths, n_selected)]
     else:
         raise Exception('Invalid selection method')
 
@@ -403,35 +943,148 @@ def selection(
 
 def elite_selection(population: list, fitness: List[float], n_elites: int) -> list:
     """Elite selection from population."""
-    sorted_population = sorted(zip(fitness, population), key=lambda x: (x[0]), reverse=True)
+    return [population[i] for i in elite_indices(fitness[:len(population)], n_elites)]
+
 
-    return [x for _, x in sorted_population[:n_elites]]
+def elite_indices(fitness: List[float], n_elites: int) -> np.ndarray:
+    """
+    Return the indices of the n_elites individuals with highest fitness.
+
+    Individuals with equal fitness are ordered as in the input.
+    """
+    fitness = np.asarray(fitness, dtype=float)
+    n_elites = min(max(n_elites, 0), len(fitness))
+    if n_elites == 0:
+        return np.array([], dtype=int)
+    if n_elites < len(fitness):
+        # Only sort the individuals that are at least as good as the n_elites:th best
+        kth = len(fitness) - n_elites
+        threshold = np.partition(fitness, kth)[kth]
+        candidates = np.flatnonzero(fitness >= threshold)
+    else:
+        candidates = np.arange(len(fitness))
+    order = np.argsort(-fitness[candidates], kind='stable')
+    return candidates[order[:n_elites]]
 
 
 def tournament_selection(population: list, fitness: List[float], n_winners: int) -> list:
     """Implement Tournament Selection."""
+    return [population[i] for i in tournament_indices(fitness[:len(population)], n_winners)]
+
+
+def tournament_indices(fitness: List[float], n_winners: int) -> np.ndarray:
+    """
+    Return the indices of the winners of a single elimination tournament.
+
+    The bracket is filled up with dummies, that always lose, to a size of n_winners
+    times a power of two. All matches of one round are played at the same time.
+    """
+    fitness = np.asarray(fitness, dtype=float)
+    n_contestants = len(fitness)
+    if n_winners <= 0:
+        return np.array([], dtype=int)
+    if n_winners >= n_contestants:
+        return np.random.permutation(n_contestants)
+
     tournament_size = n_winners
-    while tournament_size < len(population):
+    while tournament_size < n_contestants:
         tournament_size *= 2
 
-    tournament_population = list(zip(fitness, population))
-    random.shuffle(tournament_population)
+    order = np.random.permutation(n_contestants)
+    # Dummies, marked with -1, are placed first in each of the first matches
+    n_dummies = tournament_size - n_contestants
+    contestants = np.full(tournament_size, -1)
+    contestants[1:2 * n_dummies:2] = order[:n_dummies]
+    contestants[2 * n_dummies:] = order[n_dummies:]
+    scores = np.full(tournament_size, -np.inf)
+    scores[contestants >= 0] = fitness[contestants[contestants >= 0]]
+
+    while len(contestants) > n_winners:
+        matches = np.arange(len(contestants) // 2)
+        pairs = contestants.reshape(-1, 2)
+        pair_scores = scores.reshape(-1, 2)
+        # Winner is the first contestant of the match on equal fitness, unless it is a dummy
+        winner = ((pairs[:, 0] < 0) |
+                  ((pairs[:, 1] >= 0) & (pair_scores[:, 1] > pair_scores[:, 0]))).astype(int)
+        contestants = pairs[matches, winner]
+        scores = pair_scores[matches, winner]
+
+    return contestants
+
+
+def double_tournament_indices(
+    fitness: List[float],
+    lengths: List[int],
+    n_winners: int,
+    tournament_size: int,
+    parsimony_pressure: float
+) -> np.ndarray:
+    """
+    Return the indices of the winners of double tournaments.
 
-    for i in range(tournament_size - len(population)):
-        # Add dummies to make sure we have a full tournament
-        tournament_population.insert(i * 2, (-float('inf'), []))
+    Each winner is the fittest of tournament_size contestants. Each contestant is the
+    winner of a size tournament between two random individuals, where the shorter one
+    wins with probability parsimony_pressure / 2. A winner can only be selected once.
+    """
+    fitness = np.asarray(fitness, dtype=float)
+    lengths = np.asarray(lengths)
+    remaining = np.arange(len(fitness))
+    winners = []
+    for _ in range(min(max(n_winners, 0), len(fitness))):
+        first = np.random.randint(len(remaining), size=tournament_size)
+        # The second of each pair is different from the first if possible
+        second = (first + np.random.randint(1, max(len(remaining), 2), size=tournament_size)) %\
+            len(remaining)
+        pairs = remaining[np.stack((first, second), axis=1)]
+        first_shorter = lengths[pairs[:, 0]] <= lengths[pairs[:, 1]]
+        shorter_wins = np.random.random(tournament_size) < parsimony_pressure / 2
+        contestants = np.where(first_shorter == shorter_wins, pairs[:, 0], pairs[:, 1])
+        winner = contestants[np.argmax(fitness[contestants])]
+        winners.append(winner)
+        remaining = remaining[remaining != winner]
+    return np.array(winners, dtype=int)
+
+
+def pareto_indices(fitness: List[float], lengths: List[int], n_selected: int) -> np.ndarray:
+    """
+    Return the indices of n_selected individuals by Pareto ranking.
 
-    winner_fitness, winners = [list(x) for x in zip(*tournament_population)]
-    while len(winners) > n_winners:
-        for i in range(0, int(len(winners) / 2)):
-            if winner_fitness[i] < winner_fitness[i+1]:
-                winner_fitness.pop(i)
-                winners.pop(i)
-            else:
-                winner_fitness.pop(i + 1)
-                winners.pop(i + 1)
+    Individuals are sorted on non-dominated fronts with respect to high fitness
+    and short length, and within a front on fitness.
+    """
+    fitness = np.asarray(fitness, dtype=float)
+    lengths = np.asarray(lengths, dtype=float)
+    n = len(fitness)
+    # dominated_by[i, j] is True if individual j dominates individual i
+    dominated_by = (fitness[None, :] >= fitness[:, None]) & (lengths[None, :] <= lengths[:, None]) &\
+        ((fitness[None, :] > fitness[:, None]) | (lengths[None, :] < lengths[:, None]))
+    front = np.zeros(n, dtype=int)
+    remaining = np.ones(n, dtype=bool)
+    rank = 0
+    while remaining.any():
+        current = remaining & ~dominated_by[:, remaining].any(axis=1)
+        front[current] = rank
+        remaining &= ~current
+        rank += 1
+    order = np.lexsort((np.arange(n), -fitness, front))
+    return order[:min(max(n_selected, 0), n)]
+
+
+def tarpeian(fitness: List[float], lengths: List[int], p_kill: float) -> List[float]:
+    """
+    Tarpeian bloat control.
 
-    return winners
+    Individuals longer than the average get fitness -inf with probability p_kill.
+    Fitness is returned unchanged if p_kill is 0.
+    """
+    if p_kill <= 0:
+        return fitness
+    fitness = list(fitness)
+    mean_length = mean(lengths)
+    for i, kill in enumerate(np.random.random(len(lengths)) < p_kill):
+        if kill and lengths[i] > mean_length:
+            fitness[i] = -float('inf')
+    return fitness
 
 
 def rank_selection(population: list, fitness: List[float], n_selected: int) -> list:
@@ -460,15 +1113,26 @@ def adjustable_rank_selection(
     Selection pressure is at its max when pressure_factor = 1.
     Pressure_factor = 0 would lead to even selection probability for all individuals.
     """
+    selected = rank_indices(fitness[:len(population)], n_selected, pressure_factor)
+    return [population[i] for i in selected]
+
+
+def rank_indices(fitness: List[float], n_selected: int, pressure_factor: float) -> np.ndarray:
+    """
+    Return the indices of n_selected individuals drawn without replacement by rank.
+
+    Individuals are ranked by fitness and, on equal fitness, by descending index.
+    The probabilities decrease linearly with rank according to pressure_factor.
+    """
     pressure_factor = min(1, max(0, pressure_factor))
-    sorted_population = sorted(zip(fitness, population), reverse=True)
-    _, sorted_indices = [list(x) for x in zip(*sorted_population)]
-    n_ranks = len(sorted_indices)
+    fitness = np.asarray(fitness, dtype=float)
+    n_ranks = len(fitness)
+    sorted_indices = np.lexsort((-np.arange(n_ranks), -fitness))
     p_0 = (1/n_ranks) * (1 - pressure_factor)
     p_n = (2/n_ranks) - p_0
     p = np.linspace(p_n, p_0, n_ranks)
 
-    return list(np.random.choice(sorted_indices, size=n_selected, replace=False, p=p))
+    return np.random.choice(sorted_indices, size=n_selected, replace=False, p=p)
 
 
 def print_population(population: list, fitness: float, generation: int) -> None:
@@ -482,27 +1146,135 @@ def print_population(population: list, fitness: float, generation: int) -> None:
     print(population[best])
 
 
+def novelty_fitness(
+    individuals: list,
+    fitness: List[float],
+    hash_table: HashTable,
+    descriptors: Dict[bytes, np.ndarray],
+    archive: NoveltyArchive,
+    gp_par: GpParameters
+) -> List[float]:
+    """
+    Return selection scores that combine fitness and novelty of the individuals.
+
+    Novelty is computed from the behavior descriptors of the last episode of each
+    individual, individuals without a descriptor get zero novelty.
+    """
+    keys = [hash_table.key(individual) for individual in individuals]
+    has_descriptor = [i for i, key in enumerate(keys) if key in descriptors]
+    novelty = np.zeros(len(individuals))
+    if len(has_descriptor) > 0:
+        novelty[has_descriptor] = archive.novelty([descriptors[keys[i]] for i in has_descriptor])
+    return combined_score(fitness, novelty, gp_par.novelty_weight)
+
+
+def update_archive(
+    offspring: list,
+    hash_table: HashTable,
+    descriptors: Dict[bytes, np.ndarray],
+    archive: NoveltyArchive,
+    gp_par: GpParameters
+) -> None:
+    """Add the descriptors of the most novel offspring to the novelty archive."""
+    offspring_descriptors = []
+    for individual in offspring:
+        key = hash_table.key(individual)
+        if key in descriptors:
+            offspring_descriptors.append(descriptors[key])
+    if len(offspring_descriptors) > 0 and gp_par.novelty_archive_add > 0:
+        novelty = archive.novelty(offspring_descriptors)
+        most_novel = np.argsort(-novelty, kind='stable')[:gp_par.novelty_archive_add]
+        archive.add([offspring_descriptors[i] for i in most_novel])
+
+
 def run(
     environment: Any,
     gp_par: GpParameters,
     hotstart: bool = False,
-    baseline: Any = None
+    baseline: Any = None,
+    cheap_environment: Any = None,
+    evaluator: Evaluator = None,
+    crossover_baseline_index: int = None,
+    generation_callback: Callable[[int], bool] = None,
+    clear_logs: bool = True
 ) -> Tuple[list, List[float], float, Any]:
-    # pylint: disable=too-many-statements, too-many-locals, too-many-branches
-    """Run the genetic programming algorithm."""
-    hash_table = HashTable(gp_par.hash_table_size, gp_par.log_name)
+    # pylint: disable=too-many-statements, too-many-locals, too-many-branches, too-many-arguments
+    """
+    Run the genetic programming algorithm.
+
+    Episodes are run by the evaluator, one batch for the population and one for each
+    kind of offspring per generation. Default is get_evaluator(environment).
+    If cheap_environment is given or gp_par.surrogate is set, offspring are screened
+    before they are evaluated in environment, see get_offspring_fitness.
+    crossover_baseline_index is the position in the baseline where crossover inserts
+    subtrees, see gp_bt_interface.crossover_genome.
+    generation_callback is called with the generation number before each generation
+    and the run is stopped if it returns True.
+    If clear_logs is False, the log folder is kept when starting a new run.
+    If gp_par.novelty_weight > 0, parents and survivors are selected on a blend of
+    fitness and novelty, and environment must return (fitness, descriptor) from get_fitness.
+    If gp_par.run_seed is set, the environments are wrapped in a SeededEnvironment,
+    a given evaluator must do the same for results that do not depend on the evaluator.
+    If gp_par.cache_path is set, episodes of environment are shared with other runs
+    through a PersistentCache.
+    """
+    start_time = time.time()
+    environment = seeded_environment(environment, gp_par.run_seed)
+    cheap_environment = seeded_environment(cheap_environment, gp_par.run_seed)
+    if evaluator is None:
+        evaluator = get_evaluator(environment)
+    hash_table = HashTable(
+        gp_par.hash_table_size,
+        gp_par.log_name,
+        behavior_lists=key_behavior_lists(gp_par),
+        persistent_cache=get_persistent_cache(gp_par),
+        **hash_table_limits(gp_par)
+    )
+    cheap_hash_table = None
+    if cheap_environment is not None:
+        cheap_hash_table = HashTable(
+            gp_par.hash_table_size, gp_par.log_name, 'cheap_hash_log', key_behavior_lists(gp_par),
+            **hash_table_limits(gp_par))
+    adaptation = None
+    if gp_par.operator_adaptation != AdaptationMethods.NONE:
+        adaptation = OperatorAdaptation(
+            operator_probabilities(gp_par),
+            gp_par.operator_adaptation,
+            gp_par.adaptation_p_min,
+            gp_par.adaptation_rate
+        )
+    surrogate = None
+    if gp_par.surrogate:
+        surrogate = SurrogateModel(
+            gp_par.behavior_lists,
+            min_samples=gp_par.surrogate_min_samples,
+            exploration=gp_par.surrogate_exploration
+        )
+    archive = None
+    descriptors = None
+    if gp_par.novelty_weight > 0:
+        archive = NoveltyArchive(gp_par.novelty_k)
+        descriptors = {}
+    hall_of_fame = None
+    if gp_par.hall_of_fame_size > 0:
+        hall_of_fame = HallOfFame(gp_par.hall_of_fame_size, gp_par.log_name, hash_table=hash_table)
+    journal = None
+    if gp_par.journal_compact_interval > 0:
+        journal = Journal(gp_par.log_name, compact_interval=gp_par.journal_compact_interval)
 
     if hotstart:
         best_fitness, n_episodes, last_generation, population =\
-            load_state(gp_par.log_name, hash_table)
+            load_state(gp_par.log_name, hash_table, cheap_hash_table, hall_of_fame, journal)
     else:
         population = create_population(
             gp_par.n_population,
             gp_par.ind_start_length,
             gp_par.mutation_p_leaf,
-            gp_par.behavior_lists
+            gp_par.behavior_lists,
+            max_depth=gp_par.ind_start_depth
         )
-        logplot.clear_logs(gp_par.log_name)
+        if clear_logs:
+            logplot.clear_logs(gp_par.log_name)
         best_fitness = []
         n_episodes = []
         n_episodes.append(hash_table.n_values)
@@ -512,18 +1284,16 @@ def run(
             population[0] = baseline
             baseline_index = 0
 
-    fitness = []
-    for individual in population:
-        fitness.append(get_fitness(
-            individual,
-            hash_table,
-            environment,
-            rerun_fitness=0,
-            min_episodes=gp_par.min_episodes
-        ))
+    fitness = get_fitness_batch(
+        population, hash_table, evaluator, 0, gp_par.min_episodes, descriptors)
+    if surrogate is not None:
+        for individual, value in zip(population, fitness):
+            surrogate.add(individual, value)
 
     if not hotstart:
         best_fitness.append(max(fitness))
+        if hall_of_fame is not None:
+            hall_of_fame.update(population, fitness)
 
         if gp_par.verbose:
             print_population(population, fitness, last_generation)
@@ -531,58 +1301,128 @@ def run(
 
         logplot.log_fitness(gp_par.log_name, fitness)
         logplot.log_population(gp_par.log_name, population)
+        logplot.log_length(gp_par.log_name, population)
+        log_hash_table(gp_par.log_name, last_generation, hash_table)
 
     generation = gp_par.n_generations - 1  # In case loop is skipped due to hotstart
     for generation in range(last_generation + 1, gp_par.n_generations):
+        if termination_reached(gp_par, best_fitness, n_episodes, start_time) or\
+                (generation_callback is not None and generation_callback(generation)):
+            generation -= 1  # This generation is not run
+            break
+
         if gp_par.keep_baseline:
             if baseline is not None and baseline not in population:
                 population.append(baseline)  # Make sure we are able to source from baseline
 
         if generation > 1:
-            fitness = []
+            fitness = get_fitness_batch(population, hash_table, evaluator,
+                                        gp_par.rerun_fitness, gp_par.min_episodes, descriptors)
             for index, individual in enumerate(population):
-                fitness.append(get_fitness(
-                    individual,
-                    hash_table,
-                    environment,
-                    gp_par.rerun_fitness,
-                    gp_par.min_episodes
-                ))
                 if baseline is not None and individual == baseline:
                     baseline_index = index
         if gp_par.keep_baseline and gp_par.boost_baseline and baseline is not None:
             baseline_fitness = fitness[baseline_index]
             fitness[baseline_index] = max(fitness)
 
-        co_parents = crossover_parent_selection(population, fitness, gp_par)
-        co_offspring = crossover(population, co_parents, gp_par)
-        for offspring in co_offspring:
-            fitness.append(get_fitness(
-                offspring, hash_table, environment, gp_par.rerun_fitness, gp_par.min_episodes))
+        if surrogate is not None:
+            surrogate.threshold = min(fitness)
+
+        generation_par = gp_par
+        if adaptation is not None:
+            generation_par = adapted_parameters(gp_par, adaptation)
+
+        genome_index = None if gp_par.allow_identical else\
+            GenomeIndex(population, key_behavior_lists(gp_par))
+        selection_fitness = fitness
+        if archive is not None:
+            selection_fitness = novelty_fitness(
+                population, fitness, hash_table, descriptors, archive, gp_par)
+        co_parents = crossover_parent_selection(population, selection_fitness, generation_par)
+        co_population, crossover_parents = hall_of_fame_parents(
+            population, co_parents, hall_of_fame, gp_par)
+        co_candidates = crossover(co_population, crossover_parents, gp_par, baseline,
+                                  crossover_baseline_index, genome_index, adaptation)
+        # Offspring rejected by screening do not take part in selection
+        co_offspring, co_fitness = get_offspring_fitness(
+            co_candidates, hash_table, evaluator, gp_par, cheap_hash_table, cheap_environment,
+            surrogate, descriptors)
+        fitness += co_fitness
 
         if gp_par.boost_baseline and gp_par.boost_baseline_only_co and baseline is not None:
             # Restore original fitness for survivor selection
             fitness[baseline_index] = baseline_fitness
 
+        selection_fitness = fitness
+        if archive is not None:
+            selection_fitness = novelty_fitness(
+                population + co_offspring, fitness, hash_table, descriptors, archive, gp_par)
         mutation_parents = mutation_parent_selection(
-            population, fitness, co_parents, co_offspring, gp_par)
-        mutated_offspring = mutation(population + co_offspring, mutation_parents, gp_par)
-        for offspring in mutated_offspring:
-            fitness.append(get_fitness(
-                offspring, hash_table, environment, gp_par.rerun_fitness, gp_par.min_episodes))
+            population, selection_fitness, co_parents, co_offspring, generation_par)
+        mutation_candidates = mutation(
+            population + co_offspring, mutation_parents, gp_par, genome_index, adaptation)
+        mutated_offspring, mutation_fitness = get_offspring_fitness(
+            mutation_candidates, hash_table, evaluator, gp_par, cheap_hash_table,
+            cheap_environment, surrogate, descriptors)
+        fitness += mutation_fitness
 
         if gp_par.boost_baseline and baseline is not None:
             # Restore original fitness for survivor selection
             fitness[baseline_index] = baseline_fitness
 
+        if gp_par.racing:
+            fitness = race(population + co_offspring + mutated_offspring, fitness, hash_table,
+                           environment, gp_par.n_population, gp_par, evaluator.evaluate_batch)
+
+        if adaptation is not None:
+            # Rejected offspring are credited as no improvement
+            accepted = {id(x) for x in co_offspring + mutated_offspring}
+            rejected = [x for x in co_candidates + mutation_candidates if id(x) not in accepted]
+            adaptation.credit(population + co_offspring + mutated_offspring + rejected,
+                              fitness + [-float('inf')] * len(rejected))
+            logplot.log_operators(gp_par.log_name, adaptation.probabilities)
+        if hall_of_fame is not None:
+            hall_of_fame.update(population + co_offspring + mutated_offspring, fitness)
+
+        selection_fitness = None
+        if archive is not None:
+            selection_fitness = novelty_fitness(population + co_offspring + mutated_offspring,
+                                                fitness, hash_table, descriptors, archive, gp_par)
+            update_archive(co_offspring + mutated_offspring,
+                           hash_table, descriptors, archive, gp_par)
         population, fitness = survivor_selection(
-            population, fitness, co_offspring, mutated_offspring, gp_par)
+            population, fitness, co_offspring, mutated_offspring, gp_par,
+            selection_fitness=selection_fitness)
+        if gp_par.memetic_elites > 0:
+            population, fitness = memetic_search(
+                population,
+                fitness,
+                gp_par,
+                functools.partial(
+                    get_fitness_batch,
+                    hash_table=hash_table,
+                    evaluator=evaluator,
+                    min_episodes=gp_par.min_episodes
+                )
+            )
+            if hall_of_fame is not None:
+                hall_of_fame.update(population, fitness)
 
         best_fitness.append(max(fitness))
         n_episodes.append(hash_table.n_values)
 
         logplot.log_fitness(gp_par.log_name, fitness)
         logplot.log_population(gp_par.log_name, population)
+        logplot.log_length(gp_par.log_name, population)
+        log_hash_table(gp_par.log_name, generation, hash_table)
+        if surrogate is not None:
+            logplot.log_surrogate(
+                gp_par.log_name,
+                generation,
+                surrogate.n_rejected * gp_par.min_episodes,
+                surrogate.precision(),
+                surrogate.recall()
+            )
 
         if gp_par.verbose:
             print(
@@ -601,7 +1441,10 @@ def run(
                 n_episodes,
                 baseline,
                 generation,
-                hash_table
+                hash_table,
+                cheap_hash_table,
+                hall_of_fame,
+                journal
             )
 
     print('\nFINAL POPULATION: ')
@@ -617,7 +1460,10 @@ def run(
         n_episodes,
         baseline,
         generation,
-        hash_table
+        hash_table,
+        cheap_hash_table,
+        hall_of_fame,
+        journal
     )
 
     if gp_par.plot:
@@ -646,33 +1492,85 @@ def save_state(
     n_episodes: int,
     baseline: float,
     generation: int,
-    hash_table: HashTable
+    hash_table: HashTable,
+    cheap_hash_table: HashTable = None,
+    hall_of_fame: HallOfFame = None,
+    journal: Journal = None
 ) -> None:
     # pylint: disable=too-many-arguments
-    """Save state for later hotstart."""
-    logplot.log_last_population(gp_par.log_name, population)
-    if best_individual is not None:
-        logplot.log_best_individual(gp_par.log_name, best_individual)
-    logplot.log_best_fitness(gp_par.log_name, best_fitness)
-    logplot.log_n_episodes(gp_par.log_name, n_episodes)
-    logplot.log_settings(gp_par.log_name, gp_par, baseline)
-    logplot.log_state(gp_par.log_name, random.getstate(), np.random.get_state(), generation)
-    hash_table.write_table()
+    """
+    Save state for later hotstart.
+
+    The hash tables are saved as binary snapshots, and exported as text for the final
+    state with best_individual.
+    If journal is given, the changes since the last save are appended to it, and the
+    full logs and hash tables are only written for the final state.
+    """
+    if journal is not None:
+        journal.checkpoint(
+            population, best_fitness, n_episodes, generation, hash_tables(hash_table, cheap_hash_table))
+    if journal is None or best_individual is not None:
+        logplot.log_last_population(gp_par.log_name, population)
+        if best_individual is not None:
+            logplot.log_best_individual(gp_par.log_name, best_individual)
+        logplot.log_best_fitness(gp_par.log_name, best_fitness)
+        logplot.log_n_episodes(gp_par.log_name, n_episodes)
+        logplot.log_settings(gp_par.log_name, gp_par, baseline)
+        logplot.log_state(gp_par.log_name, random.getstate(), np.random.get_state(), generation)
+        hash_table.write_table()
+        if cheap_hash_table is not None:
+            cheap_hash_table.write_table()
+        if best_individual is not None:
+            hash_table.export_text()
+            if cheap_hash_table is not None:
+                cheap_hash_table.export_text()
+    if hash_table.persistent_cache is not None:
+        cache = hash_table.persistent_cache
+        logplot.log_persistent_cache(
+            gp_par.log_name, generation, cache.n_hits, cache.n_misses, cache.n_reused, cache.n_stored)
+    if hall_of_fame is not None:
+        hall_of_fame.save()
+
+
+def log_hash_table(log_name: str, generation: int, hash_table: HashTable) -> None:
+    """Log the size and the counters of the hash table after a generation."""
+    logplot.log_hash_table(
+        log_name, generation, len(hash_table.table), hash_table.resident_bytes,
+        hash_table.n_hits, hash_table.n_misses, hash_table.n_evictions)
 
 
 def load_state(
     log_name: str,
-    hash_table: HashTable
+    hash_table: HashTable,
+    cheap_hash_table: HashTable = None,
+    hall_of_fame: HallOfFame = None,
+    journal: Journal = None
 ) -> Tuple[float, int, int, list]:
-    """Load state for hotstart."""
-    population = logplot.get_last_population(log_name)
-    best_fitness = logplot.get_best_fitness(log_name)
-    n_episodes = logplot.get_n_episodes(log_name)
-    randomstate, np_randomstate, generation = logplot.get_state(log_name)
+    """
+    Load state for hotstart.
+
+    If journal is given and has been written, the state is replayed from it instead
+    of the full logs and hash tables.
+    """
+    if journal is not None and journal.exists():
+        population, best_fitness, n_episodes, randomstate, np_randomstate, generation =\
+            journal.replay(hash_tables(hash_table, cheap_hash_table))
+    else:
+        population = logplot.get_last_population(log_name)
+        best_fitness = logplot.get_best_fitness(log_name)
+        n_episodes = logplot.get_n_episodes(log_name)
+        randomstate, np_randomstate, generation = logplot.get_state(log_name)
+        hash_table.load()
+        if cheap_hash_table is not None:
+            cheap_hash_table.load()
     random.setstate(randomstate)
     np.random.set_state(np_randomstate)
     logplot.clear_after_generation(log_name, generation)
-    hash_table.load()
+    if hall_of_fame is not None:
+        hall_of_fame.load()
     return best_fitness, n_episodes, generation, population
 
 
+def hash_tables(hash_table: HashTable, cheap_hash_table: HashTable = None) -> List[HashTable]:
+    """Return the hash tables of a run in the order they are journaled."""
+    return [table for table in (hash_table, cheap_hash_table) if table is not None]
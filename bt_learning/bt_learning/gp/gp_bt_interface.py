@@ -31,8 +31,9 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
 # THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+from copy import deepcopy
 import random
-from typing import List, Tuple
+from typing import Any, List, Tuple
 
 from behaviors import behavior_tree
 from behaviors.behavior_lists import BehaviorLists, ParameterizedNode
@@ -48,6 +49,103 @@ def random_genome(
     return bt.random(length, p_leaf)
 
 
+def grammar_genome(
+    depth: int,
+    length: int,
+    p_leaf: float,
+    behavior_lists: BehaviorLists,
+    full: bool = False
+) -> List[ParameterizedNode]:
+    """
+    Return a random genome that is valid by construction.
+
+    Nodes are drawn from the control, condition and behavior node classes so that
+    the rules of BT.is_valid always hold and no rejection sampling is needed.
+    In full mode control nodes are grown on every branch until depth is reached,
+    in grow mode a leaf is chosen with probability p_leaf. The genome has length
+    nodes, not counting up nodes.
+    """
+    if depth < 1 or length < 2:
+        return [_random_node(behavior_lists.behavior_nodes)]
+
+    root = random.choice(behavior_lists.control_nodes)
+    children, _ = _grammar_children(root, depth, length - 1, p_leaf, behavior_lists, full)
+    return [root] + children + [behavior_lists.get_up_node()]
+
+
+def _grammar_children(
+    parent: str,
+    depth: int,
+    budget: int,
+    p_leaf: float,
+    behavior_lists: BehaviorLists,
+    full: bool
+) -> Tuple[List[ParameterizedNode], int]:
+    # pylint: disable=too-many-arguments, too-many-locals
+    """
+    Return the children of parent and the number of nodes used of the budget.
+
+    The last child is always a behavior node or a subtree ending with one, which
+    guarantees that the tree has a behavior node.
+    """
+    fallback_allowed = not behavior_lists.is_fallback_node(parent)
+    sequence_allowed = not behavior_lists.is_sequence_node(parent)
+    control_nodes = [node for node in behavior_lists.control_nodes
+                     if (fallback_allowed or not behavior_lists.is_fallback_node(node)) and
+                     (sequence_allowed or not behavior_lists.is_sequence_node(node))]
+    leaf_nodes = behavior_lists.condition_nodes + behavior_lists.action_nodes
+    if fallback_allowed:
+        leaf_nodes = leaf_nodes + behavior_lists.atomic_fallback_nodes
+    if sequence_allowed:
+        leaf_nodes = leaf_nodes + behavior_lists.atomic_sequence_nodes
+    behavior_nodes = [node for node in leaf_nodes if behavior_lists.is_behavior_node(node)]
+
+    children = []
+    used = 0
+    previous = None
+    previous_behavior = False
+    while used < budget:
+        left = budget - used
+        if depth > 1 and control_nodes and left >= 2 and (full or random.random() >= p_leaf):
+            node = random.choice(control_nodes)
+            subtree, subtree_used = _grammar_children(
+                node, depth - 1, random.randint(1, left - 1), p_leaf, behavior_lists, full)
+            children += [node] + subtree + [behavior_lists.get_up_node()]
+            used += 1 + subtree_used
+            previous = None
+            previous_behavior = False
+        else:
+            candidates = behavior_nodes if left == 1 or previous_behavior else leaf_nodes
+            # Identical leaves directly after one another are not allowed
+            candidates = [node for node in candidates if node != previous]
+            if not candidates:
+                # Only happens after a behavior node, so the subtree is already valid
+                break
+            previous = random.choice(candidates)
+            previous_behavior = behavior_lists.is_behavior_node(previous)
+            children.append(_random_node([previous]))
+            used += 1
+
+    return children, used
+
+
+def _random_node(nodes: List[Any]) -> ParameterizedNode:
+    """Return a copy of a random node from nodes with random parameters."""
+    node = deepcopy(random.choice(nodes))
+    if isinstance(node, ParameterizedNode):
+        node.add_random_parameters()
+    return node
+
+
+def within_limits(bt: behavior_tree.BT, max_length: int = 0, max_depth: int = 0) -> bool:
+    """Check that the bt is not longer or deeper than the limits, 0 means no limit."""
+    if max_length > 0 and len(bt.bt) > max_length:
+        return False
+    if max_depth > 0 and bt.depth() > max_depth:
+        return False
+    return True
+
+
 def mutate_gene(
     genome: List[ParameterizedNode],
     p_add: float,
@@ -56,9 +154,17 @@ def mutate_gene(
     p_replace: float,
     p_swap: float,
     p_leaf: float,
-    behavior_lists: BehaviorLists
+    behavior_lists: BehaviorLists,
+    max_length: int = 0,
+    max_depth: int = 0
 ):
-    """ Mutate only a single gene."""
+    # pylint: disable=too-many-arguments
+    """
+    Mutate only a single gene.
+
+    Mutations that make the genome longer than max_length or deeper than max_depth
+    are rejected, 0 means no limit.
+    """
     if p_add < 0 or p_delete < 0 or p_variable < 0 or p_replace < 0 or p_swap < 0:
         raise Exception('Mutation parameters must not be negative.')
 
@@ -68,7 +174,8 @@ def mutate_gene(
     mutated_individual = behavior_tree.BT([], behavior_lists)
     max_attempts = 100
     attempts = 0
-    while (not mutated_individual.is_valid() or mutated_individual.bt == genome) and\
+    while (not mutated_individual.is_valid() or mutated_individual.bt == genome or
+           not within_limits(mutated_individual, max_length, max_depth)) and\
             attempts < max_attempts:
         mutated_individual.set(genome)
         index = random.randint(0, len(genome) - 1)
@@ -93,7 +200,8 @@ def mutate_gene(
         attempts += 1
 
     if attempts >= max_attempts and\
-       (not mutated_individual.is_valid() or mutated_individual.bt == genome):
+       (not mutated_individual.is_valid() or mutated_individual.bt == genome or
+            not within_limits(mutated_individual, max_length, max_depth)):
         mutated_individual = behavior_tree.BT([], behavior_lists)
 
     return mutated_individual.bt
@@ -105,10 +213,17 @@ def crossover_genome(
     genome1: List[ParameterizedNode],
     genome2: List[ParameterizedNode],
     behavior_lists: BehaviorLists,
-    replace: bool = True
+    replace: bool = True,
+    max_length: int = 0,
+    max_depth: int = 0
 ) -> Tuple[List[ParameterizedNode], List[ParameterizedNode]]:
-    # pylint: disable=too-many-branches, too-many-locals
-    """Do crossover between genomes at random points."""
+    # pylint: disable=too-many-branches, too-many-locals, too-many-arguments
+    """
+    Do crossover between genomes at random points.
+
+    Offspring longer than max_length or deeper than max_depth are rejected,
+    0 means no limit.
+    """
     bt1 = behavior_tree.BT(genome1, behavior_lists)
     bt2 = behavior_tree.BT(genome2, behavior_lists)
     offspring1 = behavior_tree.BT([], behavior_lists)
@@ -119,8 +234,9 @@ def crossover_genome(
         attempts = 0
         found = False
         while not found and attempts < max_attempts:
-            offspring1.set(bt1.bt)
-            offspring2.set(bt2.bt)
+            # The attempts only move nodes around, the accepted offspring are copied below
+            offspring1.bt = bt1.bt[:]
+            offspring2.bt = bt2.bt[:]
             cop1 = -1
             cop2 = -1
             if len(genome1) == 1:
@@ -158,10 +274,12 @@ def crossover_genome(
                 offspring2.insert_subtree(subtree1, index2)
 
             attempts += 1
-            if offspring1.is_valid() and offspring2.is_valid():
+            if offspring1.is_valid() and offspring2.is_valid() and\
+                    within_limits(offspring1, max_length, max_depth) and\
+                    within_limits(offspring2, max_length, max_depth):
                 found = True
         if not found:
             offspring1.set([])
             offspring2.set([])
 
-    return offspring1.bt, offspring2.bt
+    return deepcopy(offspring1.bt), deepcopy(offspring2.bt)
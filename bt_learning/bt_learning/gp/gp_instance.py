@@ -35,16 +35,22 @@ Designed for distributed island model and general genetic programming.
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
 # THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import functools
 import random
+import time
 from typing import Any, List, Tuple
 import numpy as np
 
 
 from behaviors.behavior_tree import BT
 from bt_learning.gp import logplot
+from bt_learning.gp.evaluators import seeded_environment
 import bt_learning.gp.genetic_programming as gp
 import bt_learning.gp.gp_parallel as gpp
-from bt_learning.gp.hash_table import HashTable
+from bt_learning.gp.hall_of_fame import HallOfFame
+from bt_learning.gp.hash_table import GenomeIndex, HashTable
+from bt_learning.gp.in_flight import InFlightRegistry
+from bt_learning.gp.operator_adaptation import AdaptationMethods, OperatorAdaptation
 
 
 class GPInstance:
@@ -56,17 +62,34 @@ class GPInstance:
         num_core: int,
         batch_size: int,
         gp_par: gp.GpParameters,
-        hotstart: bool = False
+        hotstart: bool = False,
+        in_flight: InFlightRegistry = None
     ):
-        self.environment = environment
+        self.environment = seeded_environment(environment, gp_par.run_seed)
         self.params = gp_par
         self.batch_size = batch_size
         self.num_core = num_core  # the max number of core the instance can use
+        self.in_flight = in_flight  # evaluations shared with other instances
         self.num_gen = 0   # the number of generation passed
+        self.start_time = time.time()
         # use a separated folder for each instance
         self.my_path = gp_par.log_name + '_instance_' + instance_name
-        self.hash_table = HashTable(gp_par.hash_table_size, self.my_path)
+        self.hash_table = HashTable(
+            gp_par.hash_table_size,
+            self.my_path,
+            behavior_lists=gp.key_behavior_lists(gp_par),
+            persistent_cache=gp.get_persistent_cache(gp_par),
+            **gp.hash_table_limits(gp_par)
+        )
+        self.hall_of_fame = None
+        if gp_par.hall_of_fame_size > 0:
+            self.hall_of_fame = HallOfFame(
+                gp_par.hall_of_fame_size, self.my_path, hash_table=self.hash_table)
         if hotstart:
+            # Load the snapshot first so that the population is not evaluated again
+            self.hash_table.load()
+            if self.hall_of_fame is not None:
+                self.hall_of_fame.load()
             self.population = logplot.get_last_population(self.my_path)
             self.fitness = self.evaluate_population(self.population)
             self.best_fitness = logplot.get_best_fitness(self.my_path)
@@ -75,20 +98,24 @@ class GPInstance:
             random.setstate(randomstate)
             np.random.set_state(np_randomstate)
             logplot.clear_after_generation(self.my_path, self.num_gen)
-            self.hash_table.load()
         else:
             self.population = gp.create_population(
                 gp_par.n_population,
                 gp_par.ind_start_length,
                 gp_par.mutation_p_leaf,
-                gp_par.behavior_lists
+                gp_par.behavior_lists,
+                max_depth=gp_par.ind_start_depth
             )
             logplot.clear_logs(self.my_path)
             self.fitness = self.evaluate_population(self.population)
             self.best_fitness = [max(self.fitness)]
             self.best_individual = [self.fitness.index(self.best_fitness[0])]
+            if self.hall_of_fame is not None:
+                self.hall_of_fame.update(self.population, self.fitness)
             logplot.log_fitness(self.my_path, self.fitness)
             logplot.log_population(self.my_path, self.population)
+            logplot.log_length(self.my_path, self.population)
+            gp.log_hash_table(self.my_path, self.num_gen, self.hash_table)
             self.n_episodes = []
             self.n_episodes.append(self.hash_table.n_values)
 
@@ -104,6 +131,15 @@ class GPInstance:
         self.best_from_crossover_count = 0
         self.best_from_replication_count = 0
 
+        self.adaptation = None
+        if gp_par.operator_adaptation != AdaptationMethods.NONE:
+            self.adaptation = OperatorAdaptation(
+                gp.operator_probabilities(gp_par),
+                gp_par.operator_adaptation,
+                gp_par.adaptation_p_min,
+                gp_par.adaptation_rate
+            )
+
         self.diversity_types = ['ed1', 'ed2', 'isomorphs', 'entropy']
         self.max_diversity = 0
         self.min_diversity = 99999
@@ -114,7 +150,8 @@ class GPInstance:
 
     def is_runnable(self) -> bool:
         """Check if the GP can be run."""
-        return self.num_gen < self.params.n_generations
+        return self.num_gen < self.params.n_generations and not gp.termination_reached(
+            self.params, self.best_fitness, self.n_episodes, self.start_time)
 
     def get_current_population(self) -> Tuple[list, List[float]]:
         """Return the current population with the fitness values."""
@@ -145,12 +182,19 @@ class GPInstance:
             best_k_fitness.append(self.fitness[i])
         return best_k, best_k_fitness
 
-    def get_migrants(self, num_migrants: int) -> Tuple[list, List[float]]:
+    def get_migrants(
+        self,
+        num_migrants: int,
+        from_hall_of_fame: bool = False
+    ) -> Tuple[list, List[float]]:
         """
         Return a list of migrants and the corresponding fitness score.
 
-        The best ones are selected as migrants.
+        The best ones are selected as migrants, from the hall of fame if
+        from_hall_of_fame is set and there is one, else from the population.
         """
+        if from_hall_of_fame and self.hall_of_fame is not None and len(self.hall_of_fame) > 0:
+            return self.hall_of_fame.best(num_migrants)
         return self.__get_best_k_from_population(num_migrants)
 
     def receive_migrants(self, migrants: list, migrant_fitness: List[float]) -> None:
@@ -191,7 +235,8 @@ class GPInstance:
             self.params.rerun_fitness,
             self.params.min_episodes,
             self.num_core,
-            self.batch_size
+            self.batch_size,
+            self.in_flight
         )
 
     def step_gp(self) -> None:
@@ -204,10 +249,23 @@ class GPInstance:
             return
         if self.params.rerun_fitness != 0 and self.num_gen > 1:
             self.fitness = self.evaluate_population(self.population)
+        generation_par = self.params
+        if self.adaptation is not None:
+            generation_par = gp.adapted_parameters(self.params, self.adaptation)
+        genome_index = None if self.params.allow_identical else\
+            GenomeIndex(self.population, gp.key_behavior_lists(self.params))
         # crossover steps
         co_parents = gp.crossover_parent_selection(
-            self.population, self.fitness, self.params, self.selection_pressure)
-        co_offspring = gp.crossover(self.population, co_parents, self.params)
+            self.population, self.fitness, generation_par, self.selection_pressure)
+        co_population, crossover_parents = gp.hall_of_fame_parents(
+            self.population, co_parents, self.hall_of_fame, self.params)
+        co_offspring = gp.crossover(
+            co_population,
+            crossover_parents,
+            self.params,
+            genome_index=genome_index,
+            adaptation=self.adaptation
+        )
         self.fitness += self.evaluate_population(co_offspring)
         # mutation steps
         mutation_parents = gp.mutation_parent_selection(
@@ -215,11 +273,16 @@ class GPInstance:
             self.fitness,
             co_parents,
             co_offspring,
-            self.params,
+            generation_par,
             self.selection_pressure
         )
         mutated_offspring = gp.mutation(
-            self.population + co_offspring, mutation_parents, self.params)
+            self.population + co_offspring,
+            mutation_parents,
+            self.params,
+            genome_index,
+            self.adaptation
+        )
         self.fitness += self.evaluate_population(mutated_offspring)
 
         # find where is the best individual from
@@ -232,6 +295,30 @@ class GPInstance:
             else:
                 self.best_from_mutation_count += 1
 
+        if self.params.racing:
+            self.fitness = gp.race(
+                self.population + co_offspring + mutated_offspring,
+                self.fitness,
+                self.hash_table,
+                self.environment,
+                self.params.n_population,
+                self.params,
+                functools.partial(
+                    gpp.evaluate_episodes,
+                    environment=self.environment,
+                    num_core=self.num_core,
+                    batch_size=self.batch_size
+                )
+            )
+
+        if self.adaptation is not None:
+            self.adaptation.credit(
+                self.population + co_offspring + mutated_offspring, self.fitness)
+            logplot.log_operators(self.my_path, self.adaptation.probabilities)
+        if self.hall_of_fame is not None:
+            self.hall_of_fame.update(
+                self.population + co_offspring + mutated_offspring, self.fitness)
+
         # select survivors
         self.population, self.fitness = gp.survivor_selection(
             self.population,
@@ -241,6 +328,11 @@ class GPInstance:
             self.params,
             self.selection_pressure
         )
+        if self.params.memetic_elites > 0:
+            self.population, self.fitness = gp.memetic_search(
+                self.population, self.fitness, self.params, self.evaluate_population)
+            if self.hall_of_fame is not None:
+                self.hall_of_fame.update(self.population, self.fitness)
 
         self.best_fitness.append(max(self.fitness))
         self.n_episodes.append(self.hash_table.n_values)
@@ -248,6 +340,8 @@ class GPInstance:
         self.log_diversity(False)
         logplot.log_fitness(self.my_path, self.fitness)
         logplot.log_population(self.my_path, self.population)
+        logplot.log_length(self.my_path, self.population)
+        gp.log_hash_table(self.my_path, self.num_gen, self.hash_table)
 
         if self.params.verbose:
             print(
@@ -368,3 +462,13 @@ class GPInstance:
         logplot.log_settings(self.my_path, self.params, None)
         logplot.log_state(self.my_path, random.getstate(), np.random.get_state(), self.num_gen)
         self.hash_table.write_table()
+        if best_individual:
+            self.hash_table.export_text()
+        if self.hash_table.persistent_cache is not None:
+            cache = self.hash_table.persistent_cache
+            logplot.log_persistent_cache(
+                self.my_path, self.num_gen,
+                cache.n_hits, cache.n_misses, cache.n_reused, cache.n_stored
+            )
+        if self.hall_of_fame is not None:
+            self.hall_of_fame.save()
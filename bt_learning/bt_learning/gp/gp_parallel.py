@@ -35,10 +35,11 @@ import functools
 import multiprocessing as mp
 import random
 from statistics import mean
-from typing import Any, List, Tuple
+from typing import Any, Dict, List, Tuple
 
 import bt_learning.gp.genetic_programming as gp
 from bt_learning.gp.hash_table import HashTable
+from bt_learning.gp.in_flight import InFlightRegistry
 
 
 def get_fitness_simple(
@@ -71,6 +72,19 @@ def get_fitness_min_population(
     return result
 
 
+def get_episodes_min_population(
+    min_population: list,
+    population: list,
+    episodes: List[int],
+    environment: Any
+) -> List[float]:
+    """Get the fitness of a reduced population, one given episode each."""
+    result = []
+    for individual in min_population:
+        result.append(environment.get_fitness(population[individual], episodes[individual]))
+    return result
+
+
 def find_individuals_to_eval(
     population: Any,
     hash_table: HashTable,
@@ -128,6 +142,18 @@ def parallel_evaluate(
     return fitness_list
 
 
+def group_duplicates(
+    population: list,
+    to_eval: List[int],
+    hash_table: HashTable
+) -> Dict[bytes, List[int]]:
+    """Group the indexes of identical individuals under their hash table key."""
+    groups = {}
+    for idx in to_eval:
+        groups.setdefault(hash_table.key(population[idx]), []).append(idx)
+    return groups
+
+
 def evaluate(
     population: list,
     hash_table: HashTable,
@@ -135,27 +161,80 @@ def evaluate(
     rerun_fitness: int,
     min_episodes: int,
     num_core: int,
-    batch_size: int = 100
+    batch_size: int = 100,
+    in_flight: InFlightRegistry = None
 ) -> List[float]:
-    """Evaluate the population using the environment."""
+    """
+    Evaluate the population using the environment.
+
+    Identical individuals are evaluated once. If in_flight is given, individuals that
+    another process is already evaluating are not evaluated again, their fitness is
+    taken from that process when it is done. Such fitness is stored with
+    HashTable.receive, so it does not count as episodes of this process.
+    """
     # the evaluation workload increases according to min_episodes
     batch_size = batch_size // min_episodes
     fitness_list, to_eval = find_individuals_to_eval(
         population, hash_table, environment, rerun_fitness)
-    # decide whether to parallel compute or not
-    if len(to_eval) < batch_size:
-        for idx in to_eval:
-            fitness_list[idx] = get_fitness_simple(population[idx], environment, min_episodes)
-    else:
-        eval_func = functools.partial(
-            get_fitness_min_population,
-            population=population,
-            environment=environment,
-            min_episodes=min_episodes
-        )
-        fitness_list = parallel_evaluate(eval_func, fitness_list, to_eval, batch_size, num_core)
-    for eval_idx in to_eval:
-        if rerun_fitness == 0 and hash_table.find(population[eval_idx]):
-            continue
-        hash_table.insert(population[eval_idx], fitness_list[eval_idx])
+    groups = group_duplicates(population, to_eval, hash_table)
+    claimed = list(groups)
+    if in_flight is not None:
+        claimed = [key for key, free in zip(groups, in_flight.claim(claimed)) if free]
+    unique = [groups[key][0] for key in claimed]
+    try:
+        # decide whether to parallel compute or not
+        if len(unique) < batch_size:
+            for idx in unique:
+                fitness_list[idx] = get_fitness_simple(population[idx], environment, min_episodes)
+        else:
+            eval_func = functools.partial(
+                get_fitness_min_population,
+                population=population,
+                environment=environment,
+                min_episodes=min_episodes
+            )
+            fitness_list = parallel_evaluate(eval_func, fitness_list, unique, batch_size, num_core)
+    except BaseException:
+        if in_flight is not None:
+            in_flight.release(claimed)
+        raise
+    received = set()
+    if in_flight is not None:
+        in_flight.post({key: fitness_list[groups[key][0]] for key in claimed})
+        waiting = [key for key in groups if fitness_list[groups[key][0]] is None]
+        for key, fitness in zip(waiting, in_flight.wait(waiting)):
+            idx = groups[key][0]
+            if fitness is None:
+                fitness = get_fitness_simple(population[idx], environment, min_episodes)
+            else:
+                received.add(key)
+            fitness_list[idx] = fitness
+    for key, indexes in groups.items():
+        for idx in indexes[1:]:
+            fitness_list[idx] = fitness_list[indexes[0]]
+        if key in received:
+            hash_table.receive(population[indexes[0]], fitness_list[indexes[0]], key)
+        else:
+            hash_table.insert(population[indexes[0]], fitness_list[indexes[0]], key)
     return fitness_list
+
+
+def evaluate_episodes(
+    population: list,
+    episodes: List[int],
+    environment: Any,
+    num_core: int,
+    batch_size: int = 100
+) -> List[float]:
+    """Run one given episode for each individual, in parallel for large populations."""
+    if len(population) < batch_size:
+        return [environment.get_fitness(individual, episode)
+                for individual, episode in zip(population, episodes)]
+    eval_func = functools.partial(
+        get_episodes_min_population,
+        population=population,
+        episodes=episodes,
+        environment=environment
+    )
+    return parallel_evaluate(
+        eval_func, [None] * len(population), list(range(len(population))), batch_size, num_core)
@@ -0,0 +1,198 @@
+"""Hall of fame of the best individuals found during a run."""
+
+# Copyright (c) 2022, ABB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with
+# or without modification, are permitted provided that
+# the following conditions are met:
+#
+#   * Redistributions of source code must retain the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer.
+#   * Redistributions in binary form must reproduce the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer in the documentation
+#     and/or other materials provided with the
+#     distribution.
+#   * Neither the name of ABB nor the names of its
+#     contributors may be used to endorse or promote
+#     products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import heapq
+import os
+import pickle
+import random
+from typing import Any, List, Tuple
+
+from behaviors.behavior_lists import BehaviorLists
+from bt_learning.gp import logplot
+from bt_learning.gp.hash_table import canonical_genome, genome_digest, HashTable
+
+
+class HallOfFame:
+    """
+    Bounded archive of the best individuals found during a run.
+
+    Individuals are keyed on the digest of their canonical genome if behavior_lists
+    is given, else of the genome itself, and kept in a min-heap on fitness so that the
+    worst one can be replaced. If hash_table is given, its digests are used instead,
+    so that the digests it remembers are not computed again. A genome that is
+    inserted again gets its new fitness, the old heap entry is left and skipped
+    when it reaches the top.
+    Both insertion and lookup are O(log n).
+
+    Changes are appended to a file in the log folder by save, so the archive is
+    persisted incrementally and rebuilt by load. When the file holds more than twice
+    size records, save rewrites it with the current entries only.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        log_name: str = '1',
+        file_name: str = 'hall_of_fame',
+        behavior_lists: BehaviorLists = None,
+        hash_table: HashTable = None
+    ):
+        # pylint: disable=too-many-arguments
+        self.size = size
+        self.log_name = log_name
+        self.file_name = file_name
+        self.behavior_lists = behavior_lists
+        self.hash_table = hash_table
+        self.heap = []
+        self.entries = {}
+        self.n_inserted = 0
+        self.unsaved = []
+        self.saved = False
+        self.n_saved = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, individual: Any) -> bool:
+        return self.key(individual) in self.entries
+
+    def key(self, individual: Any) -> bytes:
+        """Return the key that individual is stored under."""
+        if self.hash_table is not None:
+            return self.hash_table.key(individual)
+        return genome_digest(canonical_genome(individual, self.behavior_lists))
+
+    def find(self, individual: Any) -> float or None:
+        """Return the fitness of individual, or None if it is not in the archive."""
+        entry = self.entries.get(self.key(individual))
+        return None if entry is None else entry[1]
+
+    def worst(self) -> float or None:
+        """Return the lowest fitness in the archive."""
+        self._drop_stale()
+        return self.heap[0][0] if self.heap else None
+
+    def insert(self, individual: Any, fitness: float) -> bool:
+        """Insert individual if it is better than the worst one, return if the archive changed."""
+        if self.size <= 0:
+            return False
+        key = self.key(individual)
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[1] == fitness:
+                return False
+        elif len(self.entries) >= self.size:
+            if fitness <= self.worst():
+                return False
+            _, _, worst_key = heapq.heappop(self.heap)
+            del self.entries[worst_key]
+
+        self.n_inserted += 1
+        self.entries[key] = (individual, fitness, self.n_inserted)
+        heapq.heappush(self.heap, (fitness, self.n_inserted, key))
+        if len(self.heap) > 2 * self.size:
+            self.heap = [(fitness, count, key)
+                         for key, (_, fitness, count) in self.entries.items()]
+            heapq.heapify(self.heap)
+        self.unsaved.append((individual, fitness))
+        return True
+
+    def update(self, population: list, fitness: List[float]) -> None:
+        """Insert all individuals of a population."""
+        for individual, value in zip(population, fitness):
+            self.insert(individual, value)
+
+    def best(self, k: int) -> Tuple[list, List[float]]:
+        """Return the k best individuals and their fitness, best first."""
+        entries = heapq.nlargest(k, self.entries.values(), key=lambda entry: (entry[1], -entry[2]))
+        return [entry[0] for entry in entries], [entry[1] for entry in entries]
+
+    def sample(self, k: int) -> list:
+        """Return k random individuals, or all of them if there are fewer."""
+        entries = random.sample(list(self.entries.values()), min(k, len(self.entries)))
+        return [entry[0] for entry in entries]
+
+    def path(self) -> str:
+        """Return the path of the archive file."""
+        return logplot.get_log_folder(self.log_name) + '/' + self.file_name + '.pickle'
+
+    def save(self) -> None:
+        """
+        Append the changes since the last save to the archive file.
+
+        The first save of an archive that was not loaded starts a new file, and the
+        file is rewritten if it would hold more than twice size records.
+        """
+        if not self.saved or self.n_saved + len(self.unsaved) > 2 * self.size:
+            self._rewrite()
+        else:
+            with logplot.open_file(self.path(), 'ab') as f:
+                for record in self.unsaved:
+                    pickle.dump(record, f)
+            self.n_saved += len(self.unsaved)
+        self.unsaved = []
+        self.saved = True
+
+    def _rewrite(self) -> None:
+        """Replace the archive file by one with the current entries in insertion order."""
+        entries = sorted(self.entries.values(), key=lambda entry: entry[2])
+        temporary_path = self.path() + '.tmp'
+        with logplot.open_file(temporary_path, 'wb') as f:
+            for individual, fitness, _ in entries:
+                pickle.dump((individual, fitness), f)
+        os.replace(temporary_path, self.path())
+        self.n_saved = len(entries)
+
+    def load(self) -> None:
+        """Rebuild the archive by inserting the saved changes in order."""
+        if not os.path.exists(self.path()):
+            return
+        with logplot.open_file(self.path(), 'rb') as f:
+            while True:
+                try:
+                    individual, fitness = pickle.load(f)
+                except EOFError:
+                    break
+                self.insert(individual, fitness)
+                self.n_saved += 1
+        self.unsaved = []
+        self.saved = True
+
+    def _drop_stale(self) -> None:
+        """Pop heap entries of individuals that have been replaced or reinserted."""
+        while self.heap:
+            _, count, key = self.heap[0]
+            entry = self.entries.get(key)
+            if entry is not None and entry[2] == count:
+                break
+            heapq.heappop(self.heap)
@@ -1,4 +1,4 @@
-"""Hash table with linked list for entries with same hash."""
+"""Hash table storing the values of genomes in a dictionary under their digests."""
 
 # Copyright (c) 2022, ABB
 # All rights reserved.
@@ -31,75 +31,152 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
 # THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+from enum import auto, Enum
 import hashlib
-from typing import Any
+import os
+import pickle
+from statistics import mean
+import sys
+from types import ModuleType
+from typing import Any, Dict, Tuple
 
+import numpy as np
+
+from behaviors.behavior_lists import BehaviorLists, ParameterizedNode
+from behaviors.behavior_tree import BT
 from bt_learning.gp import logplot
+from bt_learning.gp.persistent_cache import PersistentCache
+
+
+SNAPSHOT_VERSION = 1
+DIGEST_SIZE = hashlib.md5().digest_size
+# Bytes held by one more float value in the value list of an entry
+VALUE_SIZE = sys.getsizeof(0.0) + 8
+# Bytes of the hash, key and value pointers of one dictionary slot
+SLOT_SIZE = 3 * 8
+# Fraction of the capacity that eviction makes room for at once
+EVICTION_MARGIN = 0.1
+
+
+class EvictionPolicy(Enum):
+    """Enum class for the entries to evict first from a full hash table."""
+
+    LRU = auto()      # least recently used
+    LFU = auto()      # least frequently used
+    FITNESS = auto()  # lowest mean value
 
 
 # pylint: disable=too-few-public-methods
 class Node:
-    """Node data structure - essentially a LinkedList node."""
+    """Entry of the hash table, a key with its values."""
 
     def __init__(self, key: str, value: Any):
         self.key = key
         self.value = [value]
-        self.next = None
+        self.last_used = 0
+        self.n_uses = 0
+        self.n_bytes = 0
 
     def __eq__(self, other: 'Node') -> bool:
         if not isinstance(other, Node):
             return False
-        equal = self.key == other.key and self.value == other.value
-        if equal:
-            if self.next is not None or other.next is not None:
-                if self.next is None or other.next is None:
-                    equal = False
-                else:
-                    equal = self.next == other.next
-        return equal
+        return self.key == other.key and self.value == other.value
 
 
 class HashTable:
-    """Main hash table class."""
+    """
+    Main hash table class.
+
+    Entries are stored in a dictionary under the digest of their key. The digests
+    of up to size genomes are remembered by their content, a tuple of the genes, so
+    that looking up the same genome again neither converts it to its canonical form
+    nor to a string.
+
+    If behavior_lists is given, keys are genomes that are stored on their canonical
+    form so that semantically identical genomes share their values.
+
+    If persistent_cache is given, the values of a genome that is not in the table are
+    looked up there, and all inserted values are also stored there. Values loaded from
+    there are counted by the cache in n_reused, not in n_values, and up to size digests
+    that were not there are remembered so that they are not looked up again.
+
+    If max_entries or max_bytes is nonzero, entries are evicted by the eviction policy
+    when the table holds more entries or an estimated number of bytes than that.
+    Evicted values are forgotten, except by the persistent cache, but still counted
+    in n_values. n_hits and n_misses count the keys found and not found in memory.
+    The remembered digests, gene sizes and persistent cache misses count towards
+    resident_bytes and are forgotten before any entry is evicted.
 
-    def __init__(self, size: int = 100000, log_name: str = '1'):
-        """Initialize hash table to fixed size."""
+    Values received from another process with receive are counted in n_received
+    instead of n_values, since no episodes were run for them here. They are still
+    values of the key, and count as such when deciding on reruns.
+    """
+
+    def __init__(
+        self,
+        size: int = 100000,
+        log_name: str = '1',
+        file_name: str = 'hash_log',
+        behavior_lists: BehaviorLists = None,
+        persistent_cache: PersistentCache = None,
+        max_entries: int = 0,
+        max_bytes: int = 0,
+        eviction: EvictionPolicy = EvictionPolicy.LRU
+    ):
+        # pylint: disable=too-many-arguments
+        """Initialize an empty hash table."""
         self.size = size
-        self.buckets = [None]*self.size
+        self.table = {}
+        self.digests = {}
         self.n_values = 0
+        self.n_received = 0
         self.log_name = log_name
+        self.file_name = file_name
+        self.behavior_lists = behavior_lists
+        self.changes = None
+        self.persistent_cache = persistent_cache
+        self.persistent_misses = {}
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.eviction = eviction
+        self.n_uses = 0
+        self.n_hits = 0
+        self.n_misses = 0
+        self.n_evictions = 0
+        self.resident_bytes = 0
+        self.memo_bytes = 0
+        self.gene_sizes = {}
 
     def __eq__(self, other: 'HashTable') -> bool:
         if not isinstance(other, HashTable):
             return False
+        return self.table.keys() == other.table.keys() and\
+            all(node.value == other.table[digest].value for digest, node in self.table.items())
 
-        equal = True
-        for i in range(self.size):
-            if self.buckets[i] != other.buckets[i]:
-                equal = False
-                break
-        return equal
-
-    def __hash(self, key: str) -> int:
+    def key(self, key: Any) -> bytes:
         """
-        Generate a hash for a given key.
-
-        Args
-        ----
-            key: the string key
-
-        Returns
-        -------
-            hash: hashcode generated from the key
+        Return the digest that key is stored under.
 
+        Callers that look up the same key several times can pass the digest on to
+        insert, receive and find instead of having it computed again.
         """
-        new_hash = hashlib.md5()
-        new_hash.update(key.encode('utf-8'))
-        hashcode = new_hash.hexdigest()
-        hashcode = int(hashcode, 16)
-        return hashcode % self.size
+        if not isinstance(key, list):
+            return genome_digest(key)
+        content = genome_content(key)
+        try:
+            digest = self.digests.get(content)
+        except TypeError:  # a parameter value that can not be hashed
+            return genome_digest(canonical_genome(key, self.behavior_lists))
+        if digest is None:
+            digest = genome_digest(canonical_genome(key, self.behavior_lists))
+            self.__remember(self.digests, content, digest)
+        return digest
 
-    def insert(self, key: list, value: Any) -> None:
+    def string_key(self, key: Any) -> str:
+        """Return the string that key is written as."""
+        return to_string(canonical_genome(key, self.behavior_lists))
+
+    def insert(self, key: Any, value: Any, digest: bytes = None) -> None:
         """
         Insert a key - value pair to the hash table.
 
@@ -107,56 +184,236 @@ class HashTable:
         ----
             key: list
             value: anything
+            digest: the digest of key if already known, see key
 
         """
-        string_key = to_string(key)
-        index = self.__hash(string_key)
-        node = self.buckets[index]
+        if digest is None:
+            digest = self.key(key)
+        node = self.__get(digest, key)
         if node is None:
-            self.buckets[index] = Node(string_key, value)
+            self.__insert(digest, canonical_genome(key, self.behavior_lists), value)
         else:
-            done = False
-            while not done:
-                if node.key == string_key:
-                    node.value.append(value)
-                    done = True
-                elif node.next is None:
-                    node.next = Node(string_key, value)
-                    done = True
-                else:
-                    node = node.next
-        self.n_values += 1
-
-    def find(self, key: list) -> Any or None:
+            self.__insert(digest, node.key, value)
+        if self.persistent_cache is not None:
+            self.persistent_cache.insert(digest, len(self.table[digest].value) - 1, value)
+
+    def receive(self, key: Any, value: Any, digest: bytes = None) -> None:
+        """
+        Insert a value that another process evaluated.
+
+        The value is neither counted in n_values nor stored in the persistent cache,
+        the process that evaluated it does that.
+        """
+        if digest is None:
+            digest = self.key(key)
+        node = self.table.get(digest)
+        if node is None:
+            self.__insert(digest, canonical_genome(key, self.behavior_lists), value, False)
+        else:
+            self.__insert(digest, node.key, value, False)
+        self.n_received += 1
+
+    def __insert(self, digest: bytes, key: Any, value: Any, counted: bool = True) -> None:
+        """Insert a value under a digest, key is stored if it is a new entry."""
+        node = self.table.get(digest)
+        if node is None:
+            self.__add_node(digest, key, [value])
+        else:
+            node.value.append(value)
+            node.n_bytes += VALUE_SIZE
+            self.resident_bytes += VALUE_SIZE
+            self.__use(node)
+        if counted:
+            self.n_values += 1
+        if self.changes is not None:
+            self.changes.setdefault(digest, (key, []))[1].append(value)
+
+    def find(self, key: Any, digest: bytes = None) -> Any or None:
         """
         Find a data value based on key.
 
         Args
         ----
             key: key in the hash-table
+            digest: the digest of key if already known, see key
 
         Returns
         -------
             value: value stored under "key" or None if not found
 
         """
-        string_key = to_string(key)
-        index = self.__hash(string_key)
-        node = self.buckets[index]
-        while node is not None and node.key != string_key:
-            node = node.next
-
+        if digest is None:
+            digest = self.key(key)
+        node = self.table.get(digest)
         if node is None:
-            return None
+            self.n_misses += 1
+            node = self.__get(digest, key)
+            if node is None:
+                return None
+        else:
+            self.n_hits += 1
+            self.__use(node)
         return node.value
 
+    def __get(self, digest: bytes, key: Any) -> Node or None:
+        """Return the entry of a digest, loading it from the persistent cache if needed."""
+        node = self.table.get(digest)
+        if node is not None or self.persistent_cache is None or digest in self.persistent_misses:
+            return node
+        values = self.persistent_cache.find(digest)
+        if values is None:
+            self.__remember(self.persistent_misses, digest, True)
+            return None
+        key = canonical_genome(key, self.behavior_lists)
+        for value in values:
+            self.__insert(digest, key, value, counted=False)
+        return self.table[digest]
+
+    def entries(self) -> Dict[bytes, Tuple[Any, list]]:
+        """Return a dictionary from the digests to the keys and copies of their values."""
+        return {digest: (node.key, list(node.value)) for digest, node in self.table.items()}
+
+    def add_entries(self, entries: Dict[bytes, Tuple[Any, list]]) -> None:
+        """Insert values by digest, as returned by entries and pop_changes."""
+        for digest, (key, values) in entries.items():
+            if not values:
+                continue
+            node = self.table.get(digest)
+            if node is None:
+                node = self.__add_node(digest, key, list(values))
+            else:
+                node.value.extend(values)
+                node.n_bytes += VALUE_SIZE * len(values)
+                self.resident_bytes += VALUE_SIZE * len(values)
+            self.n_values += len(values)
+            if self.changes is not None:
+                self.changes.setdefault(digest, (node.key, []))[1].extend(values)
+
+    def __add_node(self, digest: bytes, key: Any, values: list) -> Node:
+        """Add an entry with the given values, evicting others if the table is full."""
+        node = Node(key, values[0])
+        node.value = values
+        node.n_bytes = sys.getsizeof(node) + sys.getsizeof(vars(node)) + sys.getsizeof(digest) +\
+            sys.getsizeof(values) + sys.getsizeof(0.0) * len(values) + self.__key_size(key)
+        self.__use(node)
+        self.table[digest] = node
+        self.resident_bytes += node.n_bytes
+        if self.__full(0):
+            self.__evict(digest)
+        return node
+
+    def __key_size(self, key: Any) -> int:
+        """Return the estimated bytes of a key, genes that print the same are sized once."""
+        if not isinstance(key, list):
+            return deep_size(key)
+        size = sys.getsizeof(key)
+        for gene in key:
+            gene_id = (type(gene), str(gene))
+            gene_size = self.gene_sizes.get(gene_id)
+            if gene_size is None:
+                gene_size = deep_size(gene)
+                self.__remember(self.gene_sizes, gene_id, gene_size)
+            size += gene_size
+        return size
+
+    def __remember(self, memo: dict, key: Any, value: Any) -> None:
+        """Add an item to a memo of up to size items, forgetting the memo when it is full."""
+        if len(memo) >= self.size:
+            self.__forget(memo)
+        memo[key] = value
+        n_bytes = memo_item_size(key, value)
+        self.memo_bytes += n_bytes
+        self.resident_bytes += n_bytes
+
+    def __forget(self, memo: dict) -> None:
+        """Forget all items of a memo."""
+        n_bytes = sum(memo_item_size(key, value) for key, value in memo.items())
+        memo.clear()
+        self.memo_bytes -= n_bytes
+        self.resident_bytes -= n_bytes
+
+    def __use(self, node: Node) -> None:
+        """Record a use of an entry for the eviction policy."""
+        self.n_uses += 1
+        node.last_used = self.n_uses
+        node.n_uses += 1
+
+    def __full(self, margin: float) -> bool:
+        """Return True if the table exceeds a capacity reduced by the margin fraction."""
+        return 0 < self.max_entries * (1 - margin) < len(self.table) or\
+            0 < self.max_bytes * (1 - margin) < self.resident_bytes
+
+    def __priority(self, node: Node) -> Tuple[float, int]:
+        """Return the eviction priority of an entry, lowest is evicted first."""
+        if self.eviction == EvictionPolicy.LRU:
+            return node.last_used, 0
+        if self.eviction == EvictionPolicy.LFU:
+            return node.n_uses, node.last_used
+        if self.eviction == EvictionPolicy.FITNESS:
+            return mean(node.value), node.last_used
+        raise ValueError('Unexpected eviction policy of hash table')
+
+    def __evict(self, protected: bytes) -> None:
+        """Evict entries until there is some room below the capacity, but not protected."""
+        self.__forget(self.digests)
+        self.__forget(self.gene_sizes)
+        self.__forget(self.persistent_misses)
+        candidates = sorted(
+            (digest for digest in self.table if digest != protected),
+            key=lambda digest: self.__priority(self.table[digest])
+        )
+        for digest in candidates:
+            if not self.__full(EVICTION_MARGIN):
+                break
+            self.resident_bytes -= self.table.pop(digest).n_bytes
+            self.n_evictions += 1
+
+    def track_changes(self) -> None:
+        """Start recording inserted values, discarding those recorded so far."""
+        self.changes = {}
+
+    def pop_changes(self) -> Dict[bytes, Tuple[Any, list]]:
+        """Return the values inserted since track_changes or the last call, by digest."""
+        changes = self.changes
+        self.track_changes()
+        return changes
+
+    def path(self, extension: str) -> str:
+        """Return the path of the table file with the given extension."""
+        return logplot.get_log_folder(self.log_name) + '/' + self.file_name + extension
+
     def load(self) -> None:
-        """Load hash table information."""
-        with open(
-                logplot.get_log_folder(self.log_name) + '/hash_log.txt',
-                'r',
-                encoding='utf-8'
-             ) as f:
+        """Load a snapshot of the table, or the text table of logs without a snapshot."""
+        if not os.path.exists(self.path('.npz')):
+            self.load_text()
+            return
+        with np.load(self.path('.npz')) as snapshot:
+            version = int(snapshot['version'])
+            if version != SNAPSHOT_VERSION:
+                raise ValueError(f'Unknown hash table snapshot version: {version}')
+            digests = [digest.tobytes() for digest in snapshot['digests']]
+            counts = snapshot['counts'].tolist()
+            values = snapshot['values'].tolist()
+            genes = pickle.loads(snapshot['genes'].tobytes())
+            gene_indices = snapshot['gene_indices'].tolist()
+            key_lengths = snapshot['key_lengths'].tolist()
+        entries = {}
+        start = 0
+        gene_start = 0
+        for digest, count, length in zip(digests, counts, key_lengths):
+            if length < 0:
+                key = genes[gene_indices[gene_start]]
+                gene_start += 1
+            else:
+                key = [genes[i] for i in gene_indices[gene_start:gene_start + length]]
+                gene_start += length
+            entries[digest] = (key, values[start:start + count])
+            start += count
+        self.add_entries(entries)
+
+    def load_text(self) -> None:
+        """Load the text table written by export_text, keys are loaded as strings."""
+        with open(self.path('.txt'), 'r', encoding='utf-8') as f:
             lines = f.read().splitlines()
 
             for i in range(0, len(lines)):
@@ -168,26 +425,162 @@ class HashTable:
                 for value in values:
                     self.insert(key, float(value))
 
-    def write_table(self):
-        """Write table contents to a file."""
-        with open(
-                logplot.get_log_folder(self.log_name) + '/hash_log.txt',
-                'w',
-                encoding='utf-8'
-             ) as f:
-            for node in filter(lambda x: x is not None, self.buckets):
-                while node is not None:
-                    f.writelines(
-                        'key: ' + str(node.key) +
-                        ', value: ' + str(node.value) +
-                        ', count: ' + str(len(node.value)) + '\n'
-                    )
-                    node = node.next
-        f.close()
+    def write_table(self) -> None:
+        """
+        Write a binary snapshot of the table.
+
+        The snapshot holds the digests and all values as arrays, and the keys as
+        indices into a table of the distinct genes, which is the only part that is
+        pickled. Keys that are not genomes are stored as one gene with length -1.
+        Loaded genomes share their gene objects.
+        """
+        nodes = list(self.table.values())
+        genes = []
+        gene_ids = {}
+        gene_indices = []
+        key_lengths = []
+        for node in nodes:
+            if isinstance(node.key, list):
+                key_lengths.append(len(node.key))
+                items = node.key
+            else:
+                key_lengths.append(-1)
+                items = [node.key]
+            for item in items:
+                candidates = gene_ids.setdefault(str(item), [])
+                index = next((i for i in candidates if genes[i] == item), None)
+                if index is None:
+                    index = len(genes)
+                    genes.append(item)
+                    candidates.append(index)
+                gene_indices.append(index)
+        path = self.path('.npz')
+        with logplot.open_file(path + '.tmp', 'wb') as f:
+            np.savez(
+                f,
+                version=np.array(SNAPSHOT_VERSION),
+                digests=np.frombuffer(b''.join(self.table.keys()), dtype=np.uint8).reshape(
+                    -1, DIGEST_SIZE),
+                counts=np.array([len(node.value) for node in nodes], dtype=np.int64),
+                values=np.array([value for node in nodes for value in node.value], dtype=float),
+                genes=np.frombuffer(pickle.dumps(genes), dtype=np.uint8),
+                gene_indices=np.array(gene_indices, dtype=np.int64),
+                key_lengths=np.array(key_lengths, dtype=np.int64)
+            )
+        os.replace(path + '.tmp', path)
+
+    def export_text(self) -> None:
+        """Write table contents to a text file for reading."""
+        with open(self.path('.txt'), 'w', encoding='utf-8') as f:
+            for node in self.table.values():
+                f.writelines(
+                    'key: ' + to_string(node.key) +
+                    ', value: ' + str(node.value) +
+                    ', count: ' + str(len(node.value)) + '\n'
+                )
+
+
+class GenomeIndex:
+    """
+    Set of genomes with constant time membership tests.
+
+    Genomes are bucketed on their digest and only compared element by element
+    against the genomes with the same digest. If behavior_lists is given, genomes
+    are compared on their canonical form.
+    """
+
+    def __init__(self, genomes: list = None, behavior_lists: BehaviorLists = None):
+        self.buckets = {}
+        self.n_genomes = 0
+        self.behavior_lists = behavior_lists
+        if genomes is not None:
+            for genome in genomes:
+                self.add(genome)
+
+    def __contains__(self, genome: list) -> bool:
+        genome = canonical_genome(genome, self.behavior_lists)
+        bucket = self.buckets.get(genome_digest(genome))
+        return bucket is not None and genome in bucket
+
+    def __len__(self) -> int:
+        return self.n_genomes
+
+    def add(self, genome: list) -> None:
+        """Add a genome to the index unless it is already there."""
+        genome = canonical_genome(genome, self.behavior_lists)
+        bucket = self.buckets.setdefault(genome_digest(genome), [])
+        if genome not in bucket:
+            bucket.append(genome)
+            self.n_genomes += 1
+
+
+def canonical_genome(genome: Any, behavior_lists: BehaviorLists = None) -> Any:
+    """Return the canonical form of genome, or genome unchanged if behavior_lists is None."""
+    if behavior_lists is None or not isinstance(genome, list):
+        return genome
+    return BT(genome, behavior_lists).canonical()
+
+
+def genome_content(genome: list) -> tuple:
+    """
+    Return a tuple that is equal for genomes with equal genes, without converting them.
+
+    Parameterized nodes are represented by the fields and parameter values that their
+    string is made of, so that nodes modified in place get a new content.
+    """
+    return tuple(
+        gene if gene.__class__ is str else
+        (gene.name, gene.condition, gene.larger_than,
+         tuple([parameter.value for parameter in gene.parameters]) if gene.parameters else None)
+        if isinstance(gene, ParameterizedNode) else str(gene)
+        for gene in genome
+    )
+
+
+def genome_digest(genome: Any) -> bytes:
+    """Return a digest of the genome that is identical for identical genomes."""
+    return hashlib.md5(to_string(genome).encode('utf-8')).digest()
+
+
+def deep_size(obj: Any, seen: set = None) -> int:
+    """
+    Return an estimate of the bytes held by obj and the objects it refers to.
+
+    Objects that are shared by all objects referring to them, such as None, booleans,
+    attribute names, classes, functions and modules, are not counted.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or obj is None or isinstance(obj, (bool, ModuleType)) or callable(obj):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    elif hasattr(obj, '__dict__'):
+        size += sys.getsizeof(vars(obj)) + sum(deep_size(v, seen) for v in vars(obj).values())
+    return size
+
+
+def memo_item_size(key: Any, value: Any) -> int:
+    """Return the estimated bytes of a memo item, including the tuples of a tuple key."""
+    return tuple_size(key) + sys.getsizeof(value) + SLOT_SIZE
+
+
+def tuple_size(key: Any) -> int:
+    """Return the bytes of key and of the tuples in it, whose other items are shared."""
+    size = sys.getsizeof(key)
+    if isinstance(key, tuple):
+        size += sum(tuple_size(item) for item in key if isinstance(item, tuple))
+    return size
 
 
 def to_string(key: Any) -> str:
     """Convert a key to string."""
+    if isinstance(key, str):
+        return key
     try:
         string = ', '.join(str(e) for e in key)
     except TypeError:
@@ -0,0 +1,111 @@
+"""Registry of evaluations in progress, shared between processes."""
+
+# Copyright (c) 2022, ABB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with
+# or without modification, are permitted provided that
+# the following conditions are met:
+#
+#   * Redistributions of source code must retain the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer.
+#   * Redistributions in binary form must reproduce the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer in the documentation
+#     and/or other materials provided with the
+#     distribution.
+#   * Neither the name of ABB nor the names of its
+#     contributors may be used to endorse or promote
+#     products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import multiprocessing as mp
+from multiprocessing.managers import SyncManager
+from typing import Dict, List, Optional
+
+
+class InFlightRegistry:
+    """
+    Genomes that are being evaluated by some process, keyed by hash table digest.
+
+    A process claims the digests it is about to evaluate and posts the fitness when it is
+    done. Processes that find a digest already claimed wait for the posted fitness instead
+    of running the same episodes again. The registry lives in a multiprocessing manager, so
+    it can be passed to other processes such as the islands of the distributed island model.
+    Posted fitness values are kept until there are more than size of them.
+    """
+
+    def __init__(self, size: int = 100000, timeout: float = 600.0, manager: SyncManager = None):
+        self.size = size
+        self.timeout = timeout
+        self.manager = None
+        if manager is None:
+            manager = self.manager = mp.Manager()
+        self.pending = manager.dict()
+        self.results = manager.dict()
+        self.condition = manager.Condition()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state['manager'] = None
+        return state
+
+    def claim(self, digests: List[bytes]) -> List[bool]:
+        """Claim the digests that nobody else evaluates, return True for those claimed."""
+        claimed = []
+        with self.condition:
+            for digest in digests:
+                free = digest not in self.pending and digest not in self.results
+                if free:
+                    self.pending[digest] = True
+                claimed.append(free)
+        return claimed
+
+    def post(self, results: Dict[bytes, float]) -> None:
+        """Post the fitness of claimed digests and wake up the waiting processes."""
+        with self.condition:
+            if len(self.results) + len(results) > self.size:
+                self.results.clear()
+            self.results.update(results)
+            for digest in results:
+                self.pending.pop(digest, None)
+            self.condition.notify_all()
+
+    def release(self, digests: List[bytes]) -> None:
+        """Give up claimed digests without a result, for example after an error."""
+        with self.condition:
+            for digest in digests:
+                self.pending.pop(digest, None)
+            self.condition.notify_all()
+
+    def wait(self, digests: List[bytes]) -> List[Optional[float]]:
+        """
+        Wait for the fitness of digests claimed by other processes.
+
+        None is returned for digests that were released, dropped or not posted in time,
+        these must be evaluated by the caller.
+        """
+        if len(digests) == 0:
+            return []
+        with self.condition:
+            self.condition.wait_for(
+                lambda: not any(digest in self.pending for digest in digests), self.timeout)
+            return [self.results.get(digest) for digest in digests]
+
+    def shutdown(self) -> None:
+        """Stop the manager process if the registry started it."""
+        if self.manager is not None:
+            self.manager.shutdown()
+            self.manager = None
@@ -0,0 +1,152 @@
+"""Append-only journal of the state of a genetic programming run."""
+
+# Copyright (c) 2022, ABB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with
+# or without modification, are permitted provided that
+# the following conditions are met:
+#
+#   * Redistributions of source code must retain the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer.
+#   * Redistributions in binary form must reproduce the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer in the documentation
+#     and/or other materials provided with the
+#     distribution.
+#   * Neither the name of ABB nor the names of its
+#     contributors may be used to endorse or promote
+#     products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import pickle
+import random
+from typing import Any, List, Tuple
+
+import numpy as np
+
+from bt_learning.gp import logplot
+from bt_learning.gp.hash_table import HashTable
+
+
+class Journal:
+    """
+    Append-only log of the checkpoints of a run.
+
+    The first checkpoint, and every compact_interval:th after it, rewrites the file
+    with the full state. The others append only what changed since the previous
+    checkpoint: the values inserted in the hash tables, the new entries of the best
+    fitness and episode logs, and the population and random states.
+    A checkpoint thus costs in proportion to the new evaluations rather than to the
+    length of the run, and replay reads at most compact_interval records.
+    Compaction writes a new file next to the journal and moves it into place, so an
+    interrupted compaction leaves the previous journal intact.
+    """
+
+    def __init__(
+        self,
+        log_name: str = '1',
+        file_name: str = 'journal',
+        compact_interval: int = 10
+    ):
+        self.log_name = log_name
+        self.file_name = file_name
+        self.compact_interval = compact_interval
+        self.n_records = 0
+        self.n_logged = (0, 0)
+
+    def path(self) -> str:
+        """Return the path of the journal file."""
+        return logplot.get_log_folder(self.log_name) + '/' + self.file_name + '.pickle'
+
+    def checkpoint(
+        self,
+        population: list,
+        best_fitness: List[float],
+        n_episodes: List[int],
+        generation: int,
+        hash_tables: List[HashTable]
+    ) -> None:
+        # pylint: disable=too-many-arguments
+        """Append a checkpoint, or compact the journal into one if it is due."""
+        compact = self.n_records == 0 or self.n_records >= self.compact_interval
+        if compact:
+            tables = [table.entries() for table in hash_tables]
+            for table in hash_tables:
+                table.track_changes()
+            self.n_logged = (0, 0)
+        else:
+            tables = [table.pop_changes() for table in hash_tables]
+        record = {
+            'population': population,
+            'best_fitness': best_fitness[self.n_logged[0]:],
+            'n_episodes': n_episodes[self.n_logged[1]:],
+            'random_state': random.getstate(),
+            'np_random_state': np.random.get_state(),
+            'generation': generation,
+            'hash_tables': tables
+        }
+        if compact:
+            temporary_path = self.path() + '.tmp'
+            with logplot.open_file(temporary_path, 'wb') as f:
+                pickle.dump(record, f)
+            os.replace(temporary_path, self.path())
+        else:
+            with logplot.open_file(self.path(), 'ab') as f:
+                pickle.dump(record, f)
+        self.n_records = 1 if compact else self.n_records + 1
+        self.n_logged = (len(best_fitness), len(n_episodes))
+
+    def exists(self) -> bool:
+        """Return True if there is a journal to replay."""
+        return os.path.exists(self.path())
+
+    def replay(
+        self,
+        hash_tables: List[HashTable]
+    ) -> Tuple[list, List[float], List[int], Any, Any, int]:
+        """
+        Rebuild the state of the last checkpoint.
+
+        The values of all checkpoints are inserted in hash_tables, which must be given in
+        the same order as to checkpoint. Returns population, best fitness, n_episodes,
+        random state, numpy random state and generation.
+        """
+        best_fitness = []
+        n_episodes = []
+        self.n_records = 0
+        with logplot.open_file(self.path(), 'rb') as f:
+            while True:
+                try:
+                    record = pickle.load(f)
+                except EOFError:
+                    break
+                best_fitness += record['best_fitness']
+                n_episodes += record['n_episodes']
+                for table, entries in zip(hash_tables, record['hash_tables']):
+                    table.add_entries(entries)
+                self.n_records += 1
+        for table in hash_tables:
+            table.track_changes()
+        self.n_logged = (len(best_fitness), len(n_episodes))
+        return (
+            record['population'],
+            best_fitness,
+            n_episodes,
+            record['random_state'],
+            record['np_random_state'],
+            record['generation']
+        )
@@ -0,0 +1,138 @@
+"""Local search over the numeric parameters of parameterized nodes."""
+
+# Copyright (c) 2022, ABB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with
+# or without modification, are permitted provided that
+# the following conditions are met:
+#
+#   * Redistributions of source code must retain the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer.
+#   * Redistributions in binary form must reproduce the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer in the documentation
+#     and/or other materials provided with the
+#     distribution.
+#   * Neither the name of ABB nor the names of its
+#     contributors may be used to endorse or promote
+#     products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from copy import deepcopy
+from typing import Callable, List, Tuple
+
+from behaviors.behavior_lists import NodeParameter, ParameterizedNode, ParameterTypes
+
+
+def numeric_parameters(genome: list) -> List[Tuple[int, int, int]]:
+    """
+    Return the coordinates of all numeric parameters of the genome.
+
+    A coordinate is (node index, parameter index, component), component is the
+    axis for positions and 0 otherwise. Parameters chosen from a list of values
+    and parameters with zero step are left out.
+    """
+    coordinates = []
+    for i, node in enumerate(genome):
+        if not isinstance(node, ParameterizedNode) or not node.parameters:
+            continue
+        for j, parameter in enumerate(node.parameters):
+            if parameter.list_of_values or parameter.value is None:
+                continue
+            if parameter.data_type == ParameterTypes.POSITION:
+                for k in range(3):
+                    if not parameter.step or parameter.step[k] != 0:
+                        coordinates.append((i, j, k))
+            elif parameter.data_type in (ParameterTypes.INDEX, ParameterTypes.INTEGER) and\
+                    parameter.step != 0:
+                coordinates.append((i, j, 0))
+            elif parameter.data_type == ParameterTypes.FLOAT:
+                coordinates.append((i, j, 0))
+    return coordinates
+
+
+def perturb(parameter: NodeParameter, component: int, step_size: float, direction: int) -> bool:
+    """
+    Move one component of the parameter value a step in direction, within its limits.
+
+    step_size is a fraction of the range of the parameter, integer steps are at least
+    one step of the parameter. Returns False if the value is unchanged.
+    """
+    if parameter.data_type == ParameterTypes.POSITION:
+        min_value = parameter.min[component]
+        max_value = parameter.max[component]
+        step = parameter.step[component] if parameter.step else None
+        value = parameter.value[component]
+    else:
+        min_value = parameter.min
+        max_value = parameter.max
+        step = parameter.step if parameter.data_type != ParameterTypes.FLOAT else None
+        value = parameter.value
+
+    if step:
+        delta = max(1, int(round(step_size * (max_value - min_value) / step))) * step
+    else:
+        delta = step_size * (max_value - min_value)
+    new_value = min(max(value + direction * delta, min_value), max_value)
+    if new_value == value:
+        return False
+
+    if parameter.data_type == ParameterTypes.POSITION:
+        position = list(parameter.value)
+        position[component] = new_value
+        parameter.value = tuple(position)
+    else:
+        parameter.value = new_value
+    return True
+
+
+def neighbours(genome: list, step_size: float) -> list:
+    """Return the genomes with one numeric parameter moved a step up or down."""
+    candidates = []
+    for i, j, k in numeric_parameters(genome):
+        for direction in [1, -1]:
+            node = deepcopy(genome[i])
+            if perturb(node.parameters[j], k, step_size, direction):
+                candidates.append(genome[:i] + [node] + genome[i + 1:])
+    return candidates
+
+
+def parameter_search(
+    genome: list,
+    fitness: float,
+    evaluate: Callable[[list], List[float]],
+    iterations: int,
+    step_size: float
+) -> Tuple[list, float]:
+    """
+    Tune the numeric parameters of a genome by coordinate pattern search.
+
+    In each iteration all neighbours are evaluated as one batch by evaluate.
+    The search moves to the best neighbour if it is better, otherwise the step
+    is halved. Returns the best genome found and its fitness.
+    """
+    for _ in range(iterations):
+        candidates = neighbours(genome, step_size)
+        if len(candidates) == 0:
+            break
+        candidate_fitness = evaluate(candidates)
+        best = max(range(len(candidates)), key=lambda i: candidate_fitness[i])
+        if candidate_fitness[best] > fitness:
+            genome = candidates[best]
+            fitness = candidate_fitness[best]
+        else:
+            step_size /= 2
+    return genome, fitness
@@ -117,7 +117,13 @@ def clear_logs(log_name: str) -> None:
 
 
 def clear_after_generation(log_name: str, generation: int) -> None:
-    """Clear fitness and population logs after given generation."""
+    """
+    Clear the per generation logs after given generation.
+
+    The fitness, population and length logs have a line per generation from the
+    first one, the operator log from the second one. The hash table and surrogate
+    logs have the generation on each line.
+    """
     with open_file(get_log_folder(log_name) + '/fitness_log.txt', 'r') as f:
         lines = f.readlines()
     with open_file(get_log_folder(log_name) + '/fitness_log.txt', 'w') as f:
@@ -128,6 +134,28 @@ def clear_after_generation(log_name: str, generation: int) -> None:
     with open_file(get_log_folder(log_name) + '/population_log.txt', 'w') as f:
         for i in range(generation + 1):
             f.write(lines[i])
+    if os.path.isfile(get_log_folder(log_name) + '/length_log.txt'):
+        with open_file(get_log_folder(log_name) + '/length_log.txt', 'r') as f:
+            lines = f.readlines()
+        with open_file(get_log_folder(log_name) + '/length_log.txt', 'w') as f:
+            for i in range(generation + 1):
+                f.write(lines[i])
+    if os.path.isfile(get_log_folder(log_name) + '/operator_log.txt'):
+        with open_file(get_log_folder(log_name) + '/operator_log.txt', 'r') as f:
+            lines = f.readlines()
+        with open_file(get_log_folder(log_name) + '/operator_log.txt', 'w') as f:
+            f.writelines(lines[:generation])
+    for file_name in ['hash_table_log.txt', 'surrogate_log.txt']:
+        if os.path.isfile(get_log_folder(log_name) + '/' + file_name):
+            with open_file(get_log_folder(log_name) + '/' + file_name, 'r') as f:
+                lines = f.readlines()
+            with open_file(get_log_folder(log_name) + '/' + file_name, 'w') as f:
+                f.writelines(line for line in lines if log_generation(line) <= generation)
+
+
+def log_generation(line: str) -> int:
+    """Return the generation of a line that starts with 'generation: '."""
+    return int(line.split(',')[0][len('generation: '):])
 
 
 def log_best_individual(log_name: str, best_individual: Any):
@@ -181,6 +209,72 @@ def log_tracking(
         )
 
 
+def log_surrogate(
+    log_name: str,
+    n_gen: int,
+    saved_episodes: int,
+    precision: float,
+    recall: float
+) -> None:
+    """
+    Log the performance of the surrogate model.
+
+    saved_episodes is the total number of episodes not run because of rejections,
+    precision and recall are for the prediction that an individual is inferior.
+    """
+    with open_file(get_log_folder(log_name) + '/surrogate_log.txt', 'a') as f:
+        f.write(
+            f'generation: {n_gen}, saved episodes: {saved_episodes},'
+            f' precision: {precision}, recall: {recall}\n'
+        )
+
+
+def log_hash_table(
+    log_name: str,
+    n_gen: int,
+    n_entries: int,
+    resident_bytes: int,
+    n_hits: int,
+    n_misses: int,
+    n_evictions: int
+) -> None:
+    # pylint: disable=too-many-arguments
+    """
+    Log the size and use of the hash table.
+
+    resident_bytes is an estimate of the memory held by the n_entries entries, n_hits
+    and n_misses count the genomes found and not found in memory and n_evictions the
+    entries dropped to stay within the capacity of the table.
+    """
+    with open_file(get_log_folder(log_name) + '/hash_table_log.txt', 'a') as f:
+        f.write(
+            f'generation: {n_gen}, entries: {n_entries}, bytes: {resident_bytes},'
+            f' hits: {n_hits}, misses: {n_misses}, evictions: {n_evictions}\n'
+        )
+
+
+def log_persistent_cache(
+    log_name: str,
+    n_gen: int,
+    n_hits: int,
+    n_misses: int,
+    n_reused: int,
+    n_stored: int
+) -> None:
+    # pylint: disable=too-many-arguments
+    """
+    Log the use of the cache of episodes shared between runs.
+
+    n_hits and n_misses count the genomes looked up in the cache, n_reused the
+    episodes found there and n_stored the episodes added to it by this run.
+    """
+    with open_file(get_log_folder(log_name) + '/persistent_cache_log.txt', 'a') as f:
+        f.write(
+            f'generation: {n_gen}, hits: {n_hits}, misses: {n_misses},'
+            f' reused episodes: {n_reused}, stored episodes: {n_stored}\n'
+        )
+
+
 def log_fitness_exchange(
     log_name: str,
     fitness: float,
@@ -215,6 +309,42 @@ def log_population(log_name: str, population: List[Any]) -> None:
         f.write(f'{population}\n')
 
 
+def log_length(log_name: str, population: List[Any]) -> None:
+    """Log mean and max length of the individuals of the generation."""
+    lengths = [len(individual) for individual in population]
+    with open_file(get_log_folder(log_name) + '/length_log.txt', 'a') as f:
+        f.write(f'{np.mean(lengths)}, {max(lengths)}\n')
+
+
+def get_length(log_name: str) -> Tuple[List[float], List[int]]:
+    """Get the mean and max length of each generation from the given log."""
+    mean_length = []
+    max_length = []
+    with open_file(get_log_folder(log_name) + '/length_log.txt', 'r') as f:
+        for line in f.read().splitlines():
+            values = line.split(', ')
+            mean_length.append(float(values[0]))
+            max_length.append(int(values[1]))
+    return mean_length, max_length
+
+
+def log_operators(log_name: str, probabilities: Dict[str, float]) -> None:
+    """Log the probabilities of the variation operators of the generation."""
+    with open_file(get_log_folder(log_name) + '/operator_log.txt', 'a') as f:
+        f.write(', '.join(f'{key}: {value}' for key, value in probabilities.items()) + '\n')
+
+
+def get_operators(log_name: str) -> Dict[str, List[float]]:
+    """Get the trajectory of each operator probability from the given log."""
+    probabilities = {}
+    with open_file(get_log_folder(log_name) + '/operator_log.txt', 'r') as f:
+        for line in f.read().splitlines():
+            for item in line.split(', '):
+                key, value = item.split(': ')
+                probabilities.setdefault(key, []).append(float(value))
+    return probabilities
+
+
 def log_last_population(log_name: str, population: List[Any]) -> None:
     """Log current population as pickle object."""
     with open_file(get_log_folder(log_name) + '/population.pickle', 'wb') as f:
@@ -0,0 +1,318 @@
+"""A MAP-Elites quality-diversity algorithm over behavior tree features."""
+
+# Copyright (c) 2022, ABB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with
+# or without modification, are permitted provided that
+# the following conditions are met:
+#
+#   * Redistributions of source code must retain the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer.
+#   * Redistributions in binary form must reproduce the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer in the documentation
+#     and/or other materials provided with the
+#     distribution.
+#   * Neither the name of ABB nor the names of its
+#     contributors may be used to endorse or promote
+#     products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from dataclasses import dataclass
+import random
+import time
+from typing import Any, List, Set, Tuple
+
+import numpy as np
+
+from behaviors.behavior_lists import BehaviorLists, ParameterizedNode
+from behaviors.behavior_tree import BT
+from bt_learning.gp import logplot
+import bt_learning.gp.genetic_programming as gp
+from bt_learning.gp.evaluators import Evaluator, get_evaluator, seeded_environment
+from bt_learning.gp.hash_table import GenomeIndex, HashTable
+
+
+@dataclass
+class FeatureRange:
+    """Range and number of bins of one feature dimension of the grid."""
+
+    minimum: float
+    maximum: float
+    bins: int
+
+    def index(self, value: float) -> int:
+        """Return the bin of value, values outside the range go to the first or last bin."""
+        scaled = (value - self.minimum) / (self.maximum - self.minimum) * self.bins
+        return int(min(max(np.floor(scaled), 0), self.bins - 1))
+
+
+class EliteGrid:
+    """
+    Grid of the best individual found in each cell.
+
+    Fitness and genomes are stored in dense arrays with one element per cell, and the
+    filled cells are listed in an array of their own, so that both inserting an
+    individual and sampling a random filled cell take constant time.
+    """
+
+    def __init__(self, shape: Tuple[int, ...]):
+        self.shape = tuple(shape)
+        size = int(np.prod(self.shape))
+        self.fitness = np.full(size, -np.inf)
+        self.genomes = np.empty(size, dtype=object)
+        self.occupied = np.zeros(size, dtype=bool)
+        self.cells = np.zeros(size, dtype=np.int64)
+        self.n_filled = 0
+
+    def __len__(self) -> int:
+        return self.n_filled
+
+    def insert(self, cell: Tuple[int, ...], genome: Any, fitness: float) -> bool:
+        """Insert genome in cell if the cell is empty or genome is better, return if inserted."""
+        index = int(np.ravel_multi_index(cell, self.shape))
+        if self.occupied[index] and fitness <= self.fitness[index]:
+            return False
+        if not self.occupied[index]:
+            self.occupied[index] = True
+            self.cells[self.n_filled] = index
+            self.n_filled += 1
+        self.fitness[index] = fitness
+        self.genomes[index] = genome
+        return True
+
+    def sample(self) -> Any:
+        """Return the genome of a random filled cell."""
+        return self.genomes[self.cells[random.randrange(self.n_filled)]]
+
+    def elites(self) -> Tuple[list, List[float]]:
+        """Return the genomes and fitness of all filled cells, in the order they were filled."""
+        cells = self.cells[:self.n_filled]
+        return list(self.genomes[cells]), self.fitness[cells].tolist()
+
+    def coverage(self) -> float:
+        """Return the fraction of cells that are filled."""
+        return self.n_filled / len(self.occupied)
+
+
+def _is_number(word: str) -> bool:
+    try:
+        float(word)
+    except ValueError:
+        return False
+    return True
+
+
+def referenced_objects(node: Any) -> Set[str]:
+    """
+    Return the objects that a node refers to.
+
+    Objects are the words of the node name after the first one and the values of
+    string parameters, leaving out numbers.
+    """
+    if isinstance(node, ParameterizedNode):
+        words = node.name.split()[1:]
+        if node.parameters:
+            words += [parameter.value for parameter in node.parameters
+                      if isinstance(parameter.value, str)]
+    else:
+        words = str(node).split()[1:]
+    return {word for word in words if not _is_number(word)}
+
+
+def genome_features(genome: List[Any], behavior_lists: BehaviorLists) -> List[float]:
+    """
+    Return the cheap features of a genome.
+
+    The features are length, depth, number of distinct objects referenced and
+    the fraction of the leaves that are actions rather than conditions.
+    """
+    bt = BT(genome, behavior_lists)
+    objects = set()
+    n_actions = 0
+    n_conditions = 0
+    for node in genome:
+        if behavior_lists.is_condition_node(node):
+            n_conditions += 1
+        elif behavior_lists.is_behavior_node(node):
+            n_actions += 1
+        else:
+            continue
+        objects |= referenced_objects(node)
+    action_ratio = n_actions / max(n_actions + n_conditions, 1)
+    return [bt.length(), bt.depth(), len(objects), action_ratio]
+
+
+def default_genome_ranges(gp_par: gp.GpParameters) -> List[FeatureRange]:
+    """Return feature ranges for length, depth, objects and action ratio."""
+    max_length = gp_par.max_length if gp_par.max_length > 0 else 4 * gp_par.ind_start_length
+    max_depth = gp_par.max_depth if gp_par.max_depth > 0 else 2 * gp_par.ind_start_depth
+    return [
+        FeatureRange(1, max_length + 1, min(max_length, 10)),
+        FeatureRange(0, max_depth + 1, max_depth + 1),
+        FeatureRange(0, 6, 6),
+        FeatureRange(0, 1, 5)
+    ]
+
+
+def grid_cell(features: List[float], ranges: List[FeatureRange]) -> Tuple[int, ...]:
+    """Return the grid cell of features."""
+    return tuple(feature_range.index(value) for value, feature_range in zip(features, ranges))
+
+
+def breed(grid: EliteGrid, gp_par: gp.GpParameters, genome_index: GenomeIndex) -> list:
+    """
+    Generate one generation of offspring from parents sampled uniformly from the grid cells.
+
+    The number of crossover and mutation parents is set by f_crossover and f_mutation
+    as fractions of n_population.
+    """
+    n_crossover = int(round(gp_par.f_crossover * gp_par.n_population))
+    n_crossover -= n_crossover % 2
+    n_mutation = int(round(gp_par.f_mutation * gp_par.n_population))
+    parents = [grid.sample() for _ in range(n_crossover + n_mutation)]
+    offspring = []
+    if n_crossover > 0:
+        offspring += gp.crossover(
+            parents, list(range(n_crossover)), gp_par, genome_index=genome_index)
+    offspring += gp.mutation(
+        parents + offspring, list(range(n_crossover, n_crossover + n_mutation)),
+        gp_par, genome_index)
+    return offspring
+
+
+def run(
+    environment: Any,
+    gp_par: gp.GpParameters,
+    genome_ranges: List[FeatureRange] = None,
+    outcome_ranges: List[FeatureRange] = None,
+    baseline: Any = None,
+    evaluator: Evaluator = None
+) -> Tuple[list, List[float], float, Any]:
+    # pylint: disable=too-many-statements, too-many-locals, too-many-arguments
+    """
+    Run the MAP-Elites algorithm.
+
+    The population is a grid with the best individual found for each combination of
+    genome features, see genome_features, binned by genome_ranges.
+    If outcome_ranges is given, environment must return (fitness, descriptor) from
+    get_fitness and the descriptor is binned by outcome_ranges as extra grid dimensions.
+    Each generation breeds offspring from random grid cells and inserts them into the grid.
+    The returned population and fitness are the elites of all filled cells.
+    Hotstart is not supported.
+    """
+    start_time = time.time()
+    environment = seeded_environment(environment, gp_par.run_seed)
+    if genome_ranges is None:
+        genome_ranges = default_genome_ranges(gp_par)
+    if outcome_ranges is None:
+        outcome_ranges = []
+    if evaluator is None:
+        evaluator = get_evaluator(environment)
+    hash_table = HashTable(
+        gp_par.hash_table_size,
+        gp_par.log_name,
+        behavior_lists=gp.key_behavior_lists(gp_par),
+        persistent_cache=gp.get_persistent_cache(gp_par),
+        **gp.hash_table_limits(gp_par)
+    )
+    descriptors = {} if outcome_ranges else None
+    grid = EliteGrid([feature_range.bins for feature_range in genome_ranges + outcome_ranges])
+
+    def insert(individuals: list, fitness: List[float]) -> None:
+        for individual, value in zip(individuals, fitness):
+            features = genome_features(individual, gp_par.behavior_lists)
+            if outcome_ranges:
+                key = hash_table.key(individual)
+                if key not in descriptors:
+                    raise ValueError('Outcome features need a descriptor from the environment')
+                features += list(descriptors[key])
+            grid.insert(grid_cell(features, genome_ranges + outcome_ranges), individual, value)
+
+    population = gp.create_population(
+        gp_par.n_population,
+        gp_par.ind_start_length,
+        gp_par.mutation_p_leaf,
+        gp_par.behavior_lists,
+        max_depth=gp_par.ind_start_depth
+    )
+    if baseline is not None:
+        population[0] = baseline
+    logplot.clear_logs(gp_par.log_name)
+    fitness = gp.get_fitness_batch(
+        population, hash_table, evaluator, 0, gp_par.min_episodes, descriptors)
+    insert(population, fitness)
+    population, fitness = grid.elites()
+
+    best_fitness = [max(fitness)]
+    n_episodes = [hash_table.n_values]
+    logplot.log_fitness(gp_par.log_name, fitness)
+    logplot.log_population(gp_par.log_name, population)
+    logplot.log_length(gp_par.log_name, population)
+
+    generation = 0
+    for generation in range(1, gp_par.n_generations):
+        if gp.termination_reached(gp_par, best_fitness, n_episodes, start_time):
+            generation -= 1  # This generation is not run
+            break
+
+        genome_index = None if gp_par.allow_identical else\
+            GenomeIndex(population, gp.key_behavior_lists(gp_par))
+        offspring = breed(grid, gp_par, genome_index)
+        offspring_fitness = gp.get_fitness_batch(offspring, hash_table, evaluator,
+                                                 0, gp_par.min_episodes, descriptors)
+        insert(offspring, offspring_fitness)
+        population, fitness = grid.elites()
+
+        best_fitness.append(max(fitness))
+        n_episodes.append(hash_table.n_values)
+        logplot.log_fitness(gp_par.log_name, fitness)
+        logplot.log_population(gp_par.log_name, population)
+        logplot.log_length(gp_par.log_name, population)
+
+        if gp_par.verbose:
+            print(
+                'Generation: ', generation,
+                ' Coverage: ', grid.coverage(),
+                ' Best fitness: ', best_fitness[-1]
+            )
+
+    print('\nFINAL POPULATION: ')
+    gp.print_population(population, fitness, generation)
+
+    best_individual = gp.selection(population, fitness, 1, gp.SelectionMethods.ELITISM)[0]
+
+    gp.save_state(
+        gp_par,
+        population,
+        best_individual,
+        best_fitness,
+        n_episodes,
+        baseline,
+        generation,
+        hash_table
+    )
+
+    if gp_par.plot:
+        logplot.plot_fitness(gp_par.log_name, best_fitness, n_episodes)
+    if gp_par.fig_best:
+        environment.plot_individual(
+            logplot.get_log_folder(gp_par.log_name),
+            'best individual',
+            best_individual
+        )
+
+    return population, fitness, best_fitness, best_individual
@@ -0,0 +1,129 @@
+"""Novelty of behavior descriptors against an archive with an incremental KD-tree."""
+
+# Copyright (c) 2022, ABB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with
+# or without modification, are permitted provided that
+# the following conditions are met:
+#
+#   * Redistributions of source code must retain the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer.
+#   * Redistributions in binary form must reproduce the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer in the documentation
+#     and/or other materials provided with the
+#     distribution.
+#   * Neither the name of ABB nor the names of its
+#     contributors may be used to endorse or promote
+#     products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from typing import Any, List
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+class IncrementalKDTree:
+    """
+    KD-tree index that points can be added to.
+
+    Points are kept in a few static KD-trees of roughly doubling size. New points form
+    a new tree, which is merged with the previous one while that is not more than twice
+    as large. This keeps the number of trees logarithmic in the number of points, so
+    both adding and querying stay sub-linear.
+    """
+
+    def __init__(self):
+        self.trees = []
+
+    def __len__(self) -> int:
+        return sum(tree.n for tree in self.trees)
+
+    def add(self, points: Any) -> None:
+        """Add points, an array of shape (n, dimension)."""
+        points = np.asarray(points, dtype=float)
+        if len(points) == 0:
+            return
+        self.trees.append(cKDTree(points))
+        while len(self.trees) > 1 and self.trees[-2].n <= 2 * self.trees[-1].n:
+            merged = np.concatenate([self.trees[-2].data, self.trees[-1].data])
+            self.trees[-2:] = [cKDTree(merged)]
+
+    def query(self, points: Any, k: int) -> np.ndarray:
+        """
+        Return the distances from each point to its k nearest neighbours, sorted.
+
+        The result has shape (n, k) and is padded with inf if there are fewer than k points.
+        """
+        points = np.asarray(points, dtype=float)
+        distances = [np.full((len(points), k), np.inf)]
+        for tree in self.trees:
+            n_neighbours = min(k, tree.n)
+            distance, _ = tree.query(points, k=list(range(1, n_neighbours + 1)))
+            distances.append(distance)
+        return np.sort(np.concatenate(distances, axis=1), axis=1)[:, :k]
+
+
+class NoveltyArchive:
+    """
+    Archive of behavior descriptors for novelty search.
+
+    The novelty of a descriptor is its mean distance to the k nearest descriptors
+    among the archive and the other descriptors it is compared with.
+    """
+
+    def __init__(self, k: int = 15):
+        self.k = k
+        self.index = IncrementalKDTree()
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def novelty(self, descriptors: List[Any]) -> np.ndarray:
+        """Return the novelty of each descriptor compared with the archive and each other."""
+        if len(descriptors) == 0:
+            return np.array([])
+        descriptors = np.asarray(descriptors, dtype=float)
+        population = cKDTree(descriptors)
+        n_neighbours = min(self.k + 1, len(descriptors))
+        distance, _ = population.query(descriptors, k=list(range(1, n_neighbours + 1)))
+        # The nearest one in the population is the descriptor itself
+        distances = np.concatenate(
+            [distance[:, 1:], self.index.query(descriptors, self.k)], axis=1)
+        distances = np.sort(distances, axis=1)[:, :self.k]
+        finite = np.isfinite(distances)
+        counts = np.maximum(finite.sum(axis=1), 1)
+        return np.where(finite, distances, 0.0).sum(axis=1) / counts
+
+    def add(self, descriptors: List[Any]) -> None:
+        """Add descriptors to the archive."""
+        self.index.add(np.asarray(descriptors, dtype=float).reshape(len(descriptors), -1))
+
+
+def combined_score(fitness: List[float], novelty: List[float], weight: float) -> List[float]:
+    """
+    Return a selection score that combines fitness and novelty.
+
+    Fitness and novelty are both replaced by their rank, scaled to between 0 and 1,
+    so that their scales do not matter. weight is the share of novelty.
+    """
+    def scaled_rank(values):
+        ranks = np.argsort(np.argsort(np.asarray(values, dtype=float), kind='stable'))
+        return ranks / max(len(values) - 1, 1)
+
+    score = (1 - weight) * scaled_rank(fitness) + weight * scaled_rank(novelty)
+    return score.tolist()
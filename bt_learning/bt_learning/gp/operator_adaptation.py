@@ -0,0 +1,142 @@
+"""Adaptive operator selection driven by the fitness improvements of offspring."""
+
+# Copyright (c) 2022, ABB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with
+# or without modification, are permitted provided that
+# the following conditions are met:
+#
+#   * Redistributions of source code must retain the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer.
+#   * Redistributions in binary form must reproduce the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer in the documentation
+#     and/or other materials provided with the
+#     distribution.
+#   * Neither the name of ABB nor the names of its
+#     contributors may be used to endorse or promote
+#     products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from enum import auto, Enum
+import math
+import random
+from statistics import mean
+from typing import Dict, List
+
+
+class AdaptationMethods(Enum):
+    """Enum class for operator adaptation methods."""
+
+    NONE = auto()
+    PROBABILITY_MATCHING = auto()
+    ADAPTIVE_PURSUIT = auto()
+
+
+class OperatorAdaptation:
+    """
+    Probabilities of variation operators adapted to the improvements of their offspring.
+
+    Operators record each offspring together with its parents. When the offspring are
+    evaluated, credit rewards each operator with the mean fitness improvement of its
+    offspring over their best parent and updates the estimated quality of the operators.
+    The probabilities are then moved toward the qualities by probability matching or
+    adaptive pursuit. No operator gets a lower probability than p_min.
+    Operators with a zero start probability are never used.
+    """
+
+    def __init__(
+        self,
+        probabilities: Dict[str, float],
+        method: AdaptationMethods = AdaptationMethods.ADAPTIVE_PURSUIT,
+        p_min: float = 0.02,
+        learning_rate: float = 0.3
+    ):
+        probabilities = {key: value for key, value in probabilities.items() if value > 0}
+        if len(probabilities) == 0:
+            raise ValueError('At least one operator must have a positive probability')
+        total = sum(probabilities.values())
+        self.probabilities = {key: value / total for key, value in probabilities.items()}
+        self.quality = {key: 0.0 for key in self.probabilities}
+        self.method = method
+        self.p_min = min(p_min, 1 / len(self.probabilities))
+        self.learning_rate = learning_rate
+        self.records = []
+
+    def choose(self, operators: List[str]) -> str:
+        """Return one of operators drawn with the current probabilities."""
+        operators = [key for key in operators if key in self.probabilities]
+        threshold = random.random() * sum(self.probabilities[key] for key in operators)
+        for key in operators:
+            threshold -= self.probabilities[key]
+            if threshold < 0:
+                return key
+        return operators[-1]
+
+    def share(self, operators: List[str]) -> float:
+        """Return the total probability of operators."""
+        return sum(self.probabilities.get(key, 0.0) for key in operators)
+
+    def record(self, operator: str, offspring: list, parents: List[list]) -> None:
+        """Record that operator made offspring from parents."""
+        self.records.append((operator, offspring, parents))
+
+    def credit(self, individuals: list, fitness: List[float]) -> None:
+        """
+        Credit the recorded operators and update the probabilities.
+
+        Offspring and parents are looked up by identity in individuals, records that
+        are not found are ignored. Rejected individuals, with fitness -inf, give no reward.
+        """
+        index = {id(individual): i for i, individual in enumerate(individuals)}
+        rewards = {}
+        for operator, offspring, parents in self.records:
+            if id(offspring) not in index or any(id(x) not in index for x in parents):
+                continue
+            improvement = fitness[index[id(offspring)]] -\
+                max(fitness[index[id(x)]] for x in parents)
+            rewards.setdefault(operator, []).append(
+                max(improvement, 0.0) if math.isfinite(improvement) else 0.0)
+        self.records = []
+
+        for operator, values in rewards.items():
+            self.quality[operator] += self.learning_rate * (mean(values) - self.quality[operator])
+
+        if len(rewards) > 0:
+            if self.method == AdaptationMethods.PROBABILITY_MATCHING:
+                self.probability_matching()
+            elif self.method == AdaptationMethods.ADAPTIVE_PURSUIT:
+                self.adaptive_pursuit()
+
+    def probability_matching(self) -> None:
+        """Set the probabilities proportional to the qualities."""
+        total = sum(self.quality.values())
+        if total <= 0:
+            return
+        scale = 1 - len(self.quality) * self.p_min
+        for operator, quality in self.quality.items():
+            self.probabilities[operator] = self.p_min + scale * quality / total
+
+    def adaptive_pursuit(self) -> None:
+        """Move the probabilities toward the operator with the highest quality."""
+        best = max(self.quality, key=self.quality.get)
+        if self.quality[best] <= 0:
+            return
+        p_max = 1 - (len(self.quality) - 1) * self.p_min
+        for operator in self.probabilities:
+            target = p_max if operator == best else self.p_min
+            self.probabilities[operator] += self.learning_rate *\
+                (target - self.probabilities[operator])
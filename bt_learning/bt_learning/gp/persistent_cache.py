@@ -0,0 +1,107 @@
+"""Fitness cache shared between runs in a local database."""
+
+# Copyright (c) 2022, ABB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with
+# or without modification, are permitted provided that
+# the following conditions are met:
+#
+#   * Redistributions of source code must retain the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer.
+#   * Redistributions in binary form must reproduce the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer in the documentation
+#     and/or other materials provided with the
+#     distribution.
+#   * Neither the name of ABB nor the names of its
+#     contributors may be used to endorse or promote
+#     products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import sqlite3
+from typing import List
+
+
+class PersistentCache:
+    """
+    Episode values shared between runs in an SQLite database.
+
+    Values are stored per episode under the fingerprint of the environment and the
+    digest of the genome, so that runs, islands and processes on the same machine
+    that use the same database file reuse the episodes of each other. The fingerprint
+    must identify everything apart from the genome that the fitness depends on.
+    The database is in WAL mode so that readers are not blocked by a writer, and each
+    process opens its own connection.
+    """
+
+    def __init__(self, path: str, fingerprint: str = '', timeout: float = 60.0):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.timeout = timeout
+        self.connection = None
+        self.pid = None
+        self.n_hits = 0
+        self.n_misses = 0
+        self.n_reused = 0
+        self.n_stored = 0
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state['connection'] = None
+        return state
+
+    def connect(self) -> sqlite3.Connection:
+        """Return the connection of this process, the table is created if needed."""
+        if self.connection is None or self.pid != os.getpid():
+            self.connection = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS episodes (fingerprint TEXT, digest BLOB,'
+                ' episode INTEGER, value REAL, PRIMARY KEY (fingerprint, digest, episode))'
+                ' WITHOUT ROWID'
+            )
+            self.pid = os.getpid()
+        return self.connection
+
+    def find(self, digest: bytes) -> List[float] or None:
+        """Return the stored values of a genome in episode order, or None if there are none."""
+        rows = self.connect().execute(
+            'SELECT value FROM episodes WHERE fingerprint = ? AND digest = ? ORDER BY episode',
+            (self.fingerprint, digest)
+        ).fetchall()
+        if not rows:
+            self.n_misses += 1
+            return None
+        self.n_hits += 1
+        self.n_reused += len(rows)
+        return [row[0] for row in rows]
+
+    def insert(self, digest: bytes, episode: int, value: float) -> None:
+        """Store the value of an episode unless another process has already stored it."""
+        cursor = self.connect().execute(
+            'INSERT OR IGNORE INTO episodes VALUES (?, ?, ?, ?)',
+            (self.fingerprint, digest, episode, value)
+        )
+        self.n_stored += cursor.rowcount
+
+    def close(self) -> None:
+        """Close the connection of this process."""
+        if self.connection is not None and self.pid == os.getpid():
+            self.connection.close()
+        self.connection = None
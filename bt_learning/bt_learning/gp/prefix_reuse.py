@@ -0,0 +1,243 @@
+"""Evaluation that reuses world-state snapshots of shared execution prefixes."""
+
+# Copyright (c) 2022, ABB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with
+# or without modification, are permitted provided that
+# the following conditions are met:
+#
+#   * Redistributions of source code must retain the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer.
+#   * Redistributions in binary form must reproduce the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer in the documentation
+#     and/or other materials provided with the
+#     distribution.
+#   * Neither the name of ABB nor the names of its
+#     contributors may be used to endorse or promote
+#     products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from typing import Any, Callable, Dict, List, Tuple
+
+from behaviors.behavior_lists import BehaviorLists
+import py_trees as pt
+
+
+Status = pt.common.Status
+
+
+def parse_genome(genome: List[Any], behavior_lists: BehaviorLists) -> Any:
+    """
+    Return the genome as a nested tree.
+
+    Control nodes are (node, children) tuples and leaves are the nodes themselves.
+    """
+    def parse(index: int) -> Tuple[Any, int]:
+        node = genome[index]
+        if not behavior_lists.is_control_node(node):
+            return node, index + 1
+        children = []
+        index += 1
+        while index < len(genome) and not behavior_lists.is_up_node(genome[index]):
+            child, index = parse(index)
+            children.append(child)
+        return (node, children), index + 1
+
+    return parse(0)[0]
+
+
+def tick(
+    tree: Any,
+    behavior_lists: BehaviorLists,
+    leaf_status: Callable[[Any], Status]
+) -> Status:
+    """
+    Tick a parsed tree once and return the status of the root.
+
+    Sequences and fallbacks are reactive, that is without memory, as in common_behaviors.
+    leaf_status is called with each leaf that is ticked and returns its status.
+    """
+    if not isinstance(tree, tuple):
+        return leaf_status(tree)
+    node, children = tree
+    if behavior_lists.is_sequence_node(node):
+        for child in children:
+            status = tick(child, behavior_lists, leaf_status)
+            if status != Status.SUCCESS:
+                return status
+        return Status.SUCCESS
+    for child in children:
+        status = tick(child, behavior_lists, leaf_status)
+        if status != Status.FAILURE:
+            return status
+    return Status.FAILURE
+
+
+class _Mismatch(Exception):
+    """Raised when a replayed tree ticks a leaf that was not recorded."""
+
+
+def replays(tree: Any, behavior_lists: BehaviorLists, signature: Tuple) -> bool:
+    """
+    Check if tree executes exactly the leaves of signature when they return its statuses.
+
+    signature is the tuple of (leaf string, status) of one recorded tick. Since leaves
+    only see the world, a tree that replays a signature takes the same actions
+    in the same world state as the recorded tree did.
+    """
+    recorded = iter(signature)
+
+    def leaf_status(node: Any) -> Status:
+        leaf, status = next(recorded, (None, None))
+        if leaf != str(node):
+            raise _Mismatch
+        return status
+
+    try:
+        tick(tree, behavior_lists, leaf_status)
+    except _Mismatch:
+        return False
+    return next(recorded, None) is None
+
+
+class SnapshotNode:
+    """World state and episode counters after a sequence of ticks."""
+
+    def __init__(
+        self,
+        snapshot: Any,
+        status: Status = Status.INVALID,
+        ticks: int = 0,
+        successes: int = 0,
+        straight_fails: int = 0
+    ):
+        self.snapshot = snapshot
+        self.status = status
+        self.ticks = ticks
+        self.successes = successes
+        self.straight_fails = straight_fails
+        self.children: Dict[Tuple, SnapshotNode] = {}
+
+
+class PrefixReuseEnvironment:
+    """
+    Environment that resumes episodes from recorded world-state snapshots.
+
+    The world must be deterministic and have the functions
+        reset(episode) to set the initial state of an episode,
+        snapshot() and restore(snapshot) to copy and set the world state,
+        tick_leaf(node) to execute a leaf and return its status and
+        get_fitness(individual, ticks, failed, timeout) to score the final state.
+    Leaf statuses must only depend on the world state, any internal state of the
+    leaves must be part of the snapshot.
+
+    For each episode, the ticks of all evaluated individuals are recorded in a tree of
+    snapshots keyed by the leaves executed and their statuses. An individual is resumed
+    from the deepest snapshot whose ticks it replays, see replays, so offspring that
+    share an execution prefix with an earlier individual only simulate the rest.
+    Episodes end as in PyTree.run_bt. At most max_snapshots snapshots are kept.
+    """
+
+    def __init__(
+        self,
+        world: Any,
+        behavior_lists: BehaviorLists,
+        max_ticks: int = 200,
+        max_fails: int = 1,
+        successes_required: int = 2,
+        max_snapshots: int = 100000
+    ):
+        # pylint: disable=too-many-arguments
+        self.world = world
+        self.behavior_lists = behavior_lists
+        self.max_ticks = max_ticks
+        self.max_fails = max_fails
+        self.successes_required = successes_required
+        self.max_snapshots = max_snapshots
+        self.roots: Dict[Any, SnapshotNode] = {}
+        self.n_snapshots = 0
+        self.n_ticks = 0
+        self.n_reused_ticks = 0
+
+    def running(self, node: SnapshotNode) -> bool:
+        """Check if the episode continues after node."""
+        return (node.status != Status.FAILURE or node.straight_fails < self.max_fails) and\
+            (node.status != Status.SUCCESS or node.successes < self.successes_required) and\
+            node.ticks < self.max_ticks
+
+    def resume(self, tree: Any, seed: Any) -> SnapshotNode:
+        """Restore the world to the deepest recorded snapshot that tree replays."""
+        node = self.roots.get(seed)
+        if node is None:
+            self.world.reset(seed)
+            node = SnapshotNode(None)
+            if self.n_snapshots < self.max_snapshots:
+                node.snapshot = self.world.snapshot()
+                self.roots[seed] = node
+                self.n_snapshots += 1
+            return node
+
+        found = True
+        while found and self.running(node):
+            found = False
+            for signature, child in node.children.items():
+                if replays(tree, self.behavior_lists, signature):
+                    node = child
+                    found = True
+                    break
+        self.n_reused_ticks += node.ticks
+        self.world.restore(node.snapshot)
+        return node
+
+    def step(self, tree: Any, node: SnapshotNode) -> SnapshotNode:
+        """Tick the tree once in the world and record the new snapshot."""
+        signature = []
+
+        def leaf_status(leaf: Any) -> Status:
+            status = self.world.tick_leaf(leaf)
+            signature.append((str(leaf), status))
+            return status
+
+        status = tick(tree, self.behavior_lists, leaf_status)
+        self.n_ticks += 1
+        child = SnapshotNode(
+            None,
+            status,
+            node.ticks + 1,
+            node.successes + 1 if status == Status.SUCCESS else 0,
+            node.straight_fails + 1 if status == Status.FAILURE else 0
+        )
+        if node.snapshot is not None and self.n_snapshots < self.max_snapshots:
+            child.snapshot = self.world.snapshot()
+            node.children[tuple(signature)] = child
+            self.n_snapshots += 1
+        return child
+
+    def get_fitness(self, individual: List[Any], seed: Any = None) -> float:
+        """Run the episode from the deepest shared snapshot and return the fitness."""
+        tree = parse_genome(individual, self.behavior_lists)
+        node = self.resume(tree, seed)
+        while self.running(node):
+            node = self.step(tree, node)
+        failed = node.straight_fails >= self.max_fails
+        timeout = node.ticks >= self.max_ticks
+        return self.world.get_fitness(individual, node.ticks, failed, timeout)
+
+    def reuse_fraction(self) -> float:
+        """Return the fraction of ticks that were resumed from snapshots instead of run."""
+        total = self.n_ticks + self.n_reused_ticks
+        return self.n_reused_ticks / total if total > 0 else 0.0
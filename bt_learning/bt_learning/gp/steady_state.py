@@ -0,0 +1,433 @@
+"""A steady-state genetic programming algorithm with asynchronous fitness evaluation."""
+
+# Copyright (c) 2022, ABB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with
+# or without modification, are permitted provided that
+# the following conditions are met:
+#
+#   * Redistributions of source code must retain the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer.
+#   * Redistributions in binary form must reproduce the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer in the documentation
+#     and/or other materials provided with the
+#     distribution.
+#   * Neither the name of ABB nor the names of its
+#     contributors may be used to endorse or promote
+#     products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import dataclasses
+import random
+from statistics import mean
+import time
+from typing import Any, List, Tuple
+
+from bt_learning.gp import logplot
+from bt_learning.gp.evaluators import seeded_environment
+import bt_learning.gp.genetic_programming as gp
+from bt_learning.gp.hash_table import GenomeIndex, HashTable
+from bt_learning.gp.journal import Journal
+
+
+def get_episode_values(
+    individual: Any,
+    environment: Any,
+    first_episode: int,
+    n_episodes: int
+) -> List[float]:
+    """
+    Return the fitness values of a number of episodes.
+
+    This version excludes the hash table so that it can be run in a worker process.
+    """
+    values = []
+    for i in range(first_episode, first_episode + n_episodes):
+        values.append(environment.get_fitness(individual, i))
+    return values
+
+
+class AsyncEvaluator:
+    """
+    Evaluation slots for the steady-state algorithm.
+
+    With more than one worker the episodes are run in a pool of processes and
+    results are returned as soon as any evaluation is done.
+    With one worker the episodes are run directly when submitted.
+    """
+
+    def __init__(self, environment: Any, n_workers: int = 1):
+        self.environment = environment
+        self.n_workers = max(n_workers, 1)
+        self.executor = None
+        if self.n_workers > 1:
+            self.executor = ProcessPoolExecutor(max_workers=self.n_workers)
+        self.pending = {}
+        self.done = []
+
+    def n_pending(self) -> int:
+        """Return the number of evaluations that are submitted but not yet collected."""
+        return len(self.pending) + len(self.done)
+
+    def has_free_slot(self) -> bool:
+        """Check if there is a worker ready to start a new evaluation."""
+        return self.n_pending() < self.n_workers
+
+    def pending_individuals(self) -> list:
+        """Return the individuals currently being evaluated."""
+        return list(self.pending.values()) + [individual for individual, _ in self.done]
+
+    def submit(self, individual: Any, first_episode: int, n_episodes: int) -> None:
+        """Start the evaluation of an individual."""
+        if self.executor is None:
+            values = get_episode_values(individual, self.environment, first_episode, n_episodes)
+            self.done.append((individual, values))
+        else:
+            future = self.executor.submit(
+                get_episode_values, individual, self.environment, first_episode, n_episodes)
+            self.pending[future] = individual
+
+    def wait(self) -> List[Tuple[Any, List[float]]]:
+        """Block until at least one evaluation is done and return all finished ones."""
+        results = self.done
+        self.done = []
+        if self.pending and not results:
+            finished, _ = wait(list(self.pending.keys()), return_when=FIRST_COMPLETED)
+            for future in finished:
+                results.append((self.pending.pop(future), future.result()))
+        return results
+
+    def shutdown(self) -> None:
+        """Stop the worker processes, evaluations not yet started are cancelled."""
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+
+def breed(
+    population: list,
+    fitness: List[float],
+    in_flight: list,
+    gp_par: gp.GpParameters,
+    baseline: Any = None,
+    crossover_baseline_index: int = None
+) -> list:
+    """
+    Generate offspring from one crossover or one mutation.
+
+    The operator is chosen with probability proportional to f_crossover and f_mutation.
+    Individuals currently being evaluated count as part of the population
+    when checking for identical offspring.
+    crossover_baseline_index is the position in the baseline where crossover inserts
+    subtrees, see gp_bt_interface.crossover_genome.
+    If keep_baseline and boost_baseline are set, the baseline is selected as parent
+    as if it had the best fitness, for crossover only if boost_baseline_only_co is set.
+    """
+    single_par = dataclasses.replace(gp_par, n_offspring_crossover=1, n_offspring_mutation=1)
+    known = population + in_flight
+    genome_index = None if gp_par.allow_identical else\
+        GenomeIndex(known, gp.key_behavior_lists(gp_par))
+    p_crossover = 0.0
+    if gp_par.f_crossover + gp_par.f_mutation > 0:
+        p_crossover = gp_par.f_crossover / (gp_par.f_crossover + gp_par.f_mutation)
+
+    lengths = gp.parsimony_lengths(population, gp_par.parent_selection, gp_par)
+    crossover_fitness = mutation_fitness = gp.tarpeian(fitness, lengths, gp_par.tarpeian_p)
+    if gp_par.keep_baseline and gp_par.boost_baseline and baseline is not None and\
+            baseline in population:
+        crossover_fitness = list(crossover_fitness)
+        crossover_fitness[population.index(baseline)] = max(crossover_fitness)
+        if not gp_par.boost_baseline_only_co:
+            mutation_fitness = crossover_fitness
+    if len(population) >= 2 and random.random() < p_crossover:
+        parents = gp.selection(range(len(population)), crossover_fitness, 2,
+                               gp_par.parent_selection, lengths=lengths, gp_par=gp_par)
+        return gp.crossover(
+            known, parents, single_par, baseline, crossover_baseline_index,
+            genome_index=genome_index)
+
+    parents = gp.selection(range(len(population)), mutation_fitness, 1, gp_par.parent_selection,
+                           lengths=lengths, gp_par=gp_par)
+    return gp.mutation(known, parents, single_par, genome_index)
+
+
+def replace(
+    population: list,
+    fitness: List[float],
+    offspring: Any,
+    offspring_fitness: float,
+    gp_par: gp.GpParameters,
+    protected: Any = None,
+    is_parent: List[bool] = None
+) -> None:
+    """
+    Insert an offspring into the population and remove individuals if it is full.
+
+    The best f_elites fraction and the protected individual, if given, are never
+    removed, the others are kept according to the survivor selection method.
+    If is_parent is given, it flags the individuals from before the current generation
+    and is kept in step with the population. While more than the f_parents fraction of
+    the population are parents, the worst parents are removed first, so that only the
+    best parents survive a generation as in genetic_programming.survivor_selection.
+    """
+    population.append(offspring)
+    fitness.append(offspring_fitness)
+    if is_parent is not None:
+        is_parent.append(False)
+    n_removed = len(population) - gp_par.n_population
+    if n_removed <= 0:
+        return
+
+    kept = []
+    if protected is not None and protected in population:
+        kept.append(population.index(protected))
+    removed = []
+    if is_parent is not None:
+        n_parents = int(round(gp_par.f_parents * gp_par.n_population))
+        parents = [i for i in range(len(population)) if is_parent[i] and i not in kept]
+        ranked = gp.elite_selection(parents, [fitness[i] for i in parents], len(parents))
+        removed = ranked[::-1][:max(min(n_removed, len(parents) - n_parents), 0)]
+
+    remaining = [i for i in range(len(population)) if i not in removed]
+    n_elites = int(round(gp_par.f_elites * gp_par.n_population))
+    if n_elites > 0:
+        kept += gp.elite_selection(remaining, [fitness[i] for i in remaining], n_elites)
+    candidates = [i for i in remaining if i not in kept]
+    selected = gp.selection(
+        range(len(candidates)),
+        [fitness[i] for i in candidates],
+        max(len(candidates) - (n_removed - len(removed)), 0),
+        gp_par.survivor_selection,
+        lengths=gp.parsimony_lengths(
+            [population[i] for i in candidates], gp_par.survivor_selection, gp_par),
+        gp_par=gp_par
+    )
+    removed += [candidates[i] for i in range(len(candidates)) if i not in selected]
+    for i in sorted(removed, reverse=True):
+        population.pop(i)
+        fitness.pop(i)
+        if is_parent is not None:
+            is_parent.pop(i)
+
+
+def run(
+    environment: Any,
+    gp_par: gp.GpParameters,
+    hotstart: bool = False,
+    baseline: Any = None,
+    n_workers: int = 1,
+    crossover_baseline_index: int = None
+) -> Tuple[list, List[float], float, Any]:
+    # pylint: disable=too-many-statements, too-many-locals, too-many-branches
+    """
+    Run the steady-state genetic programming algorithm.
+
+    A new offspring is bred and sent for evaluation as soon as any of the n_workers
+    evaluation slots is free, and it replaces an individual of the population
+    as soon as its fitness is known.
+    Every n_population evaluated offspring count as one generation for logging
+    and for checking the termination criteria. Within a generation, offspring replace
+    the individuals of the previous generation as limited by f_parents, see replace.
+    If keep_baseline is set, the baseline is added to the population and never removed.
+    crossover_baseline_index is the position in the baseline where crossover inserts
+    subtrees, see gp_bt_interface.crossover_genome.
+    """
+    start_time = time.time()
+    environment = seeded_environment(environment, gp_par.run_seed)
+    hash_table = HashTable(
+        gp_par.hash_table_size,
+        gp_par.log_name,
+        behavior_lists=gp.key_behavior_lists(gp_par),
+        persistent_cache=gp.get_persistent_cache(gp_par),
+        **gp.hash_table_limits(gp_par)
+    )
+    journal = None
+    if gp_par.journal_compact_interval > 0:
+        journal = Journal(gp_par.log_name, compact_interval=gp_par.journal_compact_interval)
+
+    if hotstart:
+        best_fitness, n_episodes, last_generation, population =\
+            gp.load_state(gp_par.log_name, hash_table, journal=journal)
+    else:
+        population = gp.create_population(
+            gp_par.n_population,
+            gp_par.ind_start_length,
+            gp_par.mutation_p_leaf,
+            gp_par.behavior_lists,
+            max_depth=gp_par.ind_start_depth
+        )
+        logplot.clear_logs(gp_par.log_name)
+        best_fitness = []
+        n_episodes = [hash_table.n_values]
+        last_generation = 0
+
+        if baseline is not None:
+            population[0] = baseline
+    protected = None
+    if gp_par.keep_baseline and baseline is not None:
+        protected = baseline
+        if baseline not in population:
+            population.append(baseline)  # Make sure we are able to source from baseline
+
+    evaluator = AsyncEvaluator(environment, n_workers)
+    # Values are kept here since a bounded hash table may evict them after insertion
+    known = {}
+    keys = [hash_table.key(individual) for individual in population]
+    for individual, key in zip(population, keys):
+        values = hash_table.find(individual, key)
+        known.setdefault(key, list(values or []))
+        if values is None:
+            evaluator.submit(individual, 0, gp_par.min_episodes)
+    while evaluator.n_pending() > 0:
+        for individual, values in evaluator.wait():
+            key = hash_table.key(individual)
+            for value in values:
+                hash_table.insert(individual, value, key)
+            known[key] += values
+    fitness = [mean(known[key]) for key in keys]
+
+    if not hotstart:
+        best_fitness.append(max(fitness))
+        if gp_par.verbose:
+            gp.print_population(population, fitness, last_generation)
+            print('Generation: ', last_generation, ' Best fitness: ', best_fitness[-1])
+        logplot.log_fitness(gp_par.log_name, fitness)
+        logplot.log_population(gp_par.log_name, population)
+        logplot.log_length(gp_par.log_name, population)
+        gp.log_hash_table(gp_par.log_name, last_generation, hash_table)
+
+    generation = last_generation
+    max_offspring = max(gp_par.n_generations - 1 - last_generation, 0) * gp_par.n_population
+    n_bred = 0
+    n_replaced = 0
+    failed_attempts = 0
+    terminated = gp.termination_reached(gp_par, best_fitness, n_episodes, start_time)
+    is_parent = [True] * len(population)
+    # Values of the submitted offspring from before their evaluation, in order of
+    # submission by digest
+    earlier_values = {}
+
+    def add_offspring(offspring: Any, offspring_fitness: float) -> None:
+        """Replace into the population and log every n_population offspring."""
+        nonlocal generation, n_replaced, terminated
+        if offspring is not None:
+            replace(population, fitness, offspring, offspring_fitness, gp_par, protected,
+                    is_parent)
+        n_replaced += 1
+        if n_replaced % gp_par.n_population == 0:
+            generation += 1
+            is_parent[:] = [True] * len(population)
+            best_fitness.append(max(fitness))
+            n_episodes.append(hash_table.n_values)
+            logplot.log_fitness(gp_par.log_name, fitness)
+            logplot.log_population(gp_par.log_name, population)
+            logplot.log_length(gp_par.log_name, population)
+            gp.log_hash_table(gp_par.log_name, generation, hash_table)
+            if gp_par.verbose:
+                print(
+                    'Generation: ', generation,
+                    ' Fitness: ', fitness,
+                    ' Best fitness: ', best_fitness[-1]
+                )
+            terminated = gp.termination_reached(gp_par, best_fitness, n_episodes, start_time)
+            if (generation + 1) % gp_par.save_interval == 0 and\
+               generation < gp_par.n_generations - 1 and not terminated:  # Last is saved later
+                gp.save_state(
+                    gp_par,
+                    population,
+                    None,
+                    best_fitness,
+                    n_episodes,
+                    baseline,
+                    generation,
+                    hash_table,
+                    journal=journal
+                )
+
+    while n_replaced < max_offspring and not terminated:
+        while n_bred < max_offspring and evaluator.has_free_slot() and not terminated:
+            offspring_list = breed(
+                population,
+                fitness,
+                evaluator.pending_individuals(),
+                gp_par,
+                baseline,
+                crossover_baseline_index
+            )
+            if not offspring_list:
+                failed_attempts += 1
+                if failed_attempts >= 100:
+                    # No new offspring can be bred, count the slot as used
+                    failed_attempts = 0
+                    n_bred += 1
+                    add_offspring(None, None)
+                continue
+            failed_attempts = 0
+            for offspring in offspring_list[:max_offspring - n_bred]:
+                n_bred += 1
+                key = hash_table.key(offspring)
+                values = hash_table.find(offspring, key)
+                if values is None:
+                    earlier_values.setdefault(key, []).append([])
+                    evaluator.submit(offspring, 0, gp_par.min_episodes)
+                elif gp_par.rerun_fitness == 2 or (gp_par.rerun_fitness == 1 and
+                                                   random.random() <
+                                                   gp.rerun_probability(len(values))):
+                    earlier_values.setdefault(key, []).append(list(values))
+                    evaluator.submit(offspring, len(values), 1)
+                else:
+                    add_offspring(offspring, mean(values))
+
+        for offspring, values in evaluator.wait():
+            key = hash_table.key(offspring)
+            for value in values:
+                hash_table.insert(offspring, value, key)
+            values = earlier_values[key].pop(0) + values
+            if not earlier_values[key]:
+                del earlier_values[key]
+            if not terminated:
+                add_offspring(offspring, mean(values))
+
+    evaluator.shutdown()
+
+    print('\nFINAL POPULATION: ')
+    gp.print_population(population, fitness, generation)
+
+    best_individual = gp.selection(population, fitness, 1, gp.SelectionMethods.ELITISM)[0]
+
+    gp.save_state(
+        gp_par,
+        population,
+        best_individual,
+        best_fitness,
+        n_episodes,
+        baseline,
+        generation,
+        hash_table,
+        journal=journal
+    )
+
+    if gp_par.plot:
+        logplot.plot_fitness(gp_par.log_name, best_fitness, n_episodes)
+    if gp_par.fig_best:
+        environment.plot_individual(
+            logplot.get_log_folder(gp_par.log_name),
+            'best individual',
+            best_individual
+        )
+
+    return population, fitness, best_fitness, best_individual
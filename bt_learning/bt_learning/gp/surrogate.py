@@ -0,0 +1,157 @@
+"""Surrogate model that predicts fitness from genome features."""
+
+# Copyright (c) 2022, ABB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with
+# or without modification, are permitted provided that
+# the following conditions are met:
+#
+#   * Redistributions of source code must retain the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer.
+#   * Redistributions in binary form must reproduce the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer in the documentation
+#     and/or other materials provided with the
+#     distribution.
+#   * Neither the name of ABB nor the names of its
+#     contributors may be used to endorse or promote
+#     products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import random
+from typing import Any
+import zlib
+import numpy as np
+
+from behaviors.behavior_lists import BehaviorLists, ParameterizedNode
+from behaviors.behavior_tree import BT
+from bt_learning.gp.hash_table import genome_digest
+
+
+def node_token(node: Any) -> str:
+    """Return the node type of a genome node as a string."""
+    if isinstance(node, ParameterizedNode):
+        return node.name
+    return str(node)
+
+
+class SurrogateModel:
+    """
+    Ridge regression on hashed genome features, trained online.
+
+    The features are a histogram of node types and node type bigrams, hashed to
+    n_features buckets, together with the length and the depth of the bt.
+    """
+
+    def __init__(
+        self,
+        behavior_lists: BehaviorLists,
+        n_features: int = 64,
+        min_samples: int = 50,
+        exploration: float = 0.1,
+        regularization: float = 1.0
+    ):
+        # pylint: disable=too-many-arguments
+        self.behavior_lists = behavior_lists
+        self.n_features = n_features
+        self.min_samples = min_samples
+        self.exploration = exploration
+        self.threshold = None
+        size = n_features + 3
+        self.xtx = regularization * np.eye(size)
+        self.xty = np.zeros(size)
+        self.weights = None
+        self.n_samples = 0
+
+        self.predictions = {}
+        self.n_rejected = 0
+        # Confusion matrix where positive means predicted to be inferior.
+        # Rejected individuals are only seen when explored and are weighted accordingly.
+        self.true_positives = 0.0
+        self.false_positives = 0.0
+        self.false_negatives = 0.0
+        self.true_negatives = 0.0
+
+    def features(self, genome: list) -> np.ndarray:
+        """Return the feature vector of a genome."""
+        x = np.zeros(self.n_features + 3)
+        tokens = [node_token(node) for node in genome]
+        ngrams = tokens + [a + ' ' + b for a, b in zip(tokens[:-1], tokens[1:])]
+        for ngram in ngrams:
+            x[zlib.crc32(ngram.encode('utf-8')) % self.n_features] += 1
+        bt = BT(genome, self.behavior_lists)
+        x[-3] = bt.length()
+        x[-2] = bt.depth()
+        x[-1] = 1.0
+        return x
+
+    def add(self, genome: list, fitness: float) -> None:
+        """Train on an evaluated genome and update statistics if it was screened."""
+        key = genome_digest(genome)
+        if key in self.predictions:
+            predicted_inferior, explored = self.predictions.pop(key)
+            inferior = fitness < self.threshold
+            weight = 1.0 / self.exploration if explored else 1.0
+            if predicted_inferior and inferior:
+                self.true_positives += weight
+            elif predicted_inferior:
+                self.false_positives += weight
+            elif inferior:
+                self.false_negatives += 1.0
+            else:
+                self.true_negatives += 1.0
+
+        x = self.features(genome)
+        self.xtx += np.outer(x, x)
+        self.xty += x * fitness
+        self.weights = None
+        self.n_samples += 1
+
+    def predict(self, genome: list) -> float or None:
+        """Return predicted fitness or None if the model is not trained enough."""
+        if self.n_samples < self.min_samples:
+            return None
+        if self.weights is None:
+            self.weights = np.linalg.solve(self.xtx, self.xty)
+        return float(self.features(genome) @ self.weights)
+
+    def screen(self, genome: list) -> bool:
+        """
+        Return True if the genome should be evaluated.
+
+        Genomes predicted to be worse than threshold are rejected, except for a
+        random fraction given by the exploration rate.
+        """
+        prediction = self.predict(genome) if self.threshold is not None else None
+        if prediction is None:
+            return True
+        predicted_inferior = prediction < self.threshold
+        explored = predicted_inferior and random.random() < self.exploration
+        if predicted_inferior and not explored:
+            self.n_rejected += 1
+            return False
+        self.predictions[genome_digest(genome)] = (predicted_inferior, explored)
+        return True
+
+    def precision(self) -> float:
+        """Return the fraction of rejected individuals that are inferior."""
+        predicted = self.true_positives + self.false_positives
+        return self.true_positives / predicted if predicted > 0 else 0.0
+
+    def recall(self) -> float:
+        """Return the fraction of inferior individuals that are rejected."""
+        inferior = self.true_positives + self.false_negatives
+        return self.true_positives / inferior if inferior > 0 else 0.0
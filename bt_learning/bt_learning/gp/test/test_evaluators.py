@@ -0,0 +1,218 @@
+"""Unit test for evaluators.py module."""
+
+# Copyright (c) 2022, ABB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with
+# or without modification, are permitted provided that
+# the following conditions are met:
+#
+#   * Redistributions of source code must retain the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer.
+#   * Redistributions in binary form must reproduce the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer in the documentation
+#     and/or other materials provided with the
+#     distribution.
+#   * Neither the name of ABB nor the names of its
+#     contributors may be used to endorse or promote
+#     products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import random
+
+import numpy as np
+
+from bt_learning.gp import evaluators
+
+from . import environment_strings as environment
+
+
+class TestEnvironment:
+    """Picklable environment for the test routines."""
+
+    def get_fitness(self, individual, _seed=None):
+        """Wrap get_fitness function."""
+        return environment.get_fitness(individual, _seed)
+
+
+class NoisyEnvironment:
+    """Environment with noise from the global random number generators."""
+
+    def get_fitness(self, individual, _seed=None):
+        """Return fitness with noise."""
+        return environment.get_fitness(individual, _seed) + random.random() + np.random.rand()
+
+
+class BatchEnvironment:
+    """Environment that evaluates a whole batch at once."""
+
+    def __init__(self):
+        self.batches = []
+
+    def get_fitness_batch(self, genomes, seeds, rngs=None):
+        """Return fitness of all genomes."""
+        self.batches.append(len(genomes))
+        return [environment.get_fitness(genome, seed) for genome, seed in zip(genomes, seeds)]
+
+
+class NoisyBatchEnvironment:
+    """Batch environment with noise from the random generators of the episodes."""
+
+    def get_fitness_batch(self, genomes, seeds, rngs):
+        """Return fitness of all genomes with noise."""
+        return [environment.get_fitness(genome, seed) + rng.random()
+                for genome, seed, rng in zip(genomes, seeds, rngs)]
+
+
+class StubApplication:
+    """Stand-in for a simulator application."""
+
+    def __init__(self, args):
+        self.args = args
+        self.is_up = False
+
+    def bringup(self, _data, visual=False):
+        """Start the simulation."""
+        assert not visual
+        self.is_up = True
+
+    def shutdown(self):
+        """Stop the simulation."""
+        self.is_up = False
+
+
+class StubEnvironment:
+    """Environment that needs a running application."""
+
+    def __init__(self):
+        self.app = None
+
+    def set_application(self, application):
+        """Set the application."""
+        self.app = application
+
+    def get_fitness(self, individual, _seed=None):
+        """Return fitness if the application is running."""
+        assert self.app is not None and self.app.is_up
+        return environment.get_fitness(individual, _seed)
+
+
+def make_stub_environment():
+    """Start an application and return an environment using it."""
+    app = StubApplication(['-a'])
+    app.bringup({})
+    stub_environment = StubEnvironment()
+    stub_environment.set_application(app)
+    return stub_environment
+
+
+genomes = [[], ['b?'], ['b?', 'c?'], ['b?', 'c?', 'ad!']] * 3
+seeds = list(range(len(genomes)))
+target_fitness = [environment.get_fitness(genome) for genome in genomes]
+
+
+def test_serial_evaluator():
+    """Test SerialEvaluator class."""
+    evaluator = evaluators.SerialEvaluator(environment)
+    assert evaluator.evaluate_batch(genomes, seeds) == target_fitness
+    assert evaluator.evaluate_batch([], []) == []
+
+
+def test_process_pool_evaluator():
+    """Test ProcessPoolEvaluator class."""
+    evaluator = evaluators.ProcessPoolEvaluator(TestEnvironment(), 2)
+    assert evaluator.evaluate_batch(genomes, seeds) == target_fitness
+    assert evaluator.evaluate_batch(genomes[:1], seeds[:1]) == target_fitness[:1]
+    assert evaluator.evaluate_batch([], []) == []
+    evaluator.close()
+
+    evaluator = evaluators.ProcessPoolEvaluator(
+        n_workers=2, environment_factory=make_stub_environment)
+    assert evaluator.evaluate_batch(genomes, seeds) == target_fitness
+    evaluator.close()
+
+
+def test_vectorized_evaluator():
+    """Test VectorizedEvaluator class."""
+    batch_environment = BatchEnvironment()
+    evaluator = evaluators.VectorizedEvaluator(batch_environment)
+    assert evaluator.evaluate_batch(genomes, seeds) == target_fitness
+    assert batch_environment.batches == [len(genomes)]
+
+    batch_environment = BatchEnvironment()
+    evaluator = evaluators.VectorizedEvaluator(batch_environment, batch_size=5)
+    assert evaluator.evaluate_batch(genomes, seeds) == target_fitness
+    assert batch_environment.batches == [5, 5, 2]
+
+    # Results are passed through unchanged, e.g. fitness with behavior descriptor
+    batch_environment.get_fitness_batch = lambda batch, _: [(1.0, np.zeros(2))] * len(batch)
+    results = evaluator.evaluate_batch(genomes[:2], seeds[:2])
+    assert len(results) == 2
+    assert results[0][0] == 1.0
+    assert list(results[0][1]) == [0.0, 0.0]
+
+
+def test_get_evaluator():
+    """Test get_evaluator function."""
+    assert isinstance(evaluators.get_evaluator(environment), evaluators.SerialEvaluator)
+    assert isinstance(
+        evaluators.get_evaluator(BatchEnvironment()), evaluators.VectorizedEvaluator)
+    evaluator = evaluators.SerialEvaluator(environment)
+    assert evaluators.get_evaluator(evaluator) is evaluator
+
+
+def test_seeded_environment():
+    """Test that episodes get their own random streams."""
+    seeded = evaluators.SeededEnvironment(NoisyEnvironment(), 1)
+    random.seed(0)
+    np.random.seed(0)
+    fitness = evaluators.SerialEvaluator(seeded).evaluate_batch(genomes, seeds)
+    assert random.random() == random.Random(0).random()
+    assert np.random.rand() == np.random.RandomState(0).rand()
+
+    assert fitness == [seeded.get_fitness(genome, seed) for genome, seed in zip(genomes, seeds)]
+    assert seeded.get_fitness(genomes[0], 0) != seeded.get_fitness(genomes[0], 1)
+    assert seeded.get_fitness(genomes[0], 0) != seeded.get_fitness(genomes[1], 0)
+    assert seeded.get_fitness(genomes[0], 0) !=\
+        evaluators.SeededEnvironment(NoisyEnvironment(), 2).get_fitness(genomes[0], 0)
+
+    evaluator = evaluators.ProcessPoolEvaluator(seeded, 2)
+    assert evaluator.evaluate_batch(genomes[::-1], seeds[::-1]) == fitness[::-1]
+    evaluator.close()
+
+    # Other attributes are forwarded and batches keep the vectorized path
+    batch_environment = BatchEnvironment()
+    seeded = evaluators.SeededEnvironment(batch_environment, 1)
+    assert seeded.batches is batch_environment.batches
+    evaluator = evaluators.get_evaluator(seeded)
+    assert isinstance(evaluator, evaluators.VectorizedEvaluator)
+    assert evaluator.evaluate_batch(genomes, seeds) == target_fitness
+    assert batch_environment.batches == [len(genomes)]
+    assert not hasattr(evaluators.SeededEnvironment(NoisyEnvironment(), 1), 'get_fitness_batch')
+
+    # Batch episodes get their own generators, so splitting the batch changes nothing
+    seeded = evaluators.SeededEnvironment(NoisyBatchEnvironment(), 1)
+    fitness = evaluators.VectorizedEvaluator(seeded).evaluate_batch(genomes, seeds)
+    assert fitness != evaluators.VectorizedEvaluator(
+        evaluators.SeededEnvironment(NoisyBatchEnvironment(), 2)).evaluate_batch(genomes, seeds)
+    assert len(set(fitness)) == len(fitness)
+    assert evaluators.VectorizedEvaluator(seeded, 5).evaluate_batch(genomes, seeds) == fitness
+    assert evaluators.VectorizedEvaluator(seeded, 1).evaluate_batch(genomes, seeds) == fitness
+    assert evaluators.VectorizedEvaluator(seeded).evaluate_batch(
+        genomes[::-1], seeds[::-1]) == fitness[::-1]
+
+    assert evaluators.seeded_environment(seeded, None) is seeded
+    assert evaluators.seeded_environment(None, 1) is None
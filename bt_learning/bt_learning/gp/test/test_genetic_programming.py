@@ -31,17 +31,25 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
 # THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import os
 import random
 from statistics import mean
+import time
+import numpy as np
 import pytest
 
-from behaviors import behavior_list_test_settings
+from behaviors import behavior_list_test_settings, behavior_tree
 from behaviors import behavior_lists as bl
 import bt_learning.gp.genetic_programming as gp
-from bt_learning.gp.hash_table import HashTable
+from bt_learning.gp import logplot
+from bt_learning.gp.evaluators import ProcessPoolEvaluator, SeededEnvironment, SerialEvaluator
+from bt_learning.gp.hall_of_fame import HallOfFame
+from bt_learning.gp.hash_table import EvictionPolicy, GenomeIndex, HashTable
+from bt_learning.gp.operator_adaptation import AdaptationMethods, OperatorAdaptation
 
 
 from . import environment_strings as environment
+from .test_evaluators import NoisyEnvironment
 
 
 behavior_lists = bl.BehaviorLists(
@@ -49,6 +57,42 @@ behavior_lists = bl.BehaviorLists(
     action_nodes=behavior_list_test_settings.get_action_nodes())
 
 
+class ShortestEnvironment:
+    """Cheap test environment that prefers short individuals."""
+
+    @staticmethod
+    def get_fitness(individual, _seed=None):
+        """Return fitness."""
+        return -len(individual)
+
+
+def test_termination_reached():
+    """Test termination_reached function."""
+    gp_par = gp.GpParameters()
+    start_time = time.time()
+    assert not gp.termination_reached(gp_par, [0, 1, 1, 1], [10, 20, 30, 40], start_time)
+
+    gp_par.max_episodes = 40
+    assert gp.termination_reached(gp_par, [0, 1], [10, 40], start_time)
+    assert not gp.termination_reached(gp_par, [0, 1], [10, 39], start_time)
+
+    gp_par = gp.GpParameters()
+    gp_par.target_fitness = 1.0
+    assert gp.termination_reached(gp_par, [0, 1], [], start_time)
+    assert not gp.termination_reached(gp_par, [0, 0.9], [], start_time)
+
+    gp_par = gp.GpParameters()
+    gp_par.stagnation_window = 2
+    assert gp.termination_reached(gp_par, [0, 1, 1, 1], [], start_time)
+    assert not gp.termination_reached(gp_par, [0, 1, 1, 2], [], start_time)
+    assert not gp.termination_reached(gp_par, [1, 1], [], start_time)
+
+    gp_par = gp.GpParameters()
+    gp_par.max_time = 10.0
+    assert not gp.termination_reached(gp_par, [], [], start_time)
+    assert gp.termination_reached(gp_par, [], [], start_time - 10.0)
+
+
 def test_create_population():
     """Test create_population function."""
     pop_size = 5
@@ -60,6 +104,13 @@ def test_create_population():
             for j in range(genome_length):
                 assert population[i][j] != []
 
+    for ramped in [True, False]:
+        population = gp.create_population(50, genome_length, 0.5, behavior_lists, ramped=ramped)
+        assert len(population) == 50
+        assert len(GenomeIndex(population)) == 50
+        for individual in population:
+            assert behavior_tree.BT(individual, behavior_lists).is_valid()
+
 
 def test_mutation():
     """Test mutation function."""
@@ -123,6 +174,7 @@ def test_mutation():
 
 def test_crossover():
     """Test crossover function."""
+    gp.set_seeds(0)
     pop_size = 10
     gp_par = gp.GpParameters()
     gp_par.behavior_lists = behavior_lists
@@ -164,6 +216,22 @@ def test_crossover():
             if i != j:
                 assert crossover_population[i] != crossover_population[j]
 
+    # Shared index between operators of the same generation
+    gp_par.n_offspring_crossover = 1
+    gp_par.n_population = pop_size
+    population = gp.create_population(pop_size, 5, 0.5, behavior_lists)
+    genome_index = GenomeIndex(population)
+    crossover_population = gp.crossover(
+        population, range(len(population)), gp_par, genome_index=genome_index)
+    mutated_population = gp.mutation(
+        population + crossover_population, range(len(population)), gp_par, genome_index)
+    assert len(genome_index) == \
+        len(population) + len(crossover_population) + len(mutated_population)
+    for individual in population + crossover_population + mutated_population:
+        assert individual in genome_index
+    for individual in mutated_population:
+        assert individual not in population + crossover_population
+
     # Number of parents not factor of two
     with pytest.raises(ValueError):
         crossover_population = gp.crossover(population, range(3), gp_par)
@@ -215,6 +283,146 @@ def test_get_fitness():
     assert mean(values) == fitness
 
 
+def test_get_fitness_batch():
+    """Test get_fitness_batch function."""
+    class CountingEvaluator(SerialEvaluator):
+        """Serial evaluator that records the batches."""
+
+        def __init__(self):
+            super().__init__(environment)
+            self.batches = []
+
+        def evaluate_batch(self, genomes, seeds):
+            self.batches.append(list(zip(genomes, seeds)))
+            return super().evaluate_batch(genomes, seeds)
+
+    evaluator = CountingEvaluator()
+    hash_table = HashTable()
+    individuals = [[], ['b?'], ['b?'], ['b?', 'c?']]
+    fitness = gp.get_fitness_batch(individuals, hash_table, evaluator, 0, 2)
+    assert fitness == [gp.get_fitness(x, HashTable(), environment) for x in individuals]
+    assert evaluator.batches == [
+        [([], 0), ([], 1), (['b?'], 0), (['b?'], 1), (['b?', 'c?'], 0), (['b?', 'c?'], 1)]]
+    assert hash_table.n_values == 6
+
+    fitness = gp.get_fitness_batch(individuals, hash_table, evaluator, 0, 2)
+    assert len(evaluator.batches) == 1
+
+    fitness = gp.get_fitness_batch(individuals, hash_table, evaluator, 2, 2)
+    assert evaluator.batches[-1] == [([], 2), (['b?'], 2), (['b?'], 3), (['b?', 'c?'], 2)]
+    assert len(hash_table.find(['b?'])) == 4
+
+    # Semantically identical genomes share episodes with canonical keys
+    evaluator = CountingEvaluator()
+    hash_table = HashTable(behavior_lists=bl.BehaviorLists(
+        condition_nodes=['b?', 'c?'], action_nodes=['ab!']))
+    individuals = [['s(', 'b?', 'c?', 'ab!', ')'], ['s(', 'c?', 's(', 'b?', 'ab!', ')', ')']]
+    fitness = gp.get_fitness_batch(individuals, hash_table, evaluator)
+    assert evaluator.batches == [[(individuals[0], 0)]]
+    assert fitness[0] == fitness[1]
+
+
+def test_racing_candidates():
+    """Test racing_candidates function."""
+    # No variance estimate, only the individuals on each side of the cutoff
+    values = [[3], [1], [2], [0]]
+    assert gp.racing_candidates(values, 2, 5, 1.96) == [2, 1]
+    assert gp.racing_candidates(values, 0, 5, 1.96) == []
+    assert gp.racing_candidates(values, 4, 5, 1.96) == []
+    assert gp.racing_candidates(values, 2, 1, 1.96) == []
+    assert gp.racing_candidates([[3], [1], [2, 2], [0]], 2, 5, 1.96) == []
+
+    # Cutoff is 1.65, only individuals whose interval contains it get more episodes
+    values = [[3], [1, 1.2], [2, 1.8], [0], [1.4]]
+    assert gp.racing_candidates(values, 2, 5, 1.96) == [4]
+    assert gp.racing_candidates(values, 2, 5, 10) == [0, 1, 2, 4]
+    assert gp.racing_candidates(values, 2, 2, 10) == [0, 4]
+
+
+def test_race():
+    """Test race function."""
+    gp_par = gp.GpParameters()
+    gp_par.racing_max_episodes = 10
+    random.seed(0)
+    hash_table = HashTable()
+    individuals = [['b?', 'c?', 'ad!'], ['b?', 'c?'], ['b?', 'r'], ['x'], ['y']]
+    fitness = [gp.get_fitness(individual, hash_table, environment)
+               for individual in individuals[:4]] + [-float('inf')]
+    fitness = gp.race(individuals, fitness, hash_table, environment, 2, gp_par)
+
+    assert len(hash_table.find(individuals[0])) == 1
+    assert len(hash_table.find(individuals[1])) > 1
+    assert 1 < len(hash_table.find(individuals[2])) <= gp_par.racing_max_episodes
+    assert len(hash_table.find(individuals[3])) == 1
+    assert hash_table.find(individuals[4]) is None
+    assert fitness[4] == -float('inf')
+    for i in range(4):
+        assert fitness[i] == mean(hash_table.find(individuals[i]))
+
+
+def test_get_offspring_fitness():
+    """Test get_offspring_fitness function."""
+    gp_par = gp.GpParameters()
+    hash_table = HashTable()
+    offspring = [['b?'], ['b?', 'c?'], ['b?', 'c?', 'ad!'], ['b?', 'c?', 'ad!', 'ae!']]
+    accepted, fitness = gp.get_offspring_fitness(offspring, hash_table, environment, gp_par)
+    assert accepted == offspring
+    assert fitness == pytest.approx([0.9, 1.8, 2.7, 3.6])
+
+    gp_par.f_promote = 0.5
+    hash_table = HashTable()
+    cheap_hash_table = HashTable()
+    accepted, fitness = gp.get_offspring_fitness(
+        offspring, hash_table, environment, gp_par, cheap_hash_table, ShortestEnvironment)
+    assert accepted == offspring[:2]
+    assert fitness == pytest.approx([0.9, 1.8])
+    assert hash_table.n_values == 2
+    assert cheap_hash_table.n_values == 4
+    assert cheap_hash_table.find(offspring[0]) == [-1]
+
+    # Offspring already evaluated in the expensive environment are not screened again
+    offspring = [['b?'], ['b?', 'c?', 'ad!'], ['b?', 'c?', 'ad!', 'ae!']]
+    gp_par.f_promote = 0.0
+    accepted, fitness = gp.get_offspring_fitness(
+        offspring, hash_table, environment, gp_par, cheap_hash_table, ShortestEnvironment)
+    assert accepted == offspring[:2]
+    assert fitness == pytest.approx([0.9, 2.7])
+    assert hash_table.n_values == 3
+    assert cheap_hash_table.n_values == 4
+
+
+def test_parsimony_selection():
+    """Test the double tournament, pareto and tarpeian methods."""
+    fitness = [1, 2, 3, 2, 1, 0]
+    lengths = [2, 4, 8, 3, 1, 1]
+
+    assert list(gp.pareto_indices(fitness, lengths, 6)) == [2, 3, 4, 1, 0, 5]
+    assert list(gp.pareto_indices(fitness, lengths, 2)) == [2, 3]
+    assert list(gp.pareto_indices(fitness, lengths, 0)) == []
+    assert gp.selection(['a', 'b', 'c', 'd', 'e', 'f'], fitness, 3,
+                        gp.SelectionMethods.PARETO, lengths=lengths) == ['c', 'd', 'e']
+
+    np.random.seed(0)
+    for _ in range(10):
+        winners = gp.double_tournament_indices(fitness, lengths, 4, 3, 1.4)
+        assert len(winners) == len(set(winners)) == 4
+    assert len(gp.double_tournament_indices(fitness, lengths, 10, 3, 1.4)) == 6
+
+    # With full parsimony pressure and a single contestant, the shorter always wins
+    winners = [gp.double_tournament_indices([0, 0], [1, 2], 1, 1, 2.0)[0] for _ in range(20)]
+    assert winners == [0] * 20
+    # With large fitness tournaments the fittest usually wins
+    gp_par = gp.GpParameters()
+    gp_par.double_tournament_size = 20
+    selected = gp.selection(['a', 'b', 'c', 'd', 'e', 'f'], fitness, 1,
+                            gp.SelectionMethods.DOUBLE_TOURNAMENT, lengths=lengths, gp_par=gp_par)
+    assert selected == ['c']
+
+    assert gp.tarpeian(fitness, lengths, 0) is fitness
+    killed = gp.tarpeian(fitness, lengths, 1.0)
+    assert killed == [1, -float('inf'), -float('inf'), 2, 1, 0]
+
+
 def test_crossover_parent_selection():
     """Test crossover_parent_selection function."""
     gp_par = gp.GpParameters()
@@ -303,6 +511,35 @@ def test_survivor_selection():
     assert survivors[1] == 7
     assert survivors[2] == 9 or survivors[2] == 6
 
+    # Elites by fitness, the rest by selection fitness
+    gp_par.f_elites = 1/3
+    gp_par.survivor_selection = gp.SelectionMethods.ELITISM
+    selection_fitness = [0, 0, 0, 0, 0, 0, 2, 1, 0, 3]
+    survivors, survivor_fitness = gp.survivor_selection(
+        population,
+        fitness,
+        crossover_offspring,
+        mutated_offspring,
+        gp_par,
+        selection_fitness=selection_fitness
+    )
+    assert survivors == [7, 9, 6]
+    assert survivor_fitness == [2, 0, 1]
+
+    # Parents fill up the population when offspring were rejected
+    gp_par.f_parents = 1/3
+    gp_par.f_elites = 0
+    gp_par.n_population = 6
+    survivors, survivor_fitness = gp.survivor_selection(
+        population,
+        fitness[:6] + [3],
+        [],
+        [6],
+        gp_par
+    )
+    assert survivors == [6, 2, 4, 1, 3, 5]
+    assert survivor_fitness == [3, 2, 2, 1, 1, 1]
+
 
 def test_selection():
     """Test selection function."""
@@ -422,6 +659,52 @@ def test_adjustable_rank_selection():
     assert max(selected_history) / min(selected_history) < 1.1
 
 
+def test_selection_indices():
+    """Test the index based selection kernels."""
+    fitness = [0, 6, 2, 6, 3, 2, 7, 1]
+    assert list(gp.elite_indices(fitness, 3)) == [6, 1, 3]
+    assert list(gp.elite_indices(fitness, 20)) == [6, 1, 3, 4, 2, 5, 7, 0]
+    # Same order as the stable sort on fitness that elite_selection used before
+    for seed in range(10):
+        random.seed(seed)
+        fitness = [random.randint(0, 3) for _ in range(20)]
+        expected = sorted(zip(fitness, range(20)), key=lambda x: x[0], reverse=True)
+        assert list(gp.elite_indices(fitness, 5)) == [i for _, i in expected[:5]]
+    fitness = [0, 6, 2, 6, 3, 2, 7, 1]
+    assert len(gp.elite_indices(fitness, 0)) == 0
+
+    for seed in range(10):
+        gp.set_seeds(seed)
+        winners = gp.tournament_indices(fitness, 3)
+        assert len(winners) == len(set(winners)) == 3
+        assert 6 in winners
+        assert 0 not in winners
+        assert -1 not in winners
+    assert len(gp.tournament_indices(fitness, 0)) == 0
+    assert sorted(gp.tournament_indices(fitness, 8)) == list(range(8))
+
+    # Dummies lose even against individuals with fitness -inf
+    minus_inf = -float('inf')
+    for seed in range(100):
+        gp.set_seeds(seed)
+        winners = gp.tournament_indices([minus_inf, 1, minus_inf, minus_inf, 0], 3)
+        assert len(set(winners)) == 3
+        assert min(winners) >= 0
+    winners = gp.tournament_selection(list('abcde'), [minus_inf] * 5, 3)
+    assert len(set(winners)) == 3
+
+    # Same draws as sorting the (fitness, index) pairs in reverse
+    fitness = [2, 1, 1, 1, 3, 1, 4, 5, 3, 0]
+    sorted_indices = [x for _, x in sorted(zip(fitness, range(len(fitness))), reverse=True)]
+    n = len(fitness)
+    p = np.linspace(2 / n - (1 / n) * (1 - 0.5), (1 / n) * (1 - 0.5), n)
+    for seed in range(10):
+        gp.set_seeds(seed)
+        expected = np.random.choice(sorted_indices, size=4, replace=False, p=p)
+        gp.set_seeds(seed)
+        assert list(gp.rank_indices(fitness, 4, 0.5)) == list(expected)
+
+
 def test_print_population():
     """Test print_population function."""
     population = list(range(8))
@@ -533,6 +816,50 @@ def test_hotstart():
     assert best_individual == best_individual2
 
 
+def test_hotstart_journal():
+    """Test hotstart from the journal without the full logs."""
+    gp_par = gp.GpParameters()
+    gp_par.behavior_lists = behavior_lists
+    gp_par.ind_start_length = 3
+    gp_par.n_population = 8
+    gp_par.f_crossover = 0.5
+    gp_par.n_offspring_crossover = 2
+    gp_par.f_mutation = 0.5
+    gp_par.n_offspring_mutation = 2
+    gp_par.f_elites = 1/8
+    gp_par.f_parents = gp_par.f_elites
+    gp_par.rerun_fitness = 1
+    gp_par.hall_of_fame_size = 3
+    gp_par.f_hall_of_fame_parents = 0.5
+    gp_par.save_interval = 2
+    gp_par.journal_compact_interval = 2
+    gp_par.plot = False
+    gp_par.verbose = False
+    gp_par.fig_best = False
+    gp_par.fig_last_gen = False
+    gp_par.log_name = 'test_journal'
+
+    gp.set_seeds(0)
+    gp_par.n_generations = 6
+    gp.run(environment, gp_par, hotstart=False)
+    for file_name in ['hash_log.txt', 'population.pickle', 'states.pickle']:
+        os.remove(logplot.get_log_folder(gp_par.log_name) + '/' + file_name)
+
+    gp_par.n_generations = 8
+    population, fitness, best_fitness, best_individual = gp.run(
+        environment, gp_par, hotstart=True)
+
+    gp_par.log_name = 'test_journal2'
+    gp.set_seeds(0)
+    population2, fitness2, best_fitness2, best_individual2 = gp.run(
+        environment, gp_par, hotstart=False)
+
+    assert population == population2
+    assert fitness == fitness2
+    assert best_fitness == best_fitness2
+    assert best_individual == best_individual2
+
+
 def test_baseline():
     """Test with baseline."""
     gp_par = gp.GpParameters()
@@ -587,6 +914,407 @@ def test_baseline():
     assert baseline not in population
 
 
+def test_run_termination():
+    """Test run function with termination criteria."""
+    gp_par = gp.GpParameters()
+    gp_par.behavior_lists = behavior_lists
+    gp_par.ind_start_length = 3
+    gp_par.n_population = 8
+    gp_par.f_crossover = 0.5
+    gp_par.n_offspring_crossover = 2
+    gp_par.f_mutation = 0.5
+    gp_par.n_offspring_mutation = 2
+    gp_par.plot = False
+    gp_par.fig_best = False
+    gp_par.n_generations = 100
+
+    gp.set_seeds(0)
+    gp_par.max_episodes = 50
+    _, _, best_fitness, _ = gp.run(environment, gp_par)
+    n_episodes = logplot.get_n_episodes(gp_par.log_name)
+    assert len(best_fitness) < gp_par.n_generations
+    assert n_episodes[-1] >= gp_par.max_episodes
+    assert n_episodes[-2] < gp_par.max_episodes
+
+    gp.set_seeds(0)
+    gp_par.max_episodes = 0
+    gp_par.stagnation_window = 3
+    _, _, best_fitness, _ = gp.run(environment, gp_par)
+    assert len(best_fitness) < gp_par.n_generations
+    assert max(best_fitness[-3:]) <= max(best_fitness[:-3])
+
+    gp.set_seeds(0)
+    gp_par.stagnation_window = 0
+    gp_par.target_fitness = -100
+    _, _, best_fitness, _ = gp.run(environment, gp_par)
+    assert len(best_fitness) == 1
+
+    gp.set_seeds(0)
+    gp_par.target_fitness = None
+    generations = []
+
+    def generation_callback(generation):
+        generations.append(generation)
+        return generation == 3
+
+    _, _, best_fitness, _ = gp.run(environment, gp_par, generation_callback=generation_callback)
+    assert generations == [1, 2, 3]
+    assert len(best_fitness) == 3
+
+
+def test_run_multi_fidelity():
+    """Test run function with a cheap screening environment."""
+    gp_par = gp.GpParameters()
+    gp_par.behavior_lists = behavior_lists
+    gp_par.ind_start_length = 3
+    gp_par.n_population = 8
+    gp_par.f_crossover = 0.5
+    gp_par.n_offspring_crossover = 2
+    gp_par.f_mutation = 0.5
+    gp_par.n_offspring_mutation = 2
+    gp_par.f_promote = 0.5
+    gp_par.plot = False
+    gp_par.fig_best = False
+    gp_par.n_generations = 5
+    gp_par.save_interval = 2
+
+    gp.set_seeds(0)
+    _, fitness, best_fitness, _ = gp.run(
+        environment, gp_par, cheap_environment=ShortestEnvironment)
+    assert len(best_fitness) == gp_par.n_generations
+    assert best_fitness[-1] == max(fitness)
+    # Rejected offspring never survive
+    assert min(fitness) > -float('inf')
+    with open(logplot.get_log_folder(gp_par.log_name) + '/fitness_log.txt',
+              encoding='utf-8') as f:
+        assert 'inf' not in f.read()
+
+    hash_table = HashTable(gp_par.hash_table_size, gp_par.log_name)
+    cheap_hash_table = HashTable(gp_par.hash_table_size, gp_par.log_name, 'cheap_hash_log')
+    gp.load_state(gp_par.log_name, hash_table, cheap_hash_table)
+    assert cheap_hash_table.n_values > 0
+    assert hash_table.n_values == logplot.get_n_episodes(gp_par.log_name)[-1]
+
+
+def test_run_bloat_control():
+    """Test run function with bloat control."""
+    gp_par = gp.GpParameters()
+    gp_par.behavior_lists = behavior_lists
+    gp_par.ind_start_length = 3
+    gp_par.n_population = 8
+    gp_par.f_crossover = 0.5
+    gp_par.n_offspring_crossover = 2
+    gp_par.f_mutation = 0.5
+    gp_par.n_offspring_mutation = 2
+    gp_par.plot = False
+    gp_par.fig_best = False
+    gp_par.n_generations = 10
+    gp_par.max_length = 10
+    gp_par.tarpeian_p = 0.3
+    gp_par.parent_selection = gp.SelectionMethods.DOUBLE_TOURNAMENT
+    gp_par.survivor_selection = gp.SelectionMethods.PARETO
+
+    gp.set_seeds(0)
+    population, fitness, _, _ = gp.run(environment, gp_par)
+    assert len(population) == len(fitness) == gp_par.n_population
+    _, max_length = logplot.get_length(gp_par.log_name)
+    assert len(max_length) == gp_par.n_generations
+    assert max(max_length[1:]) <= max(gp_par.max_length, max_length[0])
+
+
+def test_run_canonical_keys():
+    """Test run function with canonical keys."""
+    gp_par = gp.GpParameters()
+    gp_par.behavior_lists = behavior_lists
+    gp_par.ind_start_length = 4
+    gp_par.n_population = 8
+    gp_par.f_crossover = 0.5
+    gp_par.n_offspring_crossover = 2
+    gp_par.f_mutation = 0.5
+    gp_par.n_offspring_mutation = 2
+    gp_par.plot = False
+    gp_par.fig_best = False
+    gp_par.n_generations = 10
+    gp_par.canonical_keys = True
+
+    gp.set_seeds(0)
+    population, fitness, _, _ = gp.run(environment, gp_par)
+    assert len(population) == len(fitness) == gp_par.n_population
+    assert len(GenomeIndex(population, behavior_lists)) == gp_par.n_population
+
+
+class DescriptorEnvironment:
+    """Test environment that also returns a behavior descriptor."""
+
+    @staticmethod
+    def get_fitness(individual, seed=None):
+        """Return fitness and descriptor."""
+        fitness = environment.get_fitness(individual, seed)
+        return fitness, [len(individual), individual.count('s(')]
+
+
+def test_split_result():
+    """Test split_result function."""
+    assert gp.split_result(1.0) == (1.0, None)
+    fitness, descriptor = gp.split_result((1.0, [2, 3]))
+    assert fitness == 1.0
+    assert descriptor.tolist() == [2.0, 3.0]
+
+
+def test_run_novelty():
+    """Test run function with novelty search."""
+    gp_par = gp.GpParameters()
+    gp_par.behavior_lists = behavior_lists
+    gp_par.ind_start_length = 4
+    gp_par.n_population = 8
+    gp_par.f_crossover = 0.5
+    gp_par.n_offspring_crossover = 2
+    gp_par.f_mutation = 0.5
+    gp_par.n_offspring_mutation = 2
+    gp_par.f_elites = 0.25
+    gp_par.plot = False
+    gp_par.fig_best = False
+    gp_par.n_generations = 10
+    gp_par.novelty_weight = 0.5
+    gp_par.novelty_k = 3
+
+    gp.set_seeds(0)
+    population, fitness, best_fitness, _ = gp.run(DescriptorEnvironment(), gp_par)
+    assert len(population) == len(fitness) == gp_par.n_population
+    assert all(isinstance(value, float) or isinstance(value, int) for value in fitness)
+    # Elites are kept on fitness alone
+    assert best_fitness == sorted(best_fitness)
+
+
+def test_hall_of_fame_parents():
+    """Test hall_of_fame_parents function."""
+    gp_par = gp.GpParameters()
+    hall_of_fame = HallOfFame(5)
+    population = [['a'], ['b'], ['c'], ['d']]
+    assert gp.hall_of_fame_parents(population, [0, 1], None, gp_par) == (population, [0, 1])
+    gp_par.f_hall_of_fame_parents = 0.5
+    assert gp.hall_of_fame_parents(population, [0, 1], hall_of_fame, gp_par) ==\
+        (population, [0, 1])
+
+    hall_of_fame.insert(['e'], 1.0)
+    co_population, parents = gp.hall_of_fame_parents(
+        population, [0, 1, 2, 3], hall_of_fame, gp_par)
+    assert co_population == population + [['e']]
+    assert parents == [0, 1, 2, 4]
+    assert len(population) == 4
+
+
+def test_run_hall_of_fame():
+    """Test run function with a hall of fame."""
+    gp_par = gp.GpParameters()
+    gp_par.behavior_lists = behavior_lists
+    gp_par.ind_start_length = 4
+    gp_par.n_population = 8
+    gp_par.f_crossover = 0.5
+    gp_par.n_offspring_crossover = 2
+    gp_par.f_mutation = 0.5
+    gp_par.n_offspring_mutation = 2
+    gp_par.plot = False
+    gp_par.fig_best = False
+    gp_par.n_generations = 10
+    gp_par.save_interval = 5
+    gp_par.hall_of_fame_size = 5
+    gp_par.f_hall_of_fame_parents = 0.5
+
+    gp.set_seeds(0)
+    _, _, best_fitness, best_individual = gp.run(environment, gp_par)
+    hall_of_fame = HallOfFame(gp_par.hall_of_fame_size, gp_par.log_name)
+    hall_of_fame.load()
+    assert len(hall_of_fame) == gp_par.hall_of_fame_size
+    best, best_values = hall_of_fame.best(1)
+    assert best_values[0] == best_fitness[-1]
+    assert best[0] == best_individual
+
+
+def test_run_seed():
+    """Test that runs with a run seed do not depend on the number of workers."""
+    gp_par = gp.GpParameters()
+    gp_par.behavior_lists = behavior_lists
+    gp_par.ind_start_length = 4
+    gp_par.n_population = 8
+    gp_par.f_crossover = 0.5
+    gp_par.f_mutation = 0.5
+    gp_par.rerun_fitness = 1
+    gp_par.plot = False
+    gp_par.fig_best = False
+    gp_par.n_generations = 5
+    gp_par.run_seed = 1
+
+    gp.set_seeds(0)
+    result = gp.run(NoisyEnvironment(), gp_par)
+    for n_workers in [1, 3]:
+        evaluator = ProcessPoolEvaluator(SeededEnvironment(NoisyEnvironment(), 1), n_workers)
+        gp.set_seeds(0)
+        assert gp.run(NoisyEnvironment(), gp_par, evaluator=evaluator) == result
+        evaluator.close()
+
+
+def test_run_persistent_cache():
+    """Test that a run reuses the episodes of an earlier run from the shared cache."""
+    gp_par = gp.GpParameters()
+    gp_par.behavior_lists = behavior_lists
+    gp_par.ind_start_length = 4
+    gp_par.n_population = 8
+    gp_par.f_crossover = 0.5
+    gp_par.f_mutation = 0.5
+    gp_par.plot = False
+    gp_par.fig_best = False
+    gp_par.n_generations = 5
+    gp_par.run_seed = 1
+
+    gp.set_seeds(0)
+    result = gp.run(NoisyEnvironment(), gp_par)
+
+    logplot.clear_logs('test_cache')
+    gp_par.cache_path = logplot.get_log_folder('test_cache') + '/cache.db'
+    for log_name in ['test_cache1', 'test_cache2']:
+        gp_par.log_name = log_name
+        gp.set_seeds(0)
+        assert gp.run(NoisyEnvironment(), gp_par) == result
+    log_path = logplot.get_log_folder('test_cache2') + '/persistent_cache_log.txt'
+    with open(log_path, 'r', encoding='utf-8') as f:
+        report = f.read().splitlines()[-1]
+    assert 'misses: 0' in report
+    assert 'stored episodes: 0' in report
+
+
+def test_run_bounded_hash_table():
+    """Test run function with racing and a hash table that evicts entries."""
+    gp_par = gp.GpParameters()
+    gp_par.behavior_lists = behavior_lists
+    gp_par.ind_start_length = 3
+    gp_par.n_population = 8
+    gp_par.f_crossover = 0.5
+    gp_par.f_mutation = 0.5
+    gp_par.plot = False
+    gp_par.fig_best = False
+    gp_par.n_generations = 5
+    gp_par.racing = True
+    gp_par.hash_table_max_entries = 4
+    gp_par.hash_table_eviction = EvictionPolicy.LFU
+
+    gp.set_seeds(0)
+    _, fitness, best_fitness, _ = gp.run(NoisyEnvironment(), gp_par)
+    assert best_fitness[-1] == max(fitness)
+    with open(logplot.get_log_folder(gp_par.log_name) + '/hash_table_log.txt', 'r',
+              encoding='utf-8') as f:
+        reports = f.read().splitlines()
+    assert len(reports) == gp_par.n_generations
+    report = reports[-1]
+    assert int(report.split('entries: ')[1].split(',')[0]) <= 4
+    assert 'evictions: 0' not in report
+
+
+def test_operator_probabilities():
+    """Test operator_probabilities and adapted_parameters functions."""
+    gp_par = gp.GpParameters()
+    gp_par.n_population = 10
+    gp_par.f_crossover = 0.5
+    gp_par.f_mutation = 0.5
+    gp_par.mutation_p_add = 0.5
+    gp_par.mutation_p_delete = 0.5
+    gp_par.mutation_p_variable = 0.0
+    gp_par.mutation_p_replace = 0.0
+    gp_par.mutation_p_swap = 0.0
+    probabilities = gp.operator_probabilities(gp_par)
+    assert probabilities['crossover'] == 0.5
+    assert probabilities['add'] == probabilities['delete'] == 0.25
+    assert probabilities['change'] == 0.0
+
+    adaptation = OperatorAdaptation({'crossover': 0.2, 'add': 0.8})
+    generation_par = gp.adapted_parameters(gp_par, adaptation)
+    assert generation_par.f_crossover == 0.2
+    assert generation_par.f_mutation == 0.8
+    assert gp_par.f_crossover == 0.5
+
+    # Rounded to an even number of crossover parents
+    adaptation = OperatorAdaptation({'crossover': 0.3, 'add': 0.7})
+    assert gp.adapted_parameters(gp_par, adaptation).f_crossover == 0.4
+
+
+@pytest.mark.parametrize('method', [
+    AdaptationMethods.PROBABILITY_MATCHING, AdaptationMethods.ADAPTIVE_PURSUIT])
+def test_run_operator_adaptation(method):
+    """Test run function with adaptive operator probabilities."""
+    gp_par = gp.GpParameters()
+    gp_par.behavior_lists = behavior_lists
+    gp_par.ind_start_length = 4
+    gp_par.n_population = 8
+    gp_par.f_crossover = 0.5
+    gp_par.n_offspring_crossover = 2
+    gp_par.f_mutation = 0.5
+    gp_par.n_offspring_mutation = 2
+    gp_par.plot = False
+    gp_par.fig_best = False
+    gp_par.n_generations = 10
+    gp_par.operator_adaptation = method
+
+    gp.set_seeds(0)
+    population, fitness, _, _ = gp.run(environment, gp_par)
+    assert len(population) == len(fitness) == gp_par.n_population
+    probabilities = logplot.get_operators(gp_par.log_name)
+    assert len(probabilities['crossover']) == gp_par.n_generations - 1
+    assert 'replace' not in probabilities
+    for values in zip(*probabilities.values()):
+        assert sum(values) == pytest.approx(1.0)
+
+
+def test_memetic_search():
+    """Test memetic_search function."""
+    node = bl.ParameterizedNode(
+        'ab', None, [bl.NodeParameter([], 0, 100, 1, value=50)], False)
+
+    def genome(value):
+        new_node = bl.ParameterizedNode(
+            'ab', None, [bl.NodeParameter([], 0, 100, 1, value=value)], False)
+        return ['s(', 'b?', new_node, ')']
+
+    def evaluate(genomes):
+        return [-abs(x[2].parameters[0].value - 30) for x in genomes]
+
+    gp_par = gp.GpParameters()
+    gp_par.memetic_elites = 1
+    gp_par.memetic_iterations = 5
+    gp_par.memetic_step = 0.1
+    population = [genome(50), ['s(', 'b?', node, 'ab!', ')'], genome(40)]
+    fitness = [-20, -100, -10]
+    new_population, new_fitness = gp.memetic_search(population, fitness, gp_par, evaluate)
+    assert new_population[2] == genome(30)
+    assert new_fitness == [-20, -100, 0]
+    assert population[2] == genome(40)
+
+    # Not replaced by an individual that is already in the population
+    population = [genome(30), genome(40)]
+    new_population, new_fitness = gp.memetic_search(population, [-100, -10], gp_par, evaluate)
+    assert new_population == population
+    assert new_fitness == [-100, -10]
+
+
+def test_run_racing():
+    """Test run function with racing."""
+    gp_par = gp.GpParameters()
+    gp_par.behavior_lists = behavior_lists
+    gp_par.ind_start_length = 3
+    gp_par.n_population = 8
+    gp_par.f_crossover = 0.5
+    gp_par.n_offspring_crossover = 2
+    gp_par.f_mutation = 0.5
+    gp_par.n_offspring_mutation = 2
+    gp_par.plot = False
+    gp_par.fig_best = False
+    gp_par.n_generations = 10
+    gp_par.racing = True
+
+    gp.set_seeds(0)
+    _, fitness, best_fitness, _ = gp.run(environment, gp_par)
+    assert best_fitness[-1] == max(fitness)
+
+
 def test_plots():
     """Test plot functionality."""
     gp_par = gp.GpParameters()
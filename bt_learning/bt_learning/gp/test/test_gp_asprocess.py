@@ -0,0 +1,111 @@
+"""Unit test for gp_asprocess.py module."""
+
+# Copyright (c) 2022, ABB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with
+# or without modification, are permitted provided that
+# the following conditions are met:
+#
+#   * Redistributions of source code must retain the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer.
+#   * Redistributions in binary form must reproduce the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer in the documentation
+#     and/or other materials provided with the
+#     distribution.
+#   * Neither the name of ABB nor the names of its
+#     contributors may be used to endorse or promote
+#     products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import time
+
+import pytest
+import yaml
+
+from behaviors import behavior_list_test_settings
+from behaviors import behavior_lists as bl
+import bt_learning.gp.genetic_programming as gp
+from bt_learning.gp import logplot
+from bt_learning.gp.evaluators import SeededEnvironment
+
+from .test_evaluators import StubApplication, StubEnvironment
+
+agx_application = pytest.importorskip('simulation.algoryx.agx_application')
+gp_asprocess = pytest.importorskip('simulation.algoryx.gp.gp_asprocess')
+
+behavior_lists = bl.BehaviorLists(
+    condition_nodes=behavior_list_test_settings.get_condition_nodes(),
+    action_nodes=behavior_list_test_settings.get_action_nodes())
+
+
+def test_gp_process(tmp_path):
+    """Test starting and stopping the GP process and reading its results."""
+    with open(tmp_path / 'sim_data.yaml', 'w', encoding='utf-8') as f:
+        yaml.safe_dump({'demonstration': {'reference_frames': {}}}, f)
+    with open(tmp_path / 'sim_objects.yaml', 'w', encoding='utf-8') as f:
+        yaml.safe_dump({}, f)
+
+    gp_par = gp.GpParameters()
+    gp_par.behavior_lists = behavior_lists
+    gp_par.ind_start_length = 3
+    gp_par.n_population = 8
+    gp_par.f_crossover = 0.5
+    gp_par.n_offspring_crossover = 2
+    gp_par.f_mutation = 0.5
+    gp_par.n_offspring_mutation = 2
+    gp_par.plot = False
+    gp_par.fig_best = False
+    gp_par.n_generations = 10000
+    gp_par.log_name = 'gp_asprocess'
+    gp_par.run_seed = 1
+
+    for n_workers in [1, 2]:
+        logplot.clear_logs(gp_par.log_name)
+        process = gp_asprocess.GPProcess(
+            str(tmp_path),
+            StubEnvironment(),
+            gp_par,
+            n_workers=n_workers,
+            args=(agx_application.CloudpickleWrapper(StubApplication), ['-a'])
+        )
+        process.start()
+        start_time = time.time()
+        while process.get_current() < 3 and time.time() - start_time < 60:
+            time.sleep(0.1)
+        process.stop()
+
+        assert process.exitcode == 0
+        generation = process.get_current()
+        assert 3 <= generation < gp_par.n_generations - 1
+        best_fitness = logplot.get_best_fitness(gp_par.log_name)
+        assert generation <= len(best_fitness) <= generation + 1
+        best_individual = logplot.get_best_individual(gp_par.log_name)
+        assert best_individual in logplot.get_last_population(gp_par.log_name)
+
+
+def test_make_environment():
+    """Test that the environments of the workers are seeded if the run is."""
+    wrapper = agx_application.CloudpickleWrapper(StubApplication)
+    environment = gp_asprocess.make_environment(StubEnvironment(), wrapper, ['-a'], {}, 1)
+    assert isinstance(environment, SeededEnvironment)
+    assert environment.run_seed == 1
+    assert environment.app.is_up
+
+    environment = gp_asprocess.make_environment(StubEnvironment(), wrapper, ['-a'], {})
+    assert isinstance(environment, StubEnvironment)
+    assert environment.app.is_up
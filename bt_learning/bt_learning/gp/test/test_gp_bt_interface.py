@@ -85,6 +85,56 @@ def test_mutate_gene():
     assert mutated_genome == []
 
 
+def test_grammar_genome():
+    """Test grammar_genome function."""
+    other_lists = bl.BehaviorLists(
+        condition_nodes=['c?', 'd?'],
+        action_nodes=['a!', 'b!'],
+        atomic_fallback_nodes=['af!'],
+        atomic_sequence_nodes=['as!'])
+    for lists in [behavior_lists, other_lists]:
+        for i in range(200):
+            depth = i % 4 + 1
+            length = i % 9 + 1
+            genome = gp_bt_interface.grammar_genome(depth, length, 0.5, lists, full=i % 2 == 0)
+            bt = behavior_tree.BT(genome, lists)
+            assert bt.is_valid()
+            assert bt.depth() <= depth
+            assert bt.length() == length
+
+    assert gp_bt_interface.grammar_genome(0, 5, 0.5, behavior_lists)[0].condition is False
+    genome = gp_bt_interface.grammar_genome(3, 5, 0.5, behavior_lists, full=True)
+    assert behavior_tree.BT(genome, behavior_lists).depth() > 1
+
+
+def test_size_limits():
+    """Test size and depth limits of mutate_gene and crossover_genome."""
+    ab = bl.ParameterizedNode('ab', [], False)
+    ac = bl.ParameterizedNode('ac', [], False)
+    genome = ['s(', ab, ac, ')']
+    bt = behavior_tree.BT(genome, behavior_lists)
+    assert gp_bt_interface.within_limits(bt)
+    assert gp_bt_interface.within_limits(bt, 4, 1)
+    assert not gp_bt_interface.within_limits(bt, 3, 0)
+    assert not gp_bt_interface.within_limits(bt, 0, 0.5)
+
+    for i in range(10):
+        random.seed(i)
+        mutated_genome = gp_bt_interface.mutate_gene(
+            genome, 1, 0, 0, 0, 0, 0.5, behavior_lists, max_length=5, max_depth=1)
+        assert mutated_genome == [] or len(mutated_genome) == 5
+
+        genome1 = gp_bt_interface.random_genome(10, 0.5, behavior_lists)
+        genome2 = gp_bt_interface.random_genome(10, 0.5, behavior_lists)
+        max_length = max(len(genome1), len(genome2))
+        offspring1, offspring2 = gp_bt_interface.crossover_genome(
+            None, None, genome1, genome2, behavior_lists, max_length=max_length, max_depth=2)
+        for offspring in [offspring1, offspring2]:
+            bt.set(offspring)
+            assert len(offspring) <= max_length
+            assert bt.depth() <= 2
+
+
 def test_crossover_genome():
     """Test crossover_genome function."""
     b = bl.ParameterizedNode('b', [], True)
@@ -37,7 +37,10 @@ from behaviors import behavior_list_test_settings
 from behaviors import behavior_lists as bl
 import bt_learning.gp.genetic_programming as gp
 from bt_learning.gp.gp_instance import GPInstance
+from bt_learning.gp import logplot
+from bt_learning.gp.operator_adaptation import AdaptationMethods
 
+from .test_evaluators import NoisyEnvironment
 from .test_gp_parallel import TestEnvironment
 
 
@@ -146,6 +149,124 @@ def test_run_large():
     assert fitness2 == fitness3
 
 
+def test_termination():
+    """Test that the instance stops stepping when the fitness stagnates."""
+    gp_par = gp.GpParameters()
+    gp_par.behavior_lists = behavior_lists
+    gp_par.ind_start_length = 3
+    gp_par.n_population = 8
+    gp_par.f_crossover = 0.5
+    gp_par.n_offspring_crossover = 2
+    gp_par.f_mutation = 0.5
+    gp_par.n_offspring_mutation = 2
+    gp_par.plot = False
+    gp_par.fig_best = False
+    gp_par.n_generations = 100
+    gp_par.stagnation_window = 3
+
+    gp.set_seeds(0)
+    gp_instance = GPInstance('1', TestEnvironment(), 2, BATCH_SIZE, gp_par)
+    while gp_instance.is_runnable():
+        gp_instance.step_gp()
+    assert gp_instance.num_gen < gp_par.n_generations
+    best_fitness = gp_instance.best_fitness
+    assert max(best_fitness[-3:]) <= max(best_fitness[:-3])
+
+
+def test_racing():
+    """Test that racing adds episodes without breaking the instance."""
+    gp_par = gp.GpParameters()
+    gp_par.behavior_lists = behavior_lists
+    gp_par.ind_start_length = 3
+    gp_par.n_population = 8
+    gp_par.f_crossover = 0.5
+    gp_par.n_offspring_crossover = 2
+    gp_par.f_mutation = 0.5
+    gp_par.n_offspring_mutation = 2
+    gp_par.plot = False
+    gp_par.fig_best = False
+    gp_par.n_generations = 5
+    gp_par.racing = True
+
+    gp.set_seeds(0)
+    gp_instance = GPInstance('1', TestEnvironment(), 2, BATCH_SIZE, gp_par)
+    while gp_instance.is_runnable():
+        gp_instance.step_gp()
+    assert len(gp_instance.fitness) == gp_par.n_population
+    assert gp_instance.best_fitness[-1] == max(gp_instance.fitness)
+
+
+def test_operator_adaptation():
+    """Test that operator probabilities are adapted and logged by the instance."""
+    gp_par = gp.GpParameters()
+    gp_par.behavior_lists = behavior_lists
+    gp_par.ind_start_length = 3
+    gp_par.n_population = 8
+    gp_par.f_crossover = 0.5
+    gp_par.n_offspring_crossover = 2
+    gp_par.f_mutation = 0.5
+    gp_par.n_offspring_mutation = 2
+    gp_par.plot = False
+    gp_par.fig_best = False
+    gp_par.n_generations = 5
+    gp_par.operator_adaptation = AdaptationMethods.ADAPTIVE_PURSUIT
+
+    gp.set_seeds(0)
+    gp_instance = GPInstance('1', TestEnvironment(), 2, BATCH_SIZE, gp_par)
+    while gp_instance.is_runnable():
+        gp_instance.step_gp()
+    assert len(gp_instance.fitness) == gp_par.n_population
+    assert len(logplot.get_operators(gp_instance.my_path)['crossover']) == gp_instance.num_gen
+
+
+def test_hall_of_fame_migrants():
+    """Test that migrants can be taken from the hall of fame."""
+    gp_par = gp.GpParameters()
+    gp_par.behavior_lists = behavior_lists
+    gp_par.ind_start_length = 3
+    gp_par.n_population = 8
+    gp_par.f_crossover = 0.5
+    gp_par.f_mutation = 0.5
+    gp_par.plot = False
+    gp_par.fig_best = False
+    gp_par.n_generations = 5
+    gp_par.hall_of_fame_size = 20
+    gp_par.f_hall_of_fame_parents = 0.5
+
+    gp.set_seeds(0)
+    gp_instance = GPInstance('1', TestEnvironment(), 2, BATCH_SIZE, gp_par)
+    while gp_instance.is_runnable():
+        gp_instance.step_gp()
+    assert len(gp_instance.hall_of_fame) == gp_par.hall_of_fame_size
+    migrants, migrant_fitness = gp_instance.get_migrants(3, from_hall_of_fame=True)
+    assert (migrants, migrant_fitness) == gp_instance.hall_of_fame.best(3)
+    assert migrant_fitness[0] == max(gp_instance.best_fitness)
+
+
+def test_run_seed():
+    """Test that an instance with a run seed does not depend on the number of cores."""
+    gp_par = gp.GpParameters()
+    gp_par.behavior_lists = behavior_lists
+    gp_par.ind_start_length = 3
+    gp_par.n_population = 8
+    gp_par.f_crossover = 0.5
+    gp_par.f_mutation = 0.5
+    gp_par.rerun_fitness = 1
+    gp_par.plot = False
+    gp_par.fig_best = False
+    gp_par.n_generations = 4
+    gp_par.run_seed = 1
+
+    results = []
+    for num_core, batch_size in [(1, BATCH_SIZE), (2, 1)]:
+        gp.set_seeds(0)
+        gp_instance = GPInstance('1', NoisyEnvironment(), num_core, batch_size, gp_par)
+        while gp_instance.is_runnable():
+            gp_instance.step_gp()
+        results.append((gp_instance.population, gp_instance.fitness, gp_instance.best_fitness))
+    assert results[0] == results[1]
+
+
 def test_exchange():
     """
     Test exchanging migrants function.
@@ -365,6 +486,8 @@ def test_hotstart():
     gp_instance2 = GPInstance('1', t_environment, 2, BATCH_SIZE, gp_par, hotstart=True)
     assert gp_instance.population == gp_instance2.population
     assert gp_instance.fitness == gp_instance2.fitness
+    # The population is found in the loaded hash table instead of evaluated again
+    assert gp_instance2.hash_table.n_values == gp_instance.hash_table.n_values
     assert gp_instance.num_gen == gp_instance2.num_gen
     assert gp_instance.my_path == gp_instance2.my_path
     assert gp_instance.best_fitness == gp_instance2.best_fitness
@@ -38,6 +38,7 @@ from behaviors import behavior_lists as bl
 import bt_learning.gp.genetic_programming as gp
 import bt_learning.gp.gp_parallel as gpp
 from bt_learning.gp.hash_table import HashTable
+from bt_learning.gp.in_flight import InFlightRegistry
 
 from . import environment_strings as environment
 
@@ -92,3 +93,54 @@ def test_get_fitness():
     randomized_testing(100)
     randomized_testing(500)
     randomized_testing(1000)
+
+
+def test_evaluate_episodes():
+    """Test evaluate_episodes function."""
+    t_environment = TestEnvironment()
+    individuals = [[], ['b?']] * 5
+    episodes = list(range(len(individuals)))
+    target_fitness = [0, 0.9] * 5
+    assert gpp.evaluate_episodes(individuals, episodes, t_environment, 2) == target_fitness
+    assert gpp.evaluate_episodes(
+        individuals, episodes, t_environment, 2, batch_size=2) == target_fitness
+
+
+class CountingEnvironment(TestEnvironment):
+    """Environment that counts the episodes it runs."""
+
+    def __init__(self):
+        self.n_episodes = 0
+
+    def get_fitness(self, individual, _seed=None):
+        """ Count the episode"""
+        self.n_episodes += 1
+        return super().get_fitness(individual, _seed)
+
+
+def test_evaluate_duplicates():
+    """Test that identical individuals are evaluated once."""
+    t_environment = CountingEnvironment()
+    hash_table = HashTable()
+    fitness = gpp.evaluate([['b?'], [], ['b?'], ['b?']], hash_table, t_environment, 1, 2, 1)
+    assert fitness == [0.9, 0, 0.9, 0.9]
+    assert t_environment.n_episodes == 4
+    assert hash_table.find(['b?']) == [0.9]
+
+
+def test_evaluate_in_flight():
+    """Test that individuals evaluated by another process are not evaluated again."""
+    t_environment = CountingEnvironment()
+    hash_table = HashTable()
+    in_flight = InFlightRegistry(timeout=1.0)
+    in_flight.claim([hash_table.key(['b?']), hash_table.key(['a!'])])
+    in_flight.post({hash_table.key(['b?']): 0.5})
+    fitness = gpp.evaluate([['b?'], [], ['b?'], ['a!']], hash_table, t_environment, 0, 1, 1,
+                           in_flight=in_flight)
+    assert fitness[:3] == [0.5, 0, 0.5]
+    assert t_environment.n_episodes == 2
+    # Received fitness is stored but not counted as episodes of this process
+    assert hash_table.find(['b?']) == [0.5]
+    assert (hash_table.n_values, hash_table.n_received) == (2, 1)
+    assert in_flight.wait([hash_table.key([])]) == [0]
+    in_flight.shutdown()
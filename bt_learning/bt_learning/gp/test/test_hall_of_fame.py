@@ -0,0 +1,138 @@
+"""Unit test for hall_of_fame.py module."""
+
+# Copyright (c) 2022, ABB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with
+# or without modification, are permitted provided that
+# the following conditions are met:
+#
+#   * Redistributions of source code must retain the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer.
+#   * Redistributions in binary form must reproduce the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer in the documentation
+#     and/or other materials provided with the
+#     distribution.
+#   * Neither the name of ABB nor the names of its
+#     contributors may be used to endorse or promote
+#     products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from behaviors import behavior_list_test_settings
+from behaviors import behavior_lists as bl
+from bt_learning.gp import logplot
+from bt_learning.gp.hall_of_fame import HallOfFame
+from bt_learning.gp.hash_table import HashTable
+
+
+behavior_lists = bl.BehaviorLists(
+    condition_nodes=behavior_list_test_settings.get_condition_nodes(),
+    action_nodes=behavior_list_test_settings.get_action_nodes())
+
+
+def test_insert():
+    """Test that the archive keeps the best individuals."""
+    hall_of_fame = HallOfFame(3, 'test_hall_of_fame')
+    assert hall_of_fame.worst() is None
+    assert hall_of_fame.insert(['a'], 1.0)
+    assert hall_of_fame.insert(['b'], 3.0)
+    assert hall_of_fame.insert(['c'], 2.0)
+    assert len(hall_of_fame) == 3
+    assert hall_of_fame.worst() == 1.0
+
+    assert not hall_of_fame.insert(['d'], 0.5)
+    assert not hall_of_fame.insert(['d'], 1.0)
+    assert ['d'] not in hall_of_fame
+    assert hall_of_fame.insert(['d'], 4.0)
+    assert ['a'] not in hall_of_fame
+    assert hall_of_fame.find(['a']) is None
+    assert hall_of_fame.find(['d']) == 4.0
+    assert hall_of_fame.best(2) == ([['d'], ['b']], [4.0, 3.0])
+
+    # Reinserted individuals get their new fitness
+    assert not hall_of_fame.insert(['c'], 2.0)
+    assert hall_of_fame.insert(['c'], 5.0)
+    assert hall_of_fame.worst() == 3.0
+    assert hall_of_fame.insert(['b'], 0.0)
+    assert hall_of_fame.worst() == 0.0
+    assert hall_of_fame.best(5) == ([['c'], ['d'], ['b']], [5.0, 4.0, 0.0])
+
+    for i in range(20):
+        hall_of_fame.insert(['c'], float(i))
+    assert len(hall_of_fame.heap) <= 2 * hall_of_fame.size
+    assert len(hall_of_fame) == 3
+    assert sorted(hall_of_fame.sample(5)) == [['b'], ['c'], ['d']]
+    assert len(hall_of_fame.sample(2)) == 2
+
+    assert not HallOfFame(0).insert(['a'], 1.0)
+
+
+def test_canonical_keys():
+    """Test that equivalent genomes share an entry."""
+    ab = behavior_list_test_settings.get_action_nodes()[0]
+    hall_of_fame = HallOfFame(3, behavior_lists=behavior_lists)
+    hall_of_fame.insert(['s(', ab, ')'], 1.0)
+    assert [ab] in hall_of_fame
+    hall_of_fame.insert([ab], 2.0)
+    assert len(hall_of_fame) == 1
+    assert hall_of_fame.find(['s(', ab, ')']) == 2.0
+
+    # The digests of a hash table are reused
+    hash_table = HashTable(behavior_lists=behavior_lists)
+    hall_of_fame = HallOfFame(3, hash_table=hash_table)
+    hall_of_fame.insert(['s(', ab, ')'], 1.0)
+    assert hash_table.digests
+    assert hall_of_fame.find([ab]) == 1.0
+    assert hall_of_fame.key([ab]) == hash_table.key([ab])
+
+
+def test_save_load():
+    """Test that the archive is saved incrementally and rebuilt on load."""
+    log_name = 'test_hall_of_fame'
+    logplot.clear_logs(log_name)
+    hall_of_fame1 = HallOfFame(2, log_name)
+    hall_of_fame1.update([['a'], ['b']], [1.0, 2.0])
+    hall_of_fame1.save()
+    hall_of_fame1.update([['c'], ['a']], [3.0, 0.0])
+    assert len(hall_of_fame1.unsaved) == 1
+    hall_of_fame1.save()
+    hall_of_fame1.save()
+
+    hall_of_fame2 = HallOfFame(2, log_name)
+    hall_of_fame2.load()
+    assert hall_of_fame2.best(2) == hall_of_fame1.best(2) == ([['c'], ['b']], [3.0, 2.0])
+
+    # A new archive starts a new file and a loaded one appends to it
+    hall_of_fame2.insert(['d'], 4.0)
+    hall_of_fame2.save()
+    hall_of_fame3 = HallOfFame(2, log_name)
+    hall_of_fame3.load()
+    assert hall_of_fame3.best(2) == ([['d'], ['c']], [4.0, 3.0])
+    HallOfFame(2, log_name).save()
+    hall_of_fame3 = HallOfFame(2, log_name)
+    hall_of_fame3.load()
+    assert len(hall_of_fame3) == 0
+
+    # The file is rewritten before it holds more than twice size records
+    for i in range(20):
+        hall_of_fame3.insert(['a'], float(i))
+        hall_of_fame3.insert([str(i)], float(i))
+        hall_of_fame3.save()
+        assert hall_of_fame3.n_saved <= 2 * hall_of_fame3.size
+    hall_of_fame4 = HallOfFame(2, log_name)
+    hall_of_fame4.load()
+    assert hall_of_fame4.n_saved <= 2 * hall_of_fame4.size
+    assert hall_of_fame4.best(2) == hall_of_fame3.best(2) == ([['a'], ['19']], [19.0, 19.0])
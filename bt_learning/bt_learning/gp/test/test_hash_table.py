@@ -31,7 +31,13 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
 # THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-from bt_learning.gp import hash_table
+from copy import deepcopy
+
+import numpy as np
+import pytest
+
+from behaviors import behavior_lists as bl
+from bt_learning.gp import hash_table, logplot
 
 
 def test_hash_table_save_load():
@@ -78,10 +84,6 @@ def test_node_eq():
     assert node1 != node3
     assert node1 != ['a']
     assert node1 != 1
-    node1.next = node3
-    assert node1 != node2
-    node2.next = node3
-    assert node1 == node2
 
 
 def test_multiple_entries():
@@ -102,3 +104,183 @@ def test_to_string():
     assert hash_table.to_string(['a', 'b']) == 'a, b'
 
     assert hash_table.to_string(0) == '0'
+
+
+def test_genome_index():
+    """Test the GenomeIndex class."""
+    b = bl.ParameterizedNode('b', None, [], True)
+    ab = bl.ParameterizedNode('ab', None, [], False)
+    genome_index = hash_table.GenomeIndex([['s(', b, ab, ')'], [ab]])
+    assert len(genome_index) == 2
+    assert ['s(', b, ab, ')'] in genome_index
+    assert [ab] in genome_index
+    assert [b] not in genome_index
+    # Same string representation but not identical genomes
+    assert ['ab!'] not in genome_index
+
+    genome_index.add([ab])
+    assert len(genome_index) == 2
+    genome_index.add(['ab!'])
+    assert len(genome_index) == 3
+    assert ['ab!'] in genome_index
+
+    assert hash_table.genome_digest([ab]) == hash_table.genome_digest(['ab!'])
+    assert hash_table.genome_digest([ab]) != hash_table.genome_digest([b])
+
+
+def test_canonical_keys():
+    """Test hash table and genome index keyed on canonical genomes."""
+    behavior_lists = bl.BehaviorLists(
+        condition_nodes=['b?', 'c?'], action_nodes=['ab!', 'ac!'])
+    table = hash_table.HashTable(size=10, behavior_lists=behavior_lists)
+    table.insert(['s(', 'c?', 'b?', 'ab!', ')'], 1.0)
+    assert table.find(['s(', 'b?', 'c?', 'ab!', ')']) == [1.0]
+    assert table.find(['f(', 's(', 'b?', 'c?', 'ab!', ')', ')']) == [1.0]
+    assert table.find(['s(', 'b?', 'ab!', 'c?', ')']) is None
+    assert hash_table.HashTable(size=10).find(['s(', 'b?', 'c?', 'ab!', ')']) is None
+
+    genome_index = hash_table.GenomeIndex(
+        [['s(', 'ab!', 's(', 'ac!', ')', ')']], behavior_lists=behavior_lists)
+    assert ['s(', 'ab!', 'ac!', ')'] in genome_index
+    assert ['s(', 'ac!', 'ab!', ')'] not in genome_index
+    assert ['s(', 'ab!', 'ac!', ')'] not in hash_table.GenomeIndex(
+        [['s(', 'ab!', 's(', 'ac!', ')', ')']])
+
+
+def test_changes():
+    """Test that the hash table only records changes after track_changes."""
+    hash_table1 = hash_table.HashTable(size=10)
+    hash_table1.insert(['a'], 1.0)
+    key_a = hash_table1.key(['a'])
+    assert hash_table1.entries() == {key_a: (['a'], [1.0])}
+    hash_table1.track_changes()
+    hash_table1.insert(['a'], 2.0)
+    hash_table1.insert(['b'], 3.0)
+    key_b = hash_table1.key(['b'])
+    assert hash_table1.pop_changes() == {key_a: (['a'], [2.0]), key_b: (['b'], [3.0])}
+    assert hash_table1.pop_changes() == {}
+    assert hash_table1.entries() == {key_a: (['a'], [1.0, 2.0]), key_b: (['b'], [3.0])}
+
+    hash_table2 = hash_table.HashTable(size=10)
+    hash_table2.add_entries(hash_table1.entries())
+    assert hash_table2 == hash_table1
+    assert hash_table2.n_values == 3
+
+
+def test_key():
+    """Test that digests are remembered for genomes."""
+    behavior_lists = bl.BehaviorLists(
+        condition_nodes=['b?', 'c?'], action_nodes=['ab!', 'ac!'])
+    table = hash_table.HashTable(size=2, behavior_lists=behavior_lists)
+    genome = ['s(', 'c?', 'b?', 'ab!', ')']
+    assert table.key(genome) == table.key(list(genome))
+    assert len(table.digests) == 1
+    assert table.key(genome) == table.key(['s(', 'b?', 'c?', 'ab!', ')'])
+    assert len(table.digests) == 2
+    assert table.key(genome) == table.key(['s(', 'b?', 'c?', 'ab!', ')'])
+    assert len(table.digests) == 2
+    assert table.key(genome) != table.key(['s(', 'b?', 'ab!', ')'])
+
+    table.insert(genome, 1.0)
+    assert table.digests[hash_table.genome_content(genome)] ==\
+        table.key(['s(', 'b?', 'c?', 'ab!', ')'])
+    assert table.find(['s(', 'b?', 'c?', 'ab!', ')']) == [1.0]
+    assert table.table[table.key(genome)].key == hash_table.canonical_genome(
+        genome, behavior_lists)
+
+    # Genomes modified in place get the digest of their new content
+    genome[1] = 'ac!'
+    assert table.find(genome) is None
+    assert table.key(genome) == table.key(['s(', 'ac!', 'b?', 'ab!', ')'])
+
+    # So do parameterized nodes whose parameters are modified in place
+    node = bl.ParameterizedNode(
+        'pick', parameters=[bl.NodeParameter(['a', 'b'], value='a')], condition=False)
+    genome = ['s(', node, ')']
+    key = table.key(genome)
+    node.parameters[0].value = 'b'
+    assert table.key(genome) != key
+    assert table.key(genome) == table.key(['s(', deepcopy(node), ')'])
+
+
+def test_snapshot():
+    """Test that snapshots restore genome keys and text tables restore digests."""
+    log_name = 'test_hash_table'
+    logplot.clear_logs(log_name)
+    genome = ['s(', bl.ParameterizedNode('b', parameters=[bl.NodeParameter(value=1)]), 'ab!', ')']
+    hash_table1 = hash_table.HashTable(size=10, log_name=log_name)
+    hash_table1.insert(genome, 1.0)
+    hash_table1.insert(genome, 2.5)
+    hash_table1.insert(['a'], 3.0)
+    hash_table1.write_table()
+    hash_table1.export_text()
+
+    hash_table2 = hash_table.HashTable(size=10, log_name=log_name)
+    hash_table2.load()
+    assert hash_table2 == hash_table1
+    assert hash_table2.n_values == 3
+    assert hash_table2.find(list(genome)) == [1.0, 2.5]
+    assert hash_table2.table[hash_table2.key(genome)].key == genome
+
+    hash_table3 = hash_table.HashTable(size=10, log_name=log_name)
+    hash_table3.load_text()
+    assert hash_table3 == hash_table1
+    assert hash_table3.find(list(genome)) == [1.0, 2.5]
+    assert hash_table.to_string('s(') == 's('
+
+    with open(hash_table1.path('.npz'), 'wb') as f:
+        np.savez(f, version=np.array(hash_table.SNAPSHOT_VERSION + 1))
+    with pytest.raises(ValueError):
+        hash_table.HashTable(size=10, log_name=log_name).load()
+
+
+def test_eviction():
+    """Test that a full hash table evicts entries by its policy."""
+    policies = [
+        (hash_table.EvictionPolicy.LRU, [[], [], ['a']]),
+        (hash_table.EvictionPolicy.LFU, [['a'], ['a'], ['c']]),
+        (hash_table.EvictionPolicy.FITNESS, [[], [], []])
+    ]
+    for policy, lookups in policies:
+        table = hash_table.HashTable(size=10, max_entries=3, eviction=policy)
+        table.insert(['a'], 3.0)
+        table.insert(['b'], 1.0)
+        table.insert(['c'], 2.0)
+        for key in lookups:
+            if key:
+                assert table.find(key) is not None
+        table.insert(['d'], 0.0)
+        assert table.n_evictions == 2
+        assert table.find(['a']) == [3.0]
+        assert table.find(['d']) == [0.0]
+        assert table.find(['b']) is None
+        assert table.find(['c']) is None
+        assert table.n_values == 4
+
+    assert (table.n_hits, table.n_misses) == (2, 2)
+    assert table.resident_bytes ==\
+        sum(node.n_bytes for node in table.table.values()) + table.memo_bytes
+
+
+def test_max_bytes():
+    """Test that the estimated bytes of the hash table stay within max_bytes."""
+    genomes = [
+        ['s(', bl.ParameterizedNode('b', parameters=[bl.NodeParameter(value=i)]), 'ab!', ')']
+        for i in range(10)
+    ]
+    table = hash_table.HashTable(size=10)
+    table.insert(genomes[0], 1.0)
+    assert table.resident_bytes > hash_table.deep_size(genomes[0])
+    table.insert(genomes[0], 2.0)
+    # Remembered digests and gene sizes are counted but forgotten before evicting entries
+    assert table.memo_bytes > 0
+    entry_bytes = table.resident_bytes - table.memo_bytes
+
+    table = hash_table.HashTable(size=10, max_bytes=int(2.5 * entry_bytes))
+    for genome in genomes:
+        table.insert(genome, 1.0)
+        table.insert(genome, 2.0)
+        assert table.resident_bytes <= 2.5 * entry_bytes
+    assert len(table.table) == 2
+    assert table.n_evictions == 8
+    assert table.find(genomes[-1]) == [1.0, 2.0]
@@ -0,0 +1,73 @@
+"""Unit test for in_flight.py module."""
+
+# Copyright (c) 2022, ABB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with
+# or without modification, are permitted provided that
+# the following conditions are met:
+#
+#   * Redistributions of source code must retain the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer.
+#   * Redistributions in binary form must reproduce the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer in the documentation
+#     and/or other materials provided with the
+#     distribution.
+#   * Neither the name of ABB nor the names of its
+#     contributors may be used to endorse or promote
+#     products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from concurrent.futures import ProcessPoolExecutor
+import pickle
+import time
+
+from bt_learning.gp.in_flight import InFlightRegistry
+
+
+def wait_for(registry: InFlightRegistry, digests: list) -> list:
+    """Wait for the fitness of digests from another process."""
+    return registry.wait(digests)
+
+
+def test_claim_post():
+    """Test that a digest is claimed by one process and its fitness reaches the others."""
+    registry = InFlightRegistry()
+    assert registry.claim([b'a', b'b']) == [True, True]
+    assert registry.claim([b'a', b'c']) == [False, True]
+    with ProcessPoolExecutor(1) as executor:
+        waiter = executor.submit(wait_for, registry, [b'a', b'b'])
+        time.sleep(0.2)
+        assert not waiter.done()
+        registry.post({b'a': 1.0})
+        registry.release([b'b'])
+        assert waiter.result() == [1.0, None]
+    assert registry.claim([b'a', b'b']) == [False, True]
+    assert registry.wait([b'a']) == [1.0]
+    assert pickle.loads(pickle.dumps(registry)).manager is None
+    registry.shutdown()
+
+
+def test_limits():
+    """Test the timeout and the size of the registry."""
+    registry = InFlightRegistry(size=2, timeout=0.1)
+    assert registry.claim([b'a']) == [True]
+    assert registry.wait([b'a']) == [None]
+    registry.post({b'a': 1.0, b'b': 2.0})
+    assert registry.wait([b'a', b'b']) == [1.0, 2.0]
+    registry.post({b'c': 3.0})
+    assert registry.wait([b'a', b'c']) == [None, 3.0]
+    registry.shutdown()
@@ -0,0 +1,93 @@
+"""Unit test for journal.py module."""
+
+# Copyright (c) 2022, ABB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with
+# or without modification, are permitted provided that
+# the following conditions are met:
+#
+#   * Redistributions of source code must retain the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer.
+#   * Redistributions in binary form must reproduce the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer in the documentation
+#     and/or other materials provided with the
+#     distribution.
+#   * Neither the name of ABB nor the names of its
+#     contributors may be used to endorse or promote
+#     products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import random
+
+from bt_learning.gp import logplot
+from bt_learning.gp.hash_table import HashTable
+from bt_learning.gp.journal import Journal
+import numpy as np
+
+
+def test_replay():
+    """Test that replay rebuilds the state of the last checkpoint."""
+    log_name = 'test_journal'
+    logplot.clear_logs(log_name)
+    hash_table = HashTable(size=10)
+    journal = Journal(log_name, compact_interval=3)
+    assert not journal.exists()
+
+    best_fitness = []
+    n_episodes = []
+    for generation in range(5):
+        hash_table.insert([str(generation)], float(generation))
+        hash_table.insert(['0'], 10.0 + generation)
+        best_fitness.append(float(generation))
+        n_episodes.append(hash_table.n_values)
+        journal.checkpoint([[str(generation)]], best_fitness, n_episodes, generation, [hash_table])
+        assert journal.n_records == generation % 3 + 1
+    # Compaction replaces the journal by a complete new file
+    assert not os.path.exists(journal.path() + '.tmp')
+    random_state = random.getstate()
+    np_random_state = np.random.get_state()
+    random.random()
+    np.random.rand()
+
+    hash_table2 = HashTable(size=10)
+    journal2 = Journal(log_name, compact_interval=3)
+    assert journal2.exists()
+    population, best_fitness2, n_episodes2, random_state2, np_random_state2, generation = \
+        journal2.replay([hash_table2])
+    assert population == [['4']]
+    assert best_fitness2 == best_fitness
+    assert n_episodes2 == n_episodes
+    assert random_state2 == random_state
+    assert np.array_equal(np_random_state2[1], np_random_state[1])
+    assert generation == 4
+    assert hash_table2 == hash_table
+    assert hash_table2.find(['0']) == [0.0, 10.0, 11.0, 12.0, 13.0, 14.0]
+    assert journal2.n_records == 2
+
+    hash_table2.insert(['5'], 5.0)
+    best_fitness2.append(5.0)
+    n_episodes2.append(hash_table2.n_values)
+    journal2.checkpoint([['5']], best_fitness2, n_episodes2, 5, [hash_table2])
+    assert journal2.n_records == 3
+
+    hash_table3 = HashTable(size=10)
+    _, best_fitness3, n_episodes3, _, _, generation = Journal(log_name).replay([hash_table3])
+    assert best_fitness3 == best_fitness2
+    assert n_episodes3 == n_episodes2
+    assert generation == 5
+    assert hash_table3 == hash_table2
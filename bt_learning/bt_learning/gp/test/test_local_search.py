@@ -0,0 +1,114 @@
+"""Unit test for local_search.py module."""
+
+# Copyright (c) 2022, ABB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with
+# or without modification, are permitted provided that
+# the following conditions are met:
+#
+#   * Redistributions of source code must retain the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer.
+#   * Redistributions in binary form must reproduce the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer in the documentation
+#     and/or other materials provided with the
+#     distribution.
+#   * Neither the name of ABB nor the names of its
+#     contributors may be used to endorse or promote
+#     products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from behaviors import behavior_lists as bl
+from bt_learning.gp import local_search
+
+
+def get_genome():
+    """Return a genome with integer, float and position parameters."""
+    integer = bl.ParameterizedNode(
+        'integer', None, [bl.NodeParameter([], 0, 100, 10, value=50)], False)
+    floating = bl.ParameterizedNode(
+        'floating', None,
+        [bl.NodeParameter([], 0.0, 1.0, data_type=bl.ParameterTypes.FLOAT, value=0.5)], True)
+    position = bl.ParameterizedNode(
+        'position', None,
+        [bl.NodeParameter(
+            [], (0, 0, 0), (10, 10, 10), (1, 1, 0),
+            data_type=bl.ParameterTypes.POSITION, value=(5, 5, 5))],
+        False)
+    listed = bl.ParameterizedNode(
+        'listed', None, [bl.NodeParameter(['a', 'b'], value='a')], False)
+    return ['s(', floating, integer, 'f(', position, listed, ')', ')']
+
+
+def test_numeric_parameters():
+    """Test numeric_parameters function."""
+    genome = get_genome()
+    assert local_search.numeric_parameters(genome) == [(1, 0, 0), (2, 0, 0), (4, 0, 0), (4, 0, 1)]
+
+
+def test_perturb():
+    """Test perturb function."""
+    genome = get_genome()
+    parameter = genome[2].parameters[0]
+    assert local_search.perturb(parameter, 0, 0.01, 1)
+    assert parameter.value == 60
+    assert local_search.perturb(parameter, 0, 0.2, 1)
+    assert parameter.value == 80
+    assert local_search.perturb(parameter, 0, 0.5, 1)
+    assert parameter.value == 100
+    assert not local_search.perturb(parameter, 0, 0.5, 1)
+
+    parameter = genome[4].parameters[0]
+    assert local_search.perturb(parameter, 1, 0.3, -1)
+    assert parameter.value == (5, 2, 5)
+
+    parameter = genome[1].parameters[0]
+    assert local_search.perturb(parameter, 0, 0.25, -1)
+    assert parameter.value == 0.25
+
+
+def test_neighbours():
+    """Test that neighbours change one parameter and leave the genome untouched."""
+    genome = get_genome()
+    candidates = local_search.neighbours(genome, 0.1)
+    assert len(candidates) == 8
+    for candidate in candidates:
+        assert len(candidate) == len(genome)
+        assert sum(x != y for x, y in zip(candidate, genome)) == 1
+    assert genome == get_genome()
+
+
+def test_parameter_search():
+    """Test that parameter search finds the optimum with one batch per iteration."""
+    def fitness(genome):
+        return -abs(genome[1].parameters[0].value - 0.8) - abs(genome[2].parameters[0].value - 20)
+
+    batches = []
+
+    def evaluate(genomes):
+        batches.append(len(genomes))
+        return [fitness(genome) for genome in genomes]
+
+    genome = get_genome()
+    best, best_fitness = local_search.parameter_search(genome, fitness(genome), evaluate, 10, 0.1)
+    assert best_fitness > fitness(genome)
+    assert best_fitness == fitness(best)
+    assert best[2].parameters[0].value == 20
+    assert abs(best[1].parameters[0].value - 0.8) < 0.05
+    assert batches == [8] * 10
+
+    assert local_search.parameter_search(['s(', 'a', ')'], 1.0, evaluate, 10, 0.1) ==\
+        (['s(', 'a', ')'], 1.0)
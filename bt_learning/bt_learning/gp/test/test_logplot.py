@@ -140,3 +140,44 @@ def test_best_individual():
 
     loaded_best_individual = logplot.get_best_individual('test')
     assert best_individual == loaded_best_individual
+
+
+def test_length():
+    """Test logging and loading population lengths."""
+    logplot.clear_logs('test')
+    populations = [[['a'], ['a', 'b', 'c']], [['a', 'b'], ['a', 'b']], [['a'], ['a']]]
+    for population in populations:
+        logplot.log_fitness('test', [0, 0])
+        logplot.log_population('test', population)
+        logplot.log_length('test', population)
+    assert logplot.get_length('test') == ([2.0, 2.0, 1.0], [3, 2, 1])
+
+    logplot.clear_after_generation('test', 1)
+    assert logplot.get_length('test') == ([2.0, 2.0], [3, 2])
+
+
+def test_operators():
+    """Test logging and loading operator probabilities."""
+    logplot.clear_logs('test')
+    logplot.log_operators('test', {'crossover': 0.5, 'add': 0.5})
+    logplot.log_operators('test', {'crossover': 0.25, 'add': 0.75})
+    assert logplot.get_operators('test') == {'crossover': [0.5, 0.25], 'add': [0.5, 0.75]}
+
+
+def test_clear_after_generation():
+    """Test that the logs of later generations are cleared for hotstart."""
+    logplot.clear_logs('test')
+    for generation in range(3):
+        logplot.log_fitness('test', [generation])
+        logplot.log_population('test', [['a']])
+        logplot.log_hash_table('test', generation, generation, 0, 0, 0, 0)
+        logplot.log_surrogate('test', generation, generation, 1.0, 1.0)
+        if generation > 0:
+            logplot.log_operators('test', {'crossover': generation})
+
+    logplot.clear_after_generation('test', 1)
+    assert logplot.get_operators('test') == {'crossover': [1.0]}
+    for file_name in ['hash_table_log.txt', 'surrogate_log.txt']:
+        with open(logplot.get_log_folder('test') + '/' + file_name, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        assert [logplot.log_generation(line) for line in lines] == [0, 1]
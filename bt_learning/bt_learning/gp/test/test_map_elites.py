@@ -0,0 +1,151 @@
+"""Unit test for map_elites.py module."""
+
+# Copyright (c) 2022, ABB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with
+# or without modification, are permitted provided that
+# the following conditions are met:
+#
+#   * Redistributions of source code must retain the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer.
+#   * Redistributions in binary form must reproduce the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer in the documentation
+#     and/or other materials provided with the
+#     distribution.
+#   * Neither the name of ABB nor the names of its
+#     contributors may be used to endorse or promote
+#     products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import pytest
+
+from behaviors import behavior_list_test_settings
+from behaviors import behavior_lists as bl
+import bt_learning.gp.genetic_programming as gp
+from bt_learning.gp import logplot
+import bt_learning.gp.map_elites as me
+
+from . import environment_strings as environment
+
+
+behavior_lists = bl.BehaviorLists(
+    condition_nodes=behavior_list_test_settings.get_condition_nodes(),
+    action_nodes=behavior_list_test_settings.get_action_nodes())
+
+
+class DescriptorEnvironment:
+    """Test environment that also returns a behavior descriptor."""
+
+    @staticmethod
+    def get_fitness(individual, seed=None):
+        """Return fitness and descriptor."""
+        return environment.get_fitness(individual, seed), [individual.count('s(')]
+
+
+def get_gp_par() -> gp.GpParameters:
+    """Return parameters for a small MAP-Elites run."""
+    gp_par = gp.GpParameters()
+    gp_par.behavior_lists = behavior_lists
+    gp_par.ind_start_length = 4
+    gp_par.n_population = 8
+    gp_par.f_crossover = 0.5
+    gp_par.f_mutation = 0.5
+    gp_par.plot = False
+    gp_par.n_generations = 10
+    gp_par.verbose = False
+    gp_par.fig_best = False
+    return gp_par
+
+
+def test_feature_range():
+    """Test binning of feature values."""
+    feature_range = me.FeatureRange(0, 10, 5)
+    assert feature_range.index(0) == 0
+    assert feature_range.index(1.9) == 0
+    assert feature_range.index(2) == 1
+    assert feature_range.index(9.9) == 4
+    assert feature_range.index(10) == 4
+    assert feature_range.index(-3) == 0
+    assert feature_range.index(100) == 4
+
+
+def test_elite_grid():
+    """Test insertion and sampling of the elite grid."""
+    grid = me.EliteGrid((2, 3))
+    assert len(grid) == 0
+    assert grid.insert((0, 1), 'a', 1.0)
+    assert not grid.insert((0, 1), 'b', 0.5)
+    assert not grid.insert((0, 1), 'b', 1.0)
+    assert grid.insert((1, 2), 'c', 0.0)
+    assert grid.insert((0, 1), 'd', 2.0)
+    assert len(grid) == 2
+    assert grid.coverage() == 2 / 6
+    assert grid.elites() == (['d', 'c'], [2.0, 0.0])
+    assert {grid.sample() for _ in range(50)} == {'c', 'd'}
+
+    grid = me.EliteGrid((2,))
+    assert grid.insert((1,), ['s(', 'a', ')'], 1.0)
+    assert grid.elites() == ([['s(', 'a', ')']], [1.0])
+
+
+def test_genome_features():
+    """Test genome_features function."""
+    conditions = behavior_list_test_settings.get_condition_nodes()
+    actions = behavior_list_test_settings.get_action_nodes()
+    condition = conditions[2]
+    condition.parameters[0].value = '100'
+    genome = ['s(', conditions[0], 'f(', condition, actions[0], ')', actions[1], ')']
+    assert me.genome_features(genome, behavior_lists) == [6, 2, 0, 0.5]
+
+    assert me.referenced_objects('move0 YellowBox -0.12 0.0 GreenBox') == {'YellowBox', 'GreenBox'}
+    node = bl.ParameterizedNode(
+        'pick', None, [bl.NodeParameter(['red', 'blue'], value='red')], False)
+    assert me.referenced_objects(node) == {'red'}
+    assert me.genome_features(['s(', node, actions[0], ')'], behavior_lists) == [3, 1, 1, 1.0]
+
+
+def test_run():
+    """Test run function."""
+    gp_par = get_gp_par()
+
+    gp.set_seeds(0)
+    population, fitness, best_fitness, best_individual = me.run(environment, gp_par)
+    assert len(population) == len(fitness) > 1
+    assert len(best_fitness) == gp_par.n_generations
+    assert best_fitness == sorted(best_fitness)
+    assert max(fitness) == best_fitness[-1]
+    assert best_individual in population
+    assert logplot.get_n_episodes(gp_par.log_name)[-1] > gp_par.n_population
+
+    gp.set_seeds(0)
+    population2, fitness2, _, _ = me.run(environment, gp_par)
+    assert population == population2
+    assert fitness == fitness2
+
+
+def test_run_outcome_features():
+    """Test run function with episode outcome features."""
+    gp_par = get_gp_par()
+    outcome_ranges = [me.FeatureRange(0, 4, 4)]
+
+    gp.set_seeds(0)
+    population, fitness, _, _ = me.run(
+        DescriptorEnvironment(), gp_par, outcome_ranges=outcome_ranges)
+    assert len(population) == len(fitness) > 1
+
+    with pytest.raises(ValueError):
+        me.run(environment, gp_par, outcome_ranges=outcome_ranges)
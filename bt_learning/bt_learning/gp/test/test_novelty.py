@@ -0,0 +1,81 @@
+"""Unit test for novelty.py module."""
+
+# Copyright (c) 2022, ABB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with
+# or without modification, are permitted provided that
+# the following conditions are met:
+#
+#   * Redistributions of source code must retain the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer.
+#   * Redistributions in binary form must reproduce the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer in the documentation
+#     and/or other materials provided with the
+#     distribution.
+#   * Neither the name of ABB nor the names of its
+#     contributors may be used to endorse or promote
+#     products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+
+from bt_learning.gp import novelty
+
+
+def test_incremental_kd_tree():
+    """Test that the incremental KD-tree finds the same neighbours as brute force."""
+    rng = np.random.default_rng(0)
+    points = rng.random((100, 3))
+    queries = rng.random((10, 3))
+    tree = novelty.IncrementalKDTree()
+    assert len(tree) == 0
+    assert np.all(np.isinf(tree.query(queries, 3)))
+    for i in range(0, 100, 7):
+        tree.add(points[i:i + 7])
+    tree.add(np.zeros((0, 3)))
+    assert len(tree) == 100
+    assert len(tree.trees) < 8
+
+    distances = np.linalg.norm(queries[:, None, :] - points[None, :, :], axis=2)
+    assert np.allclose(tree.query(queries, 5), np.sort(distances, axis=1)[:, :5])
+
+    tree = novelty.IncrementalKDTree()
+    tree.add([[0.0], [1.0]])
+    assert np.allclose(tree.query([[0.0]], 3), [[0.0, 1.0, np.inf]])
+
+
+def test_novelty_archive():
+    """Test novelty against the archive and the other descriptors."""
+    archive = novelty.NoveltyArchive(k=2)
+    assert len(archive.novelty([])) == 0
+    assert np.allclose(archive.novelty([[0.0]]), [0.0])
+    assert np.allclose(archive.novelty([[0.0], [1.0], [3.0]]), [2.0, 1.5, 2.5])
+
+    archive.add([[10.0], [12.0]])
+    assert len(archive) == 2
+    assert np.allclose(archive.novelty([[0.0]]), [11.0])
+    assert np.allclose(archive.novelty([[0.0], [11.0]]), [10.5, 1.0])
+
+
+def test_combined_score():
+    """Test combined_score function."""
+    fitness = [3.0, 1.0, 2.0]
+    novelty_values = [0.0, 5.0, 1.0]
+    assert novelty.combined_score(fitness, novelty_values, 0.0) == [1.0, 0.0, 0.5]
+    assert novelty.combined_score(fitness, novelty_values, 1.0) == [0.0, 1.0, 0.5]
+    assert novelty.combined_score(fitness, novelty_values, 0.5) == [0.5, 0.5, 0.5]
+    assert novelty.combined_score([1.0], [1.0], 0.5) == [0.0]
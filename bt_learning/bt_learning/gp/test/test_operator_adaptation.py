@@ -0,0 +1,91 @@
+"""Unit test for operator_adaptation.py module."""
+
+# Copyright (c) 2022, ABB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with
+# or without modification, are permitted provided that
+# the following conditions are met:
+#
+#   * Redistributions of source code must retain the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer.
+#   * Redistributions in binary form must reproduce the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer in the documentation
+#     and/or other materials provided with the
+#     distribution.
+#   * Neither the name of ABB nor the names of its
+#     contributors may be used to endorse or promote
+#     products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import pytest
+
+from bt_learning.gp.operator_adaptation import AdaptationMethods, OperatorAdaptation
+
+
+def test_init():
+    """Test that probabilities are normalized and zero probability operators left out."""
+    adaptation = OperatorAdaptation({'a': 2.0, 'b': 2.0, 'c': 0.0})
+    assert adaptation.probabilities == {'a': 0.5, 'b': 0.5}
+    assert adaptation.share(['a', 'c']) == 0.5
+
+    with pytest.raises(ValueError):
+        OperatorAdaptation({'a': 0.0})
+
+
+def test_choose():
+    """Test choose function."""
+    adaptation = OperatorAdaptation({'a': 0.5, 'b': 0.5, 'c': 0.0})
+    for _ in range(20):
+        assert adaptation.choose(['a', 'c']) == 'a'
+        assert adaptation.choose(['a', 'b', 'c']) in ['a', 'b']
+
+
+def test_credit():
+    """Test that only recorded offspring found among the individuals are credited."""
+    adaptation = OperatorAdaptation({'a': 0.5, 'b': 0.5}, learning_rate=0.5)
+    parent = ['p']
+    offspring_a = ['a']
+    offspring_b = ['b']
+    adaptation.record('a', offspring_a, [parent])
+    adaptation.record('b', offspring_b, [parent])
+    adaptation.record('b', ['not evaluated'], [parent])
+    adaptation.credit([parent, offspring_a, offspring_b], [1.0, 3.0, float('-inf')])
+    assert adaptation.quality == {'a': 1.0, 'b': 0.0}
+    assert adaptation.records == []
+
+
+@pytest.mark.parametrize('method', [
+    AdaptationMethods.PROBABILITY_MATCHING, AdaptationMethods.ADAPTIVE_PURSUIT])
+def test_adaptation(method):
+    """Test that probability moves toward the improving operator but stays above p_min."""
+    adaptation = OperatorAdaptation({'a': 0.5, 'b': 0.5}, method, p_min=0.1)
+    parent = ['p']
+    for _ in range(50):
+        offspring_a = ['a']
+        offspring_b = ['b']
+        adaptation.record('a', offspring_a, [parent])
+        adaptation.record('b', offspring_b, [parent])
+        adaptation.credit([parent, offspring_a, offspring_b], [1.0, 2.0, 0.0])
+    assert adaptation.probabilities['a'] == pytest.approx(0.9)
+    assert adaptation.probabilities['b'] == pytest.approx(0.1)
+    assert sum(adaptation.probabilities.values()) == pytest.approx(1.0)
+
+    # Without any improvement the probabilities are kept
+    adaptation = OperatorAdaptation({'a': 0.5, 'b': 0.5}, method)
+    adaptation.record('a', offspring_a, [parent])
+    adaptation.credit([parent, offspring_a], [1.0, 0.0])
+    assert adaptation.probabilities == {'a': 0.5, 'b': 0.5}
@@ -0,0 +1,117 @@
+"""Unit test for persistent_cache.py module."""
+
+# Copyright (c) 2022, ABB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with
+# or without modification, are permitted provided that
+# the following conditions are met:
+#
+#   * Redistributions of source code must retain the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer.
+#   * Redistributions in binary form must reproduce the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer in the documentation
+#     and/or other materials provided with the
+#     distribution.
+#   * Neither the name of ABB nor the names of its
+#     contributors may be used to endorse or promote
+#     products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from concurrent.futures import ProcessPoolExecutor
+import pickle
+
+from bt_learning.gp import logplot
+from bt_learning.gp.hash_table import HashTable
+from bt_learning.gp.persistent_cache import PersistentCache
+
+
+def cache_path() -> str:
+    """Return the path of a new test database."""
+    logplot.clear_logs('test_persistent_cache')
+    return logplot.get_log_folder('test_persistent_cache') + '/cache.db'
+
+
+def store_episodes(path: str, first_episode: int) -> int:
+    """Store episodes of a genome from another process."""
+    cache = PersistentCache(path, 'environment')
+    for episode in range(first_episode, first_episode + 50):
+        cache.insert(b'genome', episode, float(episode))
+    return cache.n_stored
+
+
+def test_find_insert():
+    """Test that values are shared per fingerprint."""
+    path = cache_path()
+    cache = PersistentCache(path, 'environment')
+    assert cache.find(b'genome') is None
+    cache.insert(b'genome', 1, 2.0)
+    cache.insert(b'genome', 0, 1.0)
+    cache.insert(b'genome', 0, 3.0)
+    assert cache.find(b'genome') == [1.0, 2.0]
+    assert (cache.n_hits, cache.n_misses, cache.n_reused, cache.n_stored) == (1, 1, 2, 2)
+
+    other = pickle.loads(pickle.dumps(cache))
+    assert other.connection is None
+    assert other.find(b'genome') == [1.0, 2.0]
+    assert PersistentCache(path, 'other environment').find(b'genome') is None
+    cache.close()
+
+
+def test_processes():
+    """Test concurrent writers in several processes."""
+    path = cache_path()
+    with ProcessPoolExecutor(2) as executor:
+        n_stored = list(executor.map(store_episodes, [path] * 3, [0, 25, 50]))
+    assert sum(n_stored) == 100
+    assert PersistentCache(path, 'environment').find(b'genome') == [float(i) for i in range(100)]
+
+
+def test_hash_table():
+    """Test hash tables of separate runs sharing a cache."""
+    path = cache_path()
+    hash_table1 = HashTable(persistent_cache=PersistentCache(path))
+    assert hash_table1.find(['a']) is None
+    hash_table1.insert(['a'], 1.0)
+    hash_table1.insert(['a'], 2.0)
+
+    cache = PersistentCache(path)
+    hash_table2 = HashTable(persistent_cache=cache)
+    assert hash_table2.find(['a']) == [1.0, 2.0]
+    # Values loaded from the cache are reused, not new episodes
+    assert hash_table2.n_values == 0
+    assert cache.n_reused == 2
+    hash_table2.insert(['a'], 3.0)
+    assert hash_table2.n_values == 1
+    assert hash_table2.find(['b']) is None
+    assert hash_table2.find(['b']) is None
+    assert (cache.n_hits, cache.n_misses, cache.n_reused, cache.n_stored) == (1, 1, 2, 1)
+    assert HashTable(persistent_cache=PersistentCache(path)).find(['a']) == [1.0, 2.0, 3.0]
+
+
+def test_misses():
+    """Test that misses of the cache are remembered within the memory of the hash table."""
+    cache = PersistentCache(cache_path())
+    hash_table = HashTable(size=2, persistent_cache=cache)
+    resident_bytes = hash_table.resident_bytes
+    assert hash_table.find(['a']) is None
+    assert hash_table.find(['a']) is None
+    assert cache.n_misses == 1
+    assert hash_table.resident_bytes > resident_bytes
+
+    assert hash_table.find(['b']) is None
+    assert hash_table.find(['c']) is None
+    assert len(hash_table.persistent_misses) <= 2
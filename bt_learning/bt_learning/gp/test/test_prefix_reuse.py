@@ -0,0 +1,192 @@
+"""Unit test for prefix_reuse.py module."""
+
+# Copyright (c) 2022, ABB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with
+# or without modification, are permitted provided that
+# the following conditions are met:
+#
+#   * Redistributions of source code must retain the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer.
+#   * Redistributions in binary form must reproduce the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer in the documentation
+#     and/or other materials provided with the
+#     distribution.
+#   * Neither the name of ABB nor the names of its
+#     contributors may be used to endorse or promote
+#     products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+
+from behaviors import behavior_lists as bl
+import bt_learning.gp.genetic_programming as gp
+from bt_learning.gp import prefix_reuse
+from simulation.algoryx.lfd.planning_itnerface import PlanningInterface
+
+
+Status = prefix_reuse.Status
+
+behavior_lists = bl.BehaviorLists(
+    condition_nodes=['holding A', 'holding B', 'A placed', 'B placed'],
+    action_nodes=['pick A', 'pick B', 'place A', 'place B'])
+
+TARGETS = {'A': np.array([1.0, 0.0, 0.0]), 'B': np.array([0.0, 1.0, 0.0])}
+
+
+class PlanningWorld:
+    """Deterministic pick and place world on the planning interface."""
+
+    def __init__(self):
+        init_state = {
+            'A': np.array([2.0, 2.0, 0.0]),
+            'B': np.array([-2.0, 2.0, 0.0]),
+            'table': np.array([0.0, 0.0, 0.0]),
+            'base': np.array([0.0, -3.0, 0.1]),
+            'holding': ''
+        }
+        self.interface = PlanningInterface(
+            ['A', 'B'], ['A', 'B', 'table'], 'world', random_events=False, init_state=init_state)
+        self.initial = self.interface.snapshot()
+        self.n_leaf_ticks = 0
+
+    def reset(self, _episode):
+        """Set the initial state."""
+        self.interface.restore(self.initial)
+
+    def snapshot(self):
+        """Return a copy of the world state."""
+        return self.interface.snapshot()
+
+    def restore(self, snapshot):
+        """Set the world state."""
+        self.interface.restore(snapshot)
+
+    def tick_leaf(self, node):
+        """Execute a leaf and return its status, the robot first moves within reach."""
+        self.n_leaf_ticks += 1
+        verb, target = node.split()
+        if verb == 'holding':
+            success = self.interface.grasped(target)
+        elif target == 'placed':
+            success = self.interface.at_pose(verb, 'table', TARGETS[verb], 0.01)
+        elif verb == 'pick':
+            if self.interface.grasped(target):
+                return Status.SUCCESS
+            if not self.interface.empty_gripper():
+                return Status.FAILURE
+            if not self.interface.reachable(target):
+                self.interface.navigate(self.interface.frames[target], 'world')
+                return Status.RUNNING
+            self.interface.pick(target)
+            success = True
+        else:
+            if not self.interface.grasped(target):
+                return Status.FAILURE
+            if not self.interface.reachable(TARGETS[target], 'table'):
+                self.interface.navigate(TARGETS[target], 'table')
+                return Status.RUNNING
+            self.interface.place(target, 'table', TARGETS[target])
+            success = True
+        return Status.SUCCESS if success else Status.FAILURE
+
+    def get_fitness(self, individual, ticks, failed, timeout):
+        """Return fitness from the distances of the objects to their targets."""
+        fitness = -len(individual) - ticks - 10 * failed - 10 * timeout
+        for target, pose in TARGETS.items():
+            position, _ = self.interface.get_item_in_frame(target, 'table')
+            fitness -= 100 * np.linalg.norm(position - pose)
+        return fitness
+
+
+def test_tick():
+    """Test ticking and replaying parsed genomes."""
+    genome = ['s(', 'f(', 'A placed', 's(', 'pick A', 'place A', ')', ')', 'B placed', ')']
+    tree = prefix_reuse.parse_genome(genome, behavior_lists)
+    assert tree == ('s(', [('f(', ['A placed', ('s(', ['pick A', 'place A'])]), 'B placed'])
+
+    ticked = []
+
+    def leaf_status(node):
+        ticked.append(node)
+        return Status.FAILURE if node == 'A placed' else Status.SUCCESS
+
+    assert prefix_reuse.tick(tree, behavior_lists, leaf_status) == Status.SUCCESS
+    assert ticked == ['A placed', 'pick A', 'place A', 'B placed']
+
+    signature = (('A placed', Status.FAILURE), ('pick A', Status.SUCCESS),
+                 ('place A', Status.SUCCESS), ('B placed', Status.SUCCESS))
+    assert prefix_reuse.replays(tree, behavior_lists, signature)
+    assert not prefix_reuse.replays(tree, behavior_lists, signature[:-1])
+    assert not prefix_reuse.replays(tree, behavior_lists, signature + signature[-1:])
+    other = ['s(', 'f(', 'A placed', 's(', 'pick A', 'place A', ')', ')', 'pick B', ')']
+    assert not prefix_reuse.replays(
+        prefix_reuse.parse_genome(other, behavior_lists), behavior_lists, signature)
+    assert prefix_reuse.parse_genome(['pick A'], behavior_lists) == 'pick A'
+
+
+def test_prefix_reuse():
+    """Test that resumed episodes give the same fitness with fewer leaf ticks."""
+    parent = ['s(', 'f(', 'A placed', 's(', 'pick A', 'place A', ')', ')',
+              'f(', 'B placed', 's(', 'pick B', 'place B', ')', ')', ')']
+    offspring = ['s(', 'f(', 'A placed', 's(', 'pick A', 'place A', ')', ')',
+                 'f(', 'B placed', 'pick B', ')', ')']
+    other = ['s(', 'pick B', 'place B', ')']
+
+    reference = prefix_reuse.PrefixReuseEnvironment(
+        PlanningWorld(), behavior_lists, max_ticks=10, max_snapshots=0)
+    expected = [reference.get_fitness(genome, 0) for genome in [parent, offspring, other]]
+    assert expected[0] > expected[1]
+    assert reference.reuse_fraction() == 0.0
+
+    world = PlanningWorld()
+    environment = prefix_reuse.PrefixReuseEnvironment(world, behavior_lists, max_ticks=10)
+    assert environment.get_fitness(parent, 0) == expected[0]
+    n_leaf_ticks = world.n_leaf_ticks
+    assert environment.get_fitness(offspring, 0) == expected[1]
+    assert world.n_leaf_ticks - n_leaf_ticks < n_leaf_ticks
+    assert environment.get_fitness(other, 0) == expected[2]
+    assert environment.reuse_fraction() > 0.0
+
+    # A finished episode is not run again, other episodes start from their own state
+    n_leaf_ticks = world.n_leaf_ticks
+    assert environment.get_fitness(parent, 0) == expected[0]
+    assert world.n_leaf_ticks == n_leaf_ticks
+    assert environment.get_fitness(parent, 1) == expected[0]
+    assert world.n_leaf_ticks > n_leaf_ticks
+
+
+def test_run():
+    """Test genetic programming with prefix reuse."""
+    gp_par = gp.GpParameters()
+    gp_par.behavior_lists = behavior_lists
+    gp_par.ind_start_length = 4
+    gp_par.n_population = 8
+    gp_par.f_crossover = 0.5
+    gp_par.f_mutation = 0.5
+    gp_par.plot = False
+    gp_par.fig_best = False
+    gp_par.n_generations = 5
+    gp_par.mutation_p_variable = 0.0
+
+    results = []
+    for max_snapshots in [0, 100000]:
+        environment = prefix_reuse.PrefixReuseEnvironment(
+            PlanningWorld(), behavior_lists, max_ticks=10, max_snapshots=max_snapshots)
+        gp.set_seeds(0)
+        results.append(gp.run(environment, gp_par)[:3])
+    assert results[0] == results[1]
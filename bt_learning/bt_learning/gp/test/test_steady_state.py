@@ -0,0 +1,236 @@
+"""Unit test for steady_state.py module."""
+
+# Copyright (c) 2022, ABB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with
+# or without modification, are permitted provided that
+# the following conditions are met:
+#
+#   * Redistributions of source code must retain the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer.
+#   * Redistributions in binary form must reproduce the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer in the documentation
+#     and/or other materials provided with the
+#     distribution.
+#   * Neither the name of ABB nor the names of its
+#     contributors may be used to endorse or promote
+#     products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from behaviors import behavior_list_test_settings
+from behaviors import behavior_lists as bl
+import bt_learning.gp.genetic_programming as gp
+from bt_learning.gp import logplot
+import bt_learning.gp.steady_state as ss
+
+from .test_gp_parallel import TestEnvironment
+
+
+behavior_lists = bl.BehaviorLists(
+    condition_nodes=behavior_list_test_settings.get_condition_nodes(),
+    action_nodes=behavior_list_test_settings.get_action_nodes())
+
+
+def get_gp_par() -> gp.GpParameters:
+    """Return parameters for a small steady-state run."""
+    gp_par = gp.GpParameters()
+    gp_par.behavior_lists = behavior_lists
+    gp_par.ind_start_length = 3
+    gp_par.n_population = 10
+    gp_par.f_crossover = 0.5
+    gp_par.f_mutation = 0.5
+    gp_par.f_elites = 0.1
+    gp_par.plot = False
+    gp_par.n_generations = 10
+    gp_par.verbose = False
+    gp_par.fig_best = False
+    gp_par.log_name = 'steady_state'
+    return gp_par
+
+
+def test_replace():
+    """Test replace function."""
+    gp_par = gp.GpParameters()
+    gp_par.n_population = 4
+    gp_par.f_elites = 0.25
+    gp_par.survivor_selection = gp.SelectionMethods.ELITISM
+
+    population = [0, 1, 2, 3]
+    fitness = [3, 1, 2, 0]
+    ss.replace(population, fitness, 4, 5, gp_par)
+    assert population == [0, 1, 2, 4]
+    assert fitness == [3, 1, 2, 5]
+
+    # The elite is never removed
+    gp_par.survivor_selection = gp.SelectionMethods.RANDOM
+    for _ in range(10):
+        ss.replace(population, fitness, 5, -1, gp_par)
+        assert len(population) == gp_par.n_population
+        assert 4 in population
+
+    # The protected individual is never removed
+    gp_par.f_elites = 0
+    gp_par.survivor_selection = gp.SelectionMethods.ELITISM
+    population = [0, 1, 2, 3]
+    fitness = [3, 1, 2, 0]
+    ss.replace(population, fitness, 4, 5, gp_par, protected=3)
+    assert population == [0, 2, 3, 4]
+
+    # Only the best f_parents fraction of the parents survive the generation
+    gp_par.f_parents = 0.5
+    population = [0, 1, 2, 3]
+    fitness = [3, 1, 2, 0]
+    is_parent = [True] * 4
+    ss.replace(population, fitness, 4, -2, gp_par, is_parent=is_parent)
+    ss.replace(population, fitness, 5, -1, gp_par, is_parent=is_parent)
+    assert population == [0, 2, 4, 5]
+    assert is_parent == [True, True, False, False]
+    # then survivor selection takes over
+    ss.replace(population, fitness, 6, -3, gp_par, is_parent=is_parent)
+    assert population == [0, 2, 4, 5]
+    assert is_parent == [True, True, False, False]
+
+
+def test_breed():
+    """Test breed function."""
+    gp_par = get_gp_par()
+    gp.set_seeds(0)
+    population = gp.create_population(gp_par.n_population, 3, 0.5, behavior_lists)
+    fitness = list(range(gp_par.n_population))
+    for _ in range(10):
+        offspring = ss.breed(population, fitness, [], gp_par)
+        assert 0 < len(offspring) <= 2
+        for individual in offspring:
+            assert individual not in population
+
+
+def test_breed_baseline():
+    """Test that breed crosses over with the baseline at crossover_baseline_index."""
+    gp_par = get_gp_par()
+    gp_par.f_mutation = 0.0
+    gp_par.replace_crossover = False
+    gp.set_seeds(0)
+    other = gp.create_population(2, 3, 0.5, behavior_lists)[1]
+    baseline = ['s(', behavior_list_test_settings.get_condition_nodes()[0],
+                behavior_list_test_settings.get_action_nodes()[0], ')']
+
+    def is_inserted(offspring, parent, index, donor):
+        """Check if offspring is parent with a subtree of donor inserted at index."""
+        n_inserted = len(offspring) - len(parent)
+        return n_inserted > 0 and offspring[:index] == parent[:index] and\
+            offspring[index + n_inserted:] == parent[index:] and\
+            any(donor[i:i + n_inserted] == offspring[index:index + n_inserted]
+                for i in range(len(donor)))
+
+    for seed in range(10):
+        gp.set_seeds(seed)
+        offspring = ss.breed([baseline, other], [0.0, 1.0], [], gp_par, baseline, 1)
+        assert len(offspring) == 2
+        # The baseline gets a subtree after node 1 and gives a subtree at node 1
+        assert any(is_inserted(offspring[i], baseline, 2, other) and
+                   is_inserted(offspring[1 - i], other, 1, baseline) for i in range(2))
+
+
+def test_run_baseline():
+    """Test run function with a baseline."""
+    gp_par = get_gp_par()
+    gp_par.replace_crossover = False
+    gp.set_seeds(0)
+    baseline = gp.create_population(1, 3, 0.5, behavior_lists)[0]
+    population, fitness, _, _ = ss.run(
+        TestEnvironment(), gp_par, baseline=baseline, crossover_baseline_index=1)
+    assert len(population) == len(fitness) == gp_par.n_population
+    # keep_baseline is set by default
+    assert baseline in population
+
+
+def test_async_evaluator():
+    """Test the evaluator both inline and with worker processes."""
+    for n_workers in [1, 2]:
+        evaluator = ss.AsyncEvaluator(TestEnvironment(), n_workers)
+        assert evaluator.has_free_slot()
+        evaluator.submit(['b?'], 0, 2)
+        evaluator.submit([], 0, 1)
+        assert not evaluator.has_free_slot()
+        results = []
+        while evaluator.n_pending() > 0:
+            results += evaluator.wait()
+        evaluator.shutdown()
+        assert sorted(results, key=lambda x: len(x[0])) == [([], [0]), (['b?'], [0.9, 0.9])]
+
+
+def test_run():
+    """Test run function."""
+    gp_par = get_gp_par()
+
+    gp.set_seeds(1337)
+    population, fitness, best_fitness, best_individual = ss.run(TestEnvironment(), gp_par)
+    assert len(population) == gp_par.n_population
+    assert len(best_fitness) == gp_par.n_generations
+    assert best_fitness == sorted(best_fitness)
+    assert max(fitness) == best_fitness[-1]
+    assert best_individual in population
+    assert logplot.get_n_episodes(gp_par.log_name)[-1] > gp_par.n_population
+
+    gp.set_seeds(1337)
+    population2, fitness2, _, _ = ss.run(TestEnvironment(), gp_par)
+    assert population == population2
+    assert fitness == fitness2
+
+    gp.set_seeds(1337)
+    _, _, best_fitness, _ = ss.run(TestEnvironment(), gp_par, n_workers=2)
+    assert len(best_fitness) == gp_par.n_generations
+
+
+def test_hotstart():
+    """Test run function with hotstart."""
+    gp_par = get_gp_par()
+    gp_par.save_interval = 5
+
+    gp.set_seeds(0)
+    gp_par.n_generations = 6
+    ss.run(TestEnvironment(), gp_par)
+    gp_par.n_generations = 8
+    population, fitness, best_fitness, _ = ss.run(TestEnvironment(), gp_par, hotstart=True)
+    assert len(population) == gp_par.n_population
+    assert len(fitness) == gp_par.n_population
+    assert len(best_fitness) == gp_par.n_generations
+
+
+def test_run_termination():
+    """Test run function with an episode budget."""
+    gp_par = get_gp_par()
+    gp_par.n_generations = 100
+    gp_par.max_episodes = 40
+
+    gp.set_seeds(0)
+    _, _, best_fitness, _ = ss.run(TestEnvironment(), gp_par)
+    n_episodes = logplot.get_n_episodes(gp_par.log_name)
+    assert len(best_fitness) < gp_par.n_generations
+    assert n_episodes[-1] >= gp_par.max_episodes
+
+
+def test_run_bounded_hash_table():
+    """Test run function with a hash table that evicts the values it was just given."""
+    gp_par = get_gp_par()
+    gp_par.hash_table_max_entries = 1
+    gp_par.rerun_fitness = 2
+
+    gp.set_seeds(0)
+    population, fitness, best_fitness, _ = ss.run(TestEnvironment(), gp_par)
+    assert len(population) == len(fitness) == gp_par.n_population
+    assert len(best_fitness) == gp_par.n_generations
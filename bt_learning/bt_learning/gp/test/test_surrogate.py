@@ -0,0 +1,134 @@
+"""Unit test for surrogate.py module."""
+
+# Copyright (c) 2022, ABB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with
+# or without modification, are permitted provided that
+# the following conditions are met:
+#
+#   * Redistributions of source code must retain the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer.
+#   * Redistributions in binary form must reproduce the
+#     above copyright notice, this list of conditions
+#     and the following disclaimer in the documentation
+#     and/or other materials provided with the
+#     distribution.
+#   * Neither the name of ABB nor the names of its
+#     contributors may be used to endorse or promote
+#     products derived from this software without
+#     specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import random
+import pytest
+
+from behaviors import behavior_list_test_settings
+from behaviors import behavior_lists as bl
+import bt_learning.gp.genetic_programming as gp
+from bt_learning.gp import logplot
+from bt_learning.gp.surrogate import SurrogateModel
+
+from . import environment_strings as environment
+
+
+behavior_lists = bl.BehaviorLists(
+    condition_nodes=behavior_list_test_settings.get_condition_nodes(),
+    action_nodes=behavior_list_test_settings.get_action_nodes())
+
+
+def test_features():
+    """Test features function."""
+    surrogate = SurrogateModel(behavior_lists, n_features=16)
+    genome = ['s(', 'a', 'f(', 'b', 'c', ')', ')']
+    x = surrogate.features(genome)
+    assert len(x) == 16 + 3
+    assert sum(x[:16]) == len(genome) + len(genome) - 1
+    assert x[-3] == 5
+    assert x[-2] == 2
+    assert x[-1] == 1
+    assert (surrogate.features(genome[:]) == x).all()
+
+
+def test_predict():
+    """Test that the surrogate learns a fitness depending on length."""
+    surrogate = SurrogateModel(behavior_lists, min_samples=10, regularization=0.01)
+    random.seed(0)
+    assert surrogate.predict(['a']) is None
+    for _ in range(30):
+        genome = ['s('] + ['a'] * random.randint(1, 10) + [')']
+        surrogate.add(genome, -0.1 * len(genome))
+    assert surrogate.predict(['s(', 'a', 'a', ')']) == pytest.approx(-0.4, abs=0.01)
+    assert surrogate.predict(['s('] + ['a'] * 8 + [')']) == pytest.approx(-1.0, abs=0.01)
+
+
+def test_screen():
+    """Test screening and statistics."""
+    random.seed(0)
+    surrogate = SurrogateModel(behavior_lists, min_samples=1, exploration=0.0)
+    assert surrogate.screen(['a'])
+    surrogate.add(['a'], 1.0)
+    assert surrogate.screen(['a'])
+    assert surrogate.n_rejected == 0
+
+    surrogate.threshold = 2.0
+    assert not surrogate.screen(['a'])
+    assert surrogate.n_rejected == 1
+    surrogate.threshold = 0.0
+    assert surrogate.screen(['a'])
+    surrogate.add(['a'], -1.0)
+    assert surrogate.false_negatives == 1
+    assert surrogate.recall() == 0.0
+
+    surrogate = SurrogateModel(behavior_lists, min_samples=1, exploration=1.0)
+    surrogate.add(['a'], 1.0)
+    surrogate.threshold = 2.0
+    assert surrogate.screen(['a'])
+    assert surrogate.n_rejected == 0
+    surrogate.add(['a'], 1.0)
+    assert surrogate.precision() == 1.0
+    assert surrogate.recall() == 1.0
+
+
+def test_run_surrogate():
+    """Test run function with surrogate screening."""
+    gp_par = gp.GpParameters()
+    gp_par.behavior_lists = behavior_lists
+    gp_par.ind_start_length = 3
+    gp_par.n_population = 8
+    gp_par.f_crossover = 0.5
+    gp_par.n_offspring_crossover = 2
+    gp_par.f_mutation = 0.5
+    gp_par.n_offspring_mutation = 2
+    gp_par.plot = False
+    gp_par.fig_best = False
+    gp_par.n_generations = 20
+    gp_par.surrogate = True
+    gp_par.surrogate_min_samples = 10
+    gp_par.log_name = 'surrogate'
+
+    gp.set_seeds(0)
+    _, fitness, best_fitness, _ = gp.run(environment, gp_par)
+    assert best_fitness[-1] == max(fitness)
+    # Offspring rejected by the surrogate never survive
+    assert min(fitness) > -float('inf')
+    with open(logplot.get_log_folder(gp_par.log_name) + '/fitness_log.txt',
+              encoding='utf-8') as f:
+        assert 'inf' not in f.read()
+
+    with open(logplot.get_log_folder(gp_par.log_name) + '/surrogate_log.txt',
+              encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    assert len(lines) == gp_par.n_generations - 1
+    assert lines[-1].startswith('generation: ' + str(gp_par.n_generations - 1))
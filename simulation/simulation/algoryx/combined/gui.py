@@ -341,6 +341,7 @@ class GUI():
                         baseline=baseline,
                         baseline_index=baseline_index,
                         visual=self.visual,
+                        n_workers=1 if self.visual else mp.cpu_count(),
                         args=(app.CloudpickleWrapper(app.Application), self.agx_args)
                     )
                     print('Starting GP Evolution:')
@@ -32,7 +32,7 @@
 # THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 from dataclasses import dataclass
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 from simulation.py_trees_interface import PyTree
 from simulation.algoryx.gp.gp_interface import GPInterface
@@ -103,3 +103,12 @@ def compute_fitness(
             print('Hand not empty: ', cost)
     fitness = -cost
     return fitness
+
+
+def compute_descriptor(world_interface: GPInterface, targets: Dict) -> List[float]:
+    """Return the positions of the target objects as a behavior descriptor for novelty search."""
+    descriptor = []
+    for target in targets.keys():
+        position, _ = world_interface.get_item_in_frame(target, targets[target]['reference'])
+        descriptor += list(world_interface.as_vec3(position))
+    return descriptor
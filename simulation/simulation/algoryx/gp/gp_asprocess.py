@@ -31,17 +31,36 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
 # THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import functools
 import multiprocessing as mp
 import os
 from typing import Any, List
 
-from bt_learning.gp import logplot
 import bt_learning.gp.genetic_programming as gp
-from bt_learning.gp.hash_table import HashTable
+from bt_learning.gp.evaluators import ProcessPoolEvaluator, seeded_environment, SerialEvaluator
 from simulation.algoryx.agx_application import CloudpickleWrapper
 import yaml
 
 
+def make_environment(
+    environment: Any,
+    env_fn_wrapper: CloudpickleWrapper,
+    args: List[str],
+    obj_data: dict,
+    run_seed: int = None,
+    visual: bool = False
+) -> Any:
+    """
+    Start an application and connect it to the environment.
+
+    The environment is returned wrapped in a SeededEnvironment unless run_seed is None.
+    """
+    app = env_fn_wrapper.var(args)
+    app.bringup(obj_data, visual=visual)
+    environment.set_application(app)
+    return seeded_environment(environment, run_seed)
+
+
 class GPProcess(mp.Process):
 
     def __init__(
@@ -53,8 +72,15 @@ class GPProcess(mp.Process):
         baseline: Any = None,
         baseline_index: int = None,
         visual: bool = False,
+        n_workers: int = 1,
         args: Any = None
     ) -> None:
+        """
+        Process running the genetic programming algorithm in the simulator.
+
+        With n_workers > 1 the individuals are evaluated in as many worker processes,
+        each with its own application, otherwise in a single application.
+        """
 
         with open(os.path.join(config_folder, 'sim_data.yaml')) as f:
             sim_data = yaml.safe_load(f)
@@ -67,6 +93,7 @@ class GPProcess(mp.Process):
         self.baseline = baseline
         self.baseline_index = baseline_index
         self.visual = visual
+        self.n_workers = n_workers
 
         self.event = mp.Event()
         self.data = mp.Value('i', 0)
@@ -82,217 +109,38 @@ class GPProcess(mp.Process):
         self.event.set()
         self.join()
 
+    def generation_callback(self, generation: int) -> bool:
+        """Publish the current generation and return True if the process is stopped."""
+        if self.event.is_set():
+            return True
+        self.data.value = generation
+        return False
+
     def worker(self, env_fn_wrapper: CloudpickleWrapper, args: List[str]) -> None:
-        # pylint: disable=too-many-statements, too-many-locals, too-many-branches
         """Run the genetic programming algorithm."""
-        app = env_fn_wrapper.var(args)
-        app.bringup(self.obj_data, visual=self.visual)
-        self.envinronment.set_application(app)
-
-        hash_table = HashTable(self.gp_par.hash_table_size, self.gp_par.log_name)
-
-        if self.hotstart:
-            best_fitness, n_episodes, last_generation, population =\
-                gp.load_state(self.gp_par.log_name, hash_table)
+        environment_factory = functools.partial(
+            make_environment, self.envinronment, env_fn_wrapper, args, self.obj_data,
+            self.gp_par.run_seed)
+        app = None
+        if self.n_workers > 1:
+            evaluator = ProcessPoolEvaluator(
+                n_workers=self.n_workers, environment_factory=environment_factory)
         else:
-            population = gp.create_population(
-                self.gp_par.n_population,
-                self.gp_par.ind_start_length,
-                self.gp_par.mutation_p_leaf,
-                self.gp_par.behavior_lists
-            )
-            # logplot.clear_logs(self.gp_par.log_name)
-            best_fitness = []
-            n_episodes = []
-            n_episodes.append(hash_table.n_values)
-            last_generation = 0
-
-            if self.baseline is not None:
-                population[0] = self.baseline
-                baseline_index = 0
-
-        fitness = []
-        for individual in population:
-            if self.gp_par.verbose:
-                print(f'Individual: {individual}')
-            fitness.append(gp.get_fitness(
-                individual,
-                hash_table,
-                self.envinronment,
-                rerun_fitness=0,
-                min_episodes=self.gp_par.min_episodes
-            ))
-            if self.gp_par.verbose:
-                print(f'Fitness: {fitness[-1]}')
-
-        if not self.hotstart:
-            best_fitness.append(max(fitness))
-
-            if self.gp_par.verbose:
-                gp.print_population(population, fitness, last_generation)
-                print('\n')
-                print('Generation: ', last_generation, ' Best fitness: ', best_fitness[-1])
-                print('\n')
-
-            logplot.log_fitness(self.gp_par.log_name, fitness)
-            logplot.log_population(self.gp_par.log_name, population)
-
-        generation = self.gp_par.n_generations - 1  # In case loop is skipped due to hotstart
-        for generation in range(last_generation + 1, self.gp_par.n_generations):
-            self.data.value = generation
-            if self.gp_par.keep_baseline:
-                if self.baseline is not None and self.baseline not in population:
-                    # Make sure we are able to source from baseline
-                    population.append(self.baseline)
-
-            if generation > 1:
-                fitness = []
-                for index, individual in enumerate(population):
-                    if self.gp_par.verbose:
-                        print(f'Individual: {individual}')
-                    fitness.append(gp.get_fitness(
-                        individual,
-                        hash_table,
-                        self.envinronment,
-                        self.gp_par.rerun_fitness,
-                        self.gp_par.min_episodes
-                    ))
-                    if self.gp_par.verbose:
-                        print(f'Fitness: {fitness[-1]}')
-                    if self.baseline is not None and individual == self.baseline:
-                        baseline_index = index
-            if self.gp_par.keep_baseline and self.gp_par.boost_baseline and self.baseline is not None:
-                baseline_fitness = fitness[baseline_index]
-                fitness[baseline_index] = max(fitness)
+            environment = environment_factory(visual=self.visual)
+            app = self.envinronment.app
+            evaluator = SerialEvaluator(environment)
 
-            co_parents = gp.crossover_parent_selection(population, fitness, self.gp_par)
-            co_offspring = gp.crossover(
-                population, co_parents, self.gp_par, self.baseline, self.baseline_index)
-            for offspring in co_offspring:
-                if self.gp_par.verbose:
-                    print(f'Individual: {offspring}')
-                fitness.append(gp.get_fitness(
-                    offspring,
-                    hash_table,
-                    self.envinronment,
-                    self.gp_par.rerun_fitness,
-                    self.gp_par.min_episodes
-                ))
-                if self.gp_par.verbose:
-                    print(f'Fitness: {fitness[-1]}')
-
-            if self.gp_par.boost_baseline and self.gp_par.boost_baseline_only_co and \
-                    self.baseline is not None:
-                # Restore original fitness for survivor selection
-                fitness[baseline_index] = baseline_fitness
-
-            mutation_parents = gp.mutation_parent_selection(
-                population, fitness, co_parents, co_offspring, self.gp_par)
-            mutated_offspring = gp.mutation(
-                population + co_offspring, mutation_parents, self.gp_par)
-            for offspring in mutated_offspring:
-                if self.gp_par.verbose:
-                    print(f'Individual: {offspring}')
-                fitness.append(gp.get_fitness(
-                    offspring,
-                    hash_table,
-                    self.envinronment,
-                    self.gp_par.rerun_fitness,
-                    self.gp_par.min_episodes
-                ))
-                if self.gp_par.verbose:
-                    print(f'Fitness: {fitness[-1]}')
-
-            if self.gp_par.boost_baseline and self.baseline is not None:
-                # Restore original fitness for survivor selection
-                fitness[baseline_index] = baseline_fitness
-
-            population, fitness = gp.survivor_selection(
-                population, fitness, co_offspring, mutated_offspring, self.gp_par)
-
-            best_fitness.append(max(fitness))
-            n_episodes.append(hash_table.n_values)
-
-            logplot.log_fitness(self.gp_par.log_name, fitness)
-            logplot.log_population(self.gp_par.log_name, population)
-
-            if self.gp_par.verbose:
-                print('\n')
-                print(
-                    'Generation: ', generation,
-                    ' Fitness: ', fitness,
-                    ' Best fitness: ', best_fitness[generation]
-                )
-                print('\n')
-
-            if self.event.is_set():
-                print('\n')
-                print(
-                    'Generation: ', generation,
-                    ' Fitness: ', fitness,
-                    ' Best fitness: ', best_fitness[generation]
-                )
-                print('\n')
-                gp.save_state(
-                    self.gp_par,
-                    population,
-                    None,
-                    best_fitness,
-                    n_episodes,
-                    self.baseline,
-                    generation,
-                    hash_table
-                )
-                best_individual = gp.selection(
-                    population, fitness, 1, gp.SelectionMethods.ELITISM)[0]
-                self.__make_plots(n_episodes, population, best_individual, best_fitness)
-                app.shutdown()
-                break
-
-            if (generation + 1) % self.gp_par.save_interval == 0 and\
-                    generation < self.gp_par.n_generations - 1:  # Last is saved later
-                gp.save_state(
-                    self.gp_par,
-                    population,
-                    None,
-                    best_fitness,
-                    n_episodes,
-                    self.baseline,
-                    generation,
-                    hash_table
-                )
-
-        print('\nFINAL POPULATION: ')
-        gp.print_population(population, fitness, generation)
-
-        best_individual = gp.selection(population, fitness, 1, gp.SelectionMethods.ELITISM)[0]
-
-        gp.save_state(
+        gp.run(
+            self.envinronment,
             self.gp_par,
-            population,
-            best_individual,
-            best_fitness,
-            n_episodes,
-            self.baseline,
-            generation,
-            hash_table
+            hotstart=self.hotstart,
+            baseline=self.baseline,
+            evaluator=evaluator,
+            crossover_baseline_index=self.baseline_index,
+            generation_callback=self.generation_callback,
+            clear_logs=False
         )
 
-        self.__make_plots(n_episodes, population, best_individual, best_fitness)
-
-    def __make_plots(self, n_episodes, population, best_individual, best_fitness):
-        if self.gp_par.plot:
-            logplot.plot_fitness(self.gp_par.log_name, best_fitness, n_episodes)
-        if self.gp_par.fig_best:
-            self.envinronment.plot_individual(
-                logplot.get_log_folder(self.gp_par.log_name),
-                'best individual',
-                best_individual
-            )
-        if self.gp_par.fig_last_gen:
-            for i in range(self.gp_par.n_population):
-                self.envinronment.plot_individual(
-                    logplot.get_log_folder(self.gp_par.log_name),
-                    'individual_' + str(i),
-                    population[i]
-                )
+        evaluator.close()
+        if app is not None and self.event.is_set():
+            app.shutdown()
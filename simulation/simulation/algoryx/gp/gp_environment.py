@@ -50,7 +50,8 @@ class GPEnvironment():
         targets: Dict,
         fitness_coeff: fit.Coefficients = None,
         pytrees_param: PyTreeParameters = None,
-        verbose: bool = False
+        verbose: bool = False,
+        descriptor: bool = False
     ) -> None:
         """
         Interface to the simulation environment for the GP algorithm.
@@ -64,6 +65,7 @@ class GPEnvironment():
             - fitness_coeff: coefficient to compute the fitness function
             - pytrees_param: parameters to compute BT-related weights in the fitness function
             - verbose: toggle printouts
+            - descriptor: also return the behavior descriptor from get_fitness, for novelty search
         """
 
         self.world_interface = world_interface
@@ -71,6 +73,7 @@ class GPEnvironment():
         self.initial = initial
         self.targets = targets
         self.verbose = verbose
+        self.descriptor = descriptor
         self.fitness_coeff = fitness_coeff
         self.pytrees_param = pytrees_param
         if self.pytrees_param is not None:
@@ -86,6 +89,8 @@ class GPEnvironment():
         """
         Run the simulation and return the fitness.
 
+        If descriptor is set, (fitness, descriptor) is returned instead.
+
         In case of error, restarts world_interface and tries again.
         """
         self.world_interface.initialize()
@@ -121,6 +126,8 @@ class GPEnvironment():
                 self.verbose
             )
 
+        if self.descriptor:
+            return fitness, fit.compute_descriptor(self.world_interface, self.targets)
         return fitness
 
     def plot_individual(self, path: str, plot_name: str, individual: List[str]) -> None:
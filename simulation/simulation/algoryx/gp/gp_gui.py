@@ -168,6 +168,7 @@ class GP_GUI():
                         hotstart=hotstart,
                         baseline=self.get_baseline(),
                         visual=self.visual,
+                        n_workers=1 if self.visual else mp.cpu_count(),
                         args=self.args
                     )
                     self.gp_process.start()
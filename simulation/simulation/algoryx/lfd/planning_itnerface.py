@@ -250,6 +250,20 @@ class PlanningInterface():
         else:
             self.gripper = random.choice(['open', 'closed'])
 
+    def snapshot(self) -> Dict:
+        """Return a copy of the world state."""
+        return {
+            'frames': {frame: np.copy(position) for frame, position in self.frames.items()},
+            'holding': self.holding,
+            'gripper': self.gripper
+        }
+
+    def restore(self, snapshot: Dict):
+        """Set the world state to a snapshot."""
+        self.frames = {frame: np.copy(position) for frame, position in snapshot['frames'].items()}
+        self.holding = snapshot['holding']
+        self.gripper = snapshot['gripper']
+
     def __random_location(self) -> np.ndarray:
         """Generate a random position."""
         return np.random.uniform(